@@ -9,7 +9,7 @@ import sys
 import time
 import click
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_socketio import SocketIO
 from flask_cors import CORS
 
@@ -26,6 +26,8 @@ from user_manager import UserManager
 from device_manager import DeviceManager
 from web_menuconfig import WebMenuconfig
 from repository_manager import RepositoryManager
+from source_mirror import SourceMirrors
+from workspace_pool import WorkspacePool
 from email_notifier import EmailNotifier
 from repository_controller import RepositoryController, create_repository_blueprint
 
@@ -133,15 +135,57 @@ def create_app(config_name=None):
     # 初始化Web版menuconfig
     app.web_menuconfig = WebMenuconfig(config[config_name], logger)
 
+    # 初始化本地源码镜像（LEDE、iStore 和各 feed 的裸仓库，定时更新）
+    app.source_mirrors = None
+    if app.config.get('SOURCE_MIRROR'):
+        try:
+            source_mirrors = SourceMirrors(
+                app.config['SOURCE_MIRROR_DIR'],
+                app.config['LEDE_REPO_URL'],
+                app.config['LEDE_BRANCH'],
+                extra_urls=[app.config['ISTORE_REPO_URL']],
+                refresh_interval=app.config.get('SOURCE_MIRROR_REFRESH_INTERVAL', 3600),
+                max_age=app.config.get('SOURCE_MIRROR_MAX_AGE', 300),
+                logger=logger
+            )
+            source_mirrors.setup()
+            source_mirrors.start()
+            app.source_mirrors = source_mirrors
+        except OSError as e:
+            logger.warning(f"创建本地源码镜像失败，克隆和 feeds 更新直接访问上游: {e}")
+
     # 初始化仓库管理器
-    app.repository_manager = RepositoryManager(config[config_name], logger, app.websocket_handler)
+    app.repository_manager = RepositoryManager(config[config_name], logger, app.websocket_handler,
+                                               app.source_mirrors)
 
     # 初始化邮件通知器
     app.email_notifier = EmailNotifier(config[config_name], logger)
 
     # 初始化编译管理器
     app.compiler_manager = CompilerManager(config[config_name], logger, socketio,
-                                         app.websocket_handler, app.user_manager)
+                                         app.websocket_handler, app.user_manager,
+                                         app.source_mirrors)
+
+    # 初始化预热工作区池（空闲时准备好已安装 feeds 并下载源码包的工作区，新用户第一次克隆时直接移交）
+    app.workspace_pool = None
+    if app.config.get('WORKSPACE_POOL_SIZE', 0) > 0:
+        try:
+            workspace_pool = WorkspacePool(
+                app.config['WORKSPACE_POOL_DIR'],
+                app.config['WORKSPACE_POOL_SIZE'],
+                app.repository_manager.provision_workspace,
+                prefetcher=app.compiler_manager.prefetch_downloads,
+                is_idle=app.compiler_manager.is_idle,
+                current_revision=app.repository_manager.current_revision,
+                interval=app.config.get('WORKSPACE_POOL_INTERVAL', 300),
+                logger=logger
+            )
+            workspace_pool.setup()
+            workspace_pool.start()
+            app.workspace_pool = workspace_pool
+            app.repository_manager.workspace_pool = workspace_pool
+        except OSError as e:
+            logger.warning(f"创建预热工作区池失败，新用户首次克隆时再准备工作区: {e}")
 
     # 初始化仓库控制器
     app.repository_controller = RepositoryController(app.repository_manager, app.user_manager, logger)
@@ -402,13 +446,16 @@ def register_api_routes(app, logger):
                 "device_name": data.get('device_name', '未知设备'),
                 "packages": data.get('packages', []),
                 "compile_threads": data.get('compile_threads', 'auto'),
-                "enable_email_notification": data.get('enable_email_notification', True)
+                "enable_ccache": data.get('enable_ccache', True),
+                "use_cache": data.get('use_cache', True),
+                "enable_email_notification": data.get('enable_email_notification', True),
+                "priority": data.get('priority', 'normal')  # 非管理员的高优先级在编译管理器中降为普通
             }
 
             result = app.compiler_manager.start_compile(username, compile_config)
 
             if result['success']:
-                return success_response(result, "编译任务已启动")
+                return success_response(result, result['message'])
             else:
                 return error_response(result['message'], 400)
 
@@ -492,17 +539,20 @@ def register_api_routes(app, logger):
             return error_response("安装feeds时发生错误", 500)
 
     @app.route(f'{api_prefix}/compiler/compile', methods=['POST'])
-    def start_compile():
+    def compiler_compile():
         """开始编译"""
         try:
             data = request.get_json() or {}
-            task_id = data.get('task_id', f"compile_{int(time.time())}")
+            username = data.get('username')
             config = data.get('config', {})
 
-            result = app.compiler_manager.start_compile(task_id, config)
+            if not username:
+                return error_response("缺少用户名", 400)
+
+            result = app.compiler_manager.start_compile(username, config)
 
             if result['success']:
-                return success_response(result, "编译任务已启动")
+                return success_response(result, result['message'])
             else:
                 return error_response(result['message'], 400)
 
@@ -525,17 +575,134 @@ def register_api_routes(app, logger):
             logger.error(f"获取任务状态API错误: {e}")
             return error_response("获取任务状态时发生错误", 500)
 
+    @app.route(f'{api_prefix}/compiler/tasks/<task_id>/log', methods=['GET'])
+    def get_task_log(task_id):
+        """按行号范围读取任务日志（start/count 或 tail）"""
+        try:
+            tail = request.args.get('tail')
+            task_log = app.compiler_manager.get_task_log(
+                task_id,
+                start=int(request.args.get('start', 0)),
+                count=int(request.args.get('count', 500)),
+                tail=int(tail) if tail is not None else None
+            )
+
+            if task_log:
+                return success_response(task_log, "获取任务日志成功")
+            else:
+                return error_response("任务日志不存在", 404)
+
+        except ValueError:
+            return error_response("参数格式错误", 400)
+        except Exception as e:
+            logger.error(f"获取任务日志API错误: {e}")
+            return error_response("获取任务日志时发生错误", 500)
+
+    @app.route(f'{api_prefix}/compiler/tasks/<task_id>/profile', methods=['GET'])
+    def get_build_profile(task_id):
+        """获取任务的最慢软件包报告，format=folded 时返回火焰图数据"""
+        try:
+            if request.args.get('format') == 'folded':
+                folded = app.compiler_manager.get_build_profile_folded(task_id)
+                if folded is None:
+                    return error_response("编译耗时分析不存在", 404)
+                return Response(folded, mimetype='text/plain', headers={
+                    'Content-Disposition': f'attachment; filename={task_id}.folded'
+                })
+
+            limit = int(request.args.get('limit', 20))
+            report = app.compiler_manager.get_build_profile(task_id, limit if limit > 0 else None)
+            if report:
+                return success_response(report, "获取编译耗时分析成功")
+            else:
+                return error_response("编译耗时分析不存在", 404)
+
+        except ValueError:
+            return error_response("参数格式错误", 400)
+        except Exception as e:
+            logger.error(f"获取编译耗时分析API错误: {e}")
+            return error_response("获取编译耗时分析时发生错误", 500)
+
+    @app.route(f'{api_prefix}/compiler/tasks/<task_id>/resources', methods=['GET'])
+    def get_task_resources(task_id):
+        """获取任务编译阶段的资源占用时间序列"""
+        try:
+            resources = app.compiler_manager.get_task_resources(task_id)
+            if resources:
+                return success_response(resources, "获取资源采样成功")
+            else:
+                return error_response("资源采样不存在", 404)
+
+        except Exception as e:
+            logger.error(f"获取资源采样API错误: {e}")
+            return error_response("获取资源采样时发生错误", 500)
+
+    @app.route(f'{api_prefix}/compiler/tasks/<task_id>/ccache', methods=['GET'])
+    def get_task_ccache_stats(task_id):
+        """获取任务编译阶段的 ccache 命中统计"""
+        try:
+            stats = app.compiler_manager.get_task_ccache_stats(task_id)
+            if stats:
+                return success_response(stats, "获取ccache统计成功")
+            else:
+                return error_response("ccache统计不存在", 404)
+
+        except Exception as e:
+            logger.error(f"获取ccache统计API错误: {e}")
+            return error_response("获取ccache统计时发生错误", 500)
+
+    @app.route(f'{api_prefix}/compiler/ccache', methods=['GET'])
+    def get_ccache_stats():
+        """获取共享 ccache 的总体统计"""
+        try:
+            stats = app.compiler_manager.get_ccache_stats()
+            if stats:
+                return success_response(stats, "获取ccache统计成功")
+            else:
+                return error_response("未启用共享ccache", 404)
+
+        except Exception as e:
+            logger.error(f"获取ccache统计API错误: {e}")
+            return error_response("获取ccache统计时发生错误", 500)
+
+    @app.route(f'{api_prefix}/compiler/caches', methods=['GET'])
+    def get_cache_stats():
+        """获取各共享缓存的统计"""
+        try:
+            stats = app.compiler_manager.get_cache_stats()
+            return success_response(stats, "获取缓存统计成功")
+
+        except Exception as e:
+            logger.error(f"获取缓存统计API错误: {e}")
+            return error_response("获取缓存统计时发生错误", 500)
+
     @app.route(f'{api_prefix}/compiler/tasks', methods=['GET'])
     def list_tasks():
         """列出所有任务"""
         try:
-            tasks = app.compiler_manager.list_tasks()
+            tasks = app.compiler_manager.list_tasks(
+                username=request.args.get('username'),
+                status=request.args.get('status'),
+                limit=int(request.args.get('limit', 100))
+            )
             return success_response({"tasks": tasks}, "获取任务列表成功")
 
         except Exception as e:
             logger.error(f"获取任务列表API错误: {e}")
             return error_response("获取任务列表时发生错误", 500)
 
+    @app.route(f'{api_prefix}/compiler/queue', methods=['GET'])
+    def get_compile_queue():
+        """获取编译队列（排队位置和预计开始时间）"""
+        try:
+            username = request.args.get('username')
+            queue_status = app.compiler_manager.get_queue_status(username)
+            return success_response(queue_status, "获取编译队列成功")
+
+        except Exception as e:
+            logger.error(f"获取编译队列API错误: {e}")
+            return error_response("获取编译队列时发生错误", 500)
+
     @app.route(f'{api_prefix}/compiler/repository', methods=['GET'])
     def get_repository_status():
         """获取仓库状态"""
@@ -0,0 +1,229 @@
+"""
+自动选择编译并发数
+compile_threads 为 auto 时根据可用内存、历史编译中单个编译进程的峰值内存和系统负载确定 make -j；
+使用共享 jobserver 时由调节器在编译过程中按内存压力和系统负载扣留或归还令牌
+"""
+
+import os
+import math
+import threading
+from typing import Optional, Dict, Any, Callable
+
+import psutil
+
+
+GIB = 1024 ** 3
+
+
+def parse_compile_threads(value: Any) -> Optional[int]:
+    """
+    解析用户指定的编译线程数
+
+    Args:
+        value: compile_threads 配置（整数、数字字符串或 "auto"）
+
+    Returns:
+        int: 指定的线程数，auto 或无效值返回None
+    """
+    if isinstance(value, bool):
+        return None
+    try:
+        threads = int(value)
+    except (TypeError, ValueError):
+        return None
+    return threads if threads > 0 else None
+
+
+def select_jobs(budget: int, memory_per_job: float, memory_reserve: float,
+                own_jobs: int = 0) -> Dict[str, Any]:
+    """
+    根据CPU预算、可用内存和系统负载选择并发数
+
+    Args:
+        budget: CPU预算（本任务最多可用的并发数）
+        memory_per_job: 单个编译进程预计的峰值内存（字节）
+        memory_reserve: 为系统和后端保留的内存（字节）
+        own_jobs: 本后端其他编译已占用的并发数（不计入外部负载）
+
+    Returns:
+        dict: jobs 以及各项限制（cpu_jobs、memory_jobs、load_jobs）和依据
+    """
+    memory = psutil.virtual_memory()
+    cpu_count = os.cpu_count() or 1
+
+    memory_jobs = max(1, math.floor((memory.available - memory_reserve) / memory_per_job))
+
+    try:
+        load = os.getloadavg()[0]
+    except OSError:
+        load = 0.0
+    external_load = max(0.0, load - own_jobs)
+    load_jobs = max(1, math.floor(cpu_count - external_load))
+
+    jobs = max(1, min(budget, memory_jobs, load_jobs))
+    return {
+        "jobs": jobs,
+        "cpu_jobs": budget,
+        "memory_jobs": memory_jobs,
+        "load_jobs": load_jobs,
+        "available_memory": memory.available,
+        "memory_per_job": int(memory_per_job),
+        "load_average": round(load, 2)
+    }
+
+
+class MemoryGovernor:
+    """
+    jobserver 内存压力和负载调节器
+
+    后台线程定期检查内存：总内存按单个编译进程峰值内存只够 N 个并发时，扣留超出 N 的令牌；
+    可用内存低于保留值或系统开始换出时再多扣留令牌，内存恢复后逐个归还。
+    其他程序占用CPU时（1分钟负载均值减去本后端编译占用的并发），同样扣留超出剩余核数的令牌。
+    扣留的令牌只有在被其他编译进程归还到管道后才能取到，调节有一定滞后。
+    """
+
+    OWNER = "memory-governor"
+
+    def __init__(self, jobserver, memory_per_job: Callable[[], float], memory_reserve: float,
+                 logger=None, interval: float = 5.0, min_jobs: int = 1):
+        """
+        初始化调节器
+
+        Args:
+            jobserver: MakeJobserver
+            memory_per_job: 返回单个编译进程预计峰值内存（字节）的函数
+            memory_reserve: 为系统和后端保留的内存（字节）
+            logger: 日志记录器
+            interval: 检查间隔（秒）
+            min_jobs: 至少保留给编译的令牌数
+        """
+        self.jobserver = jobserver
+        self.memory_per_job = memory_per_job
+        self.memory_reserve = memory_reserve
+        self.logger = logger
+        self.interval = interval
+        self.min_jobs = max(1, min_jobs)
+
+        self.target_withheld = 0
+        self.load_jobs: Optional[int] = None
+        self._last_swap_out: Optional[int] = None
+        self._own_load: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _log(self, level: str, message: str):
+        """记录日志"""
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    def start(self):
+        """启动调节线程"""
+        if self._thread is None:
+            # 后端重启后沿用 jobserver 状态文件中记录的扣留数
+            self.target_withheld = self.jobserver.held(self.OWNER)
+            self._thread = threading.Thread(target=self._loop, name="memory-governor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止调节线程（扣留的令牌保持不变，由 jobserver 状态文件记录）"""
+        self._stop.set()
+
+    def _swapping(self) -> bool:
+        """自上次检查以来系统是否有换出"""
+        try:
+            swap_out = psutil.swap_memory().sout
+        except Exception:
+            return False
+        last, self._last_swap_out = self._last_swap_out, swap_out
+        return last is not None and swap_out > last
+
+    def _external_load_jobs(self) -> Optional[int]:
+        """
+        按其他程序造成的负载计算编译可用的并发数
+
+        负载均值是1分钟的指数平均，本后端编译占用的并发（被取走的令牌）按同样的时间常数平滑后再扣除，
+        编译并发骤降时不会把仍未衰减的负载误当成外部负载。
+
+        Returns:
+            int: 可用的并发数，无法读取负载时返回None
+        """
+        try:
+            load = os.getloadavg()[0]
+        except OSError:
+            return None
+
+        jobs = self.jobserver.jobs
+        busy = max(0, jobs - self.jobserver.available() - self.jobserver.held(self.OWNER))
+        decay = math.exp(-self.interval / 60)
+        if self._own_load is None:
+            self._own_load = float(busy)
+        else:
+            self._own_load = self._own_load * decay + busy * (1 - decay)
+
+        cpu_count = os.cpu_count() or 1
+        free_cores = max(0.0, cpu_count - max(0.0, load - self._own_load))
+        # 令牌数有意超过核数时按空闲核数的比例缩减，没有外部负载时不扣留
+        return max(self.min_jobs, min(jobs, math.floor(max(jobs, cpu_count) * free_cores / cpu_count)))
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.adjust()
+            except Exception as e:
+                self._log("error", f"内存压力调节失败: {e}")
+
+    def adjust(self) -> Dict[str, Any]:
+        """
+        检查一次内存和负载并调整扣留的令牌数
+
+        Returns:
+            dict: 当前的调节状态
+        """
+        jobs = self.jobserver.jobs
+        per_job = max(1.0, float(self.memory_per_job()))
+        memory = psutil.virtual_memory()
+        max_withheld = max(0, jobs - self.min_jobs)
+
+        # 总内存只够这么多并发、其他程序占用了部分CPU时，超出部分的令牌始终扣留
+        memory_jobs = max(self.min_jobs, math.floor((memory.total - self.memory_reserve) / per_job))
+        self.load_jobs = self._external_load_jobs()
+        load_jobs = self.load_jobs if self.load_jobs is not None else jobs
+        floor_withheld = max(0, jobs - min(memory_jobs, load_jobs))
+
+        target = max(self.target_withheld, floor_withheld)
+        if memory.available < self.memory_reserve or self._swapping():
+            deficit = max(per_job, self.memory_reserve - memory.available)
+            target += max(1, math.ceil(deficit / per_job))
+        elif memory.available > self.memory_reserve + 2 * per_job:
+            target -= 1
+        target = min(max_withheld, max(floor_withheld, target))
+
+        if target != self.target_withheld:
+            self._log("info" if target < self.target_withheld else "warning",
+                      f"内存压力调节: 可用内存 {memory.available / GIB:.1f}G，负载可用并发 {self.load_jobs}，"
+                      f"编译并发上限 {jobs - self.target_withheld} -> {jobs - target}")
+        self.target_withheld = target
+
+        held = self.jobserver.held(self.OWNER)
+        if held < target:
+            self.jobserver.try_acquire(self.OWNER, target - held)
+        elif held > target:
+            self.jobserver.release(self.OWNER, held - target)
+
+        return self.get_status()
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        获取调节状态
+
+        Returns:
+            dict: target_withheld（目标扣留数）、withheld（实际扣留数）、load_jobs（按外部负载可用的并发数）、
+                  effective_jobs
+        """
+        withheld = self.jobserver.held(self.OWNER)
+        return {
+            "target_withheld": self.target_withheld,
+            "withheld": withheld,
+            "load_jobs": self.load_jobs,
+            "effective_jobs": self.jobserver.jobs - withheld
+        }
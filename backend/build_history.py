@@ -0,0 +1,348 @@
+"""
+编译历史与耗时预测
+记录每次成功编译的阶段耗时和软件包耗时，根据相似的历史编译（相同目标、软件包重合度、并发数）预测剩余时间
+"""
+
+import json
+import math
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Set
+
+from utils.logger import setup_logger
+
+
+# 编译任务的阶段顺序（与 CompilerManager 中的执行顺序一致）
+BUILD_STAGES = ("prepare", "download", "configure", "compile", "package")
+
+TARGET_BOARD_PATTERN = re.compile(r'^CONFIG_TARGET_BOARD="([^"]*)"', re.MULTILINE)
+TARGET_SUBTARGET_PATTERN = re.compile(r'^CONFIG_TARGET_SUBTARGET="([^"]*)"', re.MULTILINE)
+
+
+def load_build_target(work_dir: Path) -> Optional[str]:
+    """
+    从 .config 读取编译目标（board/subtarget）
+
+    Args:
+        work_dir: LEDE源码目录
+
+    Returns:
+        str: 例如 "ramips/mt7621"，无法确定时返回None
+    """
+    config_file = Path(work_dir) / ".config"
+    if not config_file.exists():
+        return None
+
+    content = config_file.read_text(encoding='utf-8', errors='replace')
+    board = TARGET_BOARD_PATTERN.search(content)
+    if not board:
+        return None
+
+    subtarget = TARGET_SUBTARGET_PATTERN.search(content)
+    return f"{board.group(1)}/{subtarget.group(1)}" if subtarget else board.group(1)
+
+
+class EtaModel:
+    """
+    单个任务的耗时预测模型
+
+    在编译阶段开始时根据历史数据构建一次，之后每次估算只做常数时间计算。
+    """
+
+    # 样本不足时的最小相对误差
+    MIN_SPREAD = 0.1
+    FEW_SAMPLES_SPREAD = 0.3
+
+    def __init__(self, stage_durations: Dict[str, float], stage_spread: Dict[str, float],
+                 samples: int, same_target: bool):
+        """
+        初始化预测模型
+
+        Args:
+            stage_durations: 各阶段预测耗时（秒）
+            stage_spread: 各阶段相对误差（变异系数）
+            samples: 参与预测的历史编译数
+            same_target: 样本是否都来自相同编译目标
+        """
+        self.stage_durations = stage_durations
+        self.stage_spread = stage_spread
+        self.samples = samples
+        self.same_target = same_target
+
+    @property
+    def confidence(self) -> str:
+        """置信度"""
+        if self.samples >= 5 and self.same_target and self.stage_spread.get("compile", 1) <= 0.2:
+            return "high"
+        if self.samples >= 2 and self.same_target:
+            return "medium"
+        return "low"
+
+    def estimate(self, stage: str, stage_elapsed: float,
+                 stage_fraction: Optional[float] = None) -> Dict[str, Any]:
+        """
+        估算剩余时间
+
+        当前阶段已知完成比例（编译阶段的软件包进度）时按比例扣减，否则按已用时间扣减。
+
+        Args:
+            stage: 当前阶段
+            stage_elapsed: 当前阶段已用时间（秒）
+            stage_fraction: 当前阶段完成比例（0-1，可选）
+
+        Returns:
+            dict: 剩余时间及置信区间
+        """
+        predicted = self.stage_durations.get(stage, 0.0)
+        if stage_fraction is not None and stage_fraction > 0:
+            current = predicted * (1 - min(stage_fraction, 1.0))
+        else:
+            current = max(0.0, predicted - stage_elapsed)
+
+        later = BUILD_STAGES[BUILD_STAGES.index(stage) + 1:] if stage in BUILD_STAGES else ()
+        remaining = current + sum(self.stage_durations.get(s, 0.0) for s in later)
+
+        spread = max(self.MIN_SPREAD, self.stage_spread.get(stage, self.MIN_SPREAD))
+        if self.samples < 3:
+            spread = max(spread, self.FEW_SAMPLES_SPREAD)
+
+        return {
+            "eta_seconds": int(remaining),
+            "eta_low_seconds": int(remaining * (1 - spread)),
+            "eta_high_seconds": int(remaining * (1 + spread)),
+            "estimated_end_time": time.time() + remaining,
+            "eta_confidence": self.confidence,
+            "eta_samples": self.samples
+        }
+
+
+def extrapolate_eta(elapsed: float, fraction: float) -> Optional[Dict[str, Any]]:
+    """
+    没有历史数据时按当前进度线性外推剩余时间
+
+    Args:
+        elapsed: 当前阶段已用时间（秒）
+        fraction: 当前阶段完成比例（0-1）
+
+    Returns:
+        dict: 剩余时间及置信区间，进度太少时返回None
+    """
+    if fraction < 0.05:
+        return None
+
+    remaining = elapsed * (1 - fraction) / fraction
+    return {
+        "eta_seconds": int(remaining),
+        "eta_low_seconds": int(remaining * 0.5),
+        "eta_high_seconds": int(remaining * 1.5),
+        "estimated_end_time": time.time() + remaining,
+        "eta_confidence": "low",
+        "eta_samples": 0
+    }
+
+
+class BuildHistory:
+    """编译历史存储"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS build_history (
+            task_id TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            target TEXT,
+            threads INTEGER,
+            packages TEXT,
+            stage_durations TEXT,
+            make_stage_durations TEXT,
+            package_durations TEXT,
+            memory_per_job REAL,
+            total_duration REAL NOT NULL,
+            finished_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_build_history_target ON build_history (target, finished_at);
+    """
+
+    JSON_FIELDS = ("packages", "stage_durations", "make_stage_durations", "package_durations")
+
+    # 旧数据库缺少的列
+    ADDED_COLUMNS = {"memory_per_job": "REAL"}
+
+    # 线程数对编译耗时的影响指数（耗时 ∝ 线程数^-α，α<1 反映并行效率损失）
+    THREAD_SCALING = 0.8
+
+    def __init__(self, db_path: Path, logger=None, max_samples: int = 20):
+        """
+        初始化编译历史存储
+
+        Args:
+            db_path: 数据库文件路径
+            logger: 日志记录器
+            max_samples: 预测时最多参考的历史编译数
+        """
+        self.db_path = Path(db_path)
+        self.logger = logger or setup_logger(__name__)
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(self.SCHEMA)
+            existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(build_history)")}
+            for column, column_type in self.ADDED_COLUMNS.items():
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE build_history ADD COLUMN {column} {column_type}")
+            self._conn.commit()
+
+    def record_build(self, record: Dict[str, Any]):
+        """
+        记录一次成功的编译
+
+        Args:
+            record: 编译记录，包含 task_id、username、target、threads、packages（列表）、
+                    stage_durations、make_stage_durations、package_durations、memory_per_job、total_duration
+        """
+        values = dict(record)
+        values.setdefault("finished_at", time.time())
+        for field in self.JSON_FIELDS:
+            values[field] = json.dumps(values.get(field) or ([] if field == "packages" else {}))
+
+        columns = list(values.keys())
+        sql = (f"INSERT OR REPLACE INTO build_history ({', '.join(columns)}) "
+               f"VALUES ({', '.join('?' for _ in columns)})")
+
+        try:
+            with self._lock:
+                self._conn.execute(sql, [values[col] for col in columns])
+                self._conn.commit()
+        except sqlite3.Error as e:
+            self.logger.error(f"保存编译历史失败 {record.get('task_id')}: {e}")
+
+    def _load(self, target: Optional[str]) -> List[Dict[str, Any]]:
+        """读取最近的历史编译（指定目标或全部）"""
+        sql = "SELECT * FROM build_history"
+        params: List[Any] = []
+        if target:
+            sql += " WHERE target = ?"
+            params.append(target)
+        sql += " ORDER BY finished_at DESC LIMIT ?"
+        params.append(self.max_samples)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        records = []
+        for row in rows:
+            record = dict(row)
+            for field in self.JSON_FIELDS:
+                try:
+                    record[field] = json.loads(record[field]) if record[field] else None
+                except (TypeError, ValueError):
+                    record[field] = None
+            records.append(record)
+        return records
+
+    def build_model(self, target: Optional[str], packages: Set[str],
+                    threads: Optional[int]) -> Optional[EtaModel]:
+        """
+        根据相似的历史编译构建预测模型
+
+        每个历史编译的编译阶段耗时按软件包差异（增加的软件包取历史平均耗时，减少的软件包扣除其耗时）
+        和线程数差异修正，再按软件包重合度（Jaccard）与线程数接近程度加权平均。
+
+        Args:
+            target: 编译目标（board/subtarget）
+            packages: 软件包集合
+            threads: make 并发数
+
+        Returns:
+            EtaModel: 预测模型，没有历史数据时返回None
+        """
+        same_target = True
+        records = self._load(target) if target else []
+        if not records:
+            same_target = False
+            records = self._load(None)
+        if not records:
+            return None
+
+        # 各软件包的历史平均耗时
+        package_totals: Dict[str, List[float]] = {}
+        for record in records:
+            for name, duration in (record.get("package_durations") or {}).items():
+                package_totals.setdefault(name, []).append(duration)
+        package_average = {name: sum(d) / len(d) for name, d in package_totals.items()}
+
+        weighted: Dict[str, List[tuple]] = {stage: [] for stage in BUILD_STAGES}
+        for record in records:
+            stages = record.get("stage_durations") or {}
+            past_packages = set(record.get("packages") or [])
+            past_durations = record.get("package_durations") or {}
+
+            if packages or past_packages:
+                union = packages | past_packages
+                overlap = len(packages & past_packages) / len(union) if union else 1.0
+            else:
+                overlap = 1.0
+
+            thread_factor = 1.0
+            thread_weight = 1.0
+            if threads and record.get("threads"):
+                ratio = record["threads"] / threads
+                thread_factor = ratio ** self.THREAD_SCALING
+                thread_weight = 1 / (1 + abs(math.log2(ratio)))
+
+            weight = max(overlap, 0.05) * thread_weight
+
+            for stage in BUILD_STAGES:
+                if stage not in stages:
+                    continue
+                duration = stages[stage]
+                if stage == "compile":
+                    added = sum(package_average.get(name, 0.0) for name in packages - past_packages)
+                    removed = sum(past_durations.get(name, 0.0) for name in past_packages - packages)
+                    duration = max(duration * 0.1, duration + added - removed) * thread_factor
+                weighted[stage].append((duration, weight))
+
+        stage_durations: Dict[str, float] = {}
+        stage_spread: Dict[str, float] = {}
+        for stage, samples in weighted.items():
+            if not samples:
+                continue
+            total_weight = sum(w for _, w in samples)
+            mean = sum(d * w for d, w in samples) / total_weight
+            variance = sum(w * (d - mean) ** 2 for d, w in samples) / total_weight
+            stage_durations[stage] = mean
+            stage_spread[stage] = math.sqrt(variance) / mean if mean > 0 else 0.0
+
+        return EtaModel(stage_durations, stage_spread, len(records), same_target)
+
+    def memory_per_job(self, target: Optional[str] = None) -> Optional[float]:
+        """
+        历史编译中单个编译进程的峰值内存（取最近几次的最大值，偏保守）
+
+        Args:
+            target: 编译目标，没有该目标的记录时使用所有目标的记录
+
+        Returns:
+            float: 字节数，没有记录时返回None
+        """
+        sql = ("SELECT memory_per_job FROM build_history WHERE memory_per_job IS NOT NULL {} "
+               "ORDER BY finished_at DESC LIMIT 5")
+        with self._lock:
+            rows = []
+            if target:
+                rows = self._conn.execute(sql.format("AND target = ?"), (target,)).fetchall()
+            if not rows:
+                rows = self._conn.execute(sql.format("")).fetchall()
+        return max(row[0] for row in rows) if rows else None
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
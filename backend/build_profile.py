@@ -0,0 +1,162 @@
+"""
+编译耗时分析
+根据进度跟踪器记录的软件包构建步骤耗时，生成按耗时排序的软件包报告和火焰图（folded stacks）文件
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+from compile_progress import CompileProgressTracker
+
+
+class BuildProfile:
+    """单个编译任务的耗时分析结果"""
+
+    def __init__(self, task_id: str, phase_durations: Dict[str, Dict[str, float]],
+                 package_stages: Optional[Dict[str, str]] = None,
+                 stage_durations: Optional[Dict[str, float]] = None,
+                 total_seconds: float = 0.0):
+        """
+        初始化耗时分析结果
+
+        Args:
+            task_id: 任务ID
+            phase_durations: {软件包路径: {构建步骤: 秒}}
+            package_stages: {软件包路径: 所属make阶段}，例如 "package/compile"
+            stage_durations: 各make阶段耗时
+            total_seconds: 编译阶段总耗时
+        """
+        self.task_id = task_id
+        self.phase_durations = phase_durations
+        self.package_stages = package_stages or {}
+        self.stage_durations = stage_durations or {}
+        self.total_seconds = total_seconds
+
+    @classmethod
+    def from_tracker(cls, task_id: str, tracker: CompileProgressTracker) -> "BuildProfile":
+        """
+        从进度跟踪器生成耗时分析（调用前应已执行 tracker.finish()）
+
+        Args:
+            task_id: 任务ID
+            tracker: 进度跟踪器
+
+        Returns:
+            BuildProfile: 耗时分析结果
+        """
+        return cls(
+            task_id,
+            {package: dict(phases) for package, phases in tracker.phase_durations.items()},
+            dict(tracker.package_stages),
+            dict(tracker.stage_durations),
+            time.time() - tracker.start_time
+        )
+
+    def packages(self) -> List[Dict[str, Any]]:
+        """
+        按总耗时从高到低排列的软件包
+
+        Returns:
+            list: 每项包含 package、name、stage、total_seconds、phases
+        """
+        packages = []
+        for package, phases in self.phase_durations.items():
+            packages.append({
+                "package": package,
+                "name": package.rsplit("/", 1)[-1],
+                "stage": self.package_stages.get(package),
+                "total_seconds": round(sum(phases.values()), 2),
+                "phases": {phase: round(seconds, 2) for phase, seconds in phases.items()}
+            })
+        packages.sort(key=lambda item: item["total_seconds"], reverse=True)
+        return packages
+
+    def report(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        生成最慢软件包报告
+
+        Args:
+            limit: 最多返回的软件包数（None表示全部）
+
+        Returns:
+            dict: 报告内容
+        """
+        packages = self.packages()
+        profiled = sum(item["total_seconds"] for item in packages)
+        for item in packages:
+            item["share"] = round(item["total_seconds"] / profiled, 4) if profiled else 0.0
+
+        return {
+            "task_id": self.task_id,
+            "total_seconds": round(self.total_seconds, 2),
+            "profiled_seconds": round(profiled, 2),
+            "package_count": len(packages),
+            "make_stages": {stage: round(seconds, 2) for stage, seconds in self.stage_durations.items()},
+            "packages": packages[:limit] if limit else packages
+        }
+
+    def folded_lines(self) -> List[str]:
+        """
+        生成 folded stacks 格式的行（可直接交给 flamegraph.pl / speedscope）
+
+        每行为 "make阶段;路径各级目录;构建步骤 毫秒数"，例如
+        "package/compile;package;feeds;packages;curl;compile 12345"
+
+        Returns:
+            list: folded stacks 行
+        """
+        lines = []
+        for package, phases in sorted(self.phase_durations.items()):
+            frames = []
+            stage = self.package_stages.get(package)
+            if stage:
+                frames.append(stage)
+            frames.extend(part for part in package.split("/") if part)
+            for phase, seconds in sorted(phases.items()):
+                millis = int(round(seconds * 1000))
+                if millis > 0:
+                    stack = ";".join(frames + [phase]).replace(" ", "_")
+                    lines.append(f"{stack} {millis}")
+        return lines
+
+    def save(self, profile_dir: Path):
+        """
+        保存报告（<task_id>.json）和火焰图数据（<task_id>.folded）
+
+        Args:
+            profile_dir: 保存目录
+        """
+        profile_dir = Path(profile_dir)
+        profile_dir.mkdir(parents=True, exist_ok=True)
+
+        for suffix, content in ((".json", json.dumps(self.report(), ensure_ascii=False, indent=2)),
+                                (".folded", "\n".join(self.folded_lines()) + "\n")):
+            target = profile_dir / f"{self.task_id}{suffix}"
+            tmp = target.with_suffix(target.suffix + ".tmp")
+            tmp.write_text(content, encoding='utf-8')
+            os.replace(tmp, target)
+
+
+def load_profile_report(profile_dir: Path, task_id: str, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    读取已保存的耗时报告
+
+    Args:
+        profile_dir: 保存目录
+        task_id: 任务ID
+        limit: 最多返回的软件包数
+
+    Returns:
+        dict: 报告内容，不存在时返回None
+    """
+    report_file = Path(profile_dir) / f"{task_id}.json"
+    if not report_file.exists():
+        return None
+
+    report = json.loads(report_file.read_text(encoding='utf-8'))
+    if limit:
+        report["packages"] = report.get("packages", [])[:limit]
+    return report
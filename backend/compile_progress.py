@@ -0,0 +1,352 @@
+"""
+编译进度跟踪
+按行流式解析make输出，以常数时间更新计数，根据 .config 选中的软件包数量给出“第X个/共Y个”的真实进度
+"""
+
+import re
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Set, Tuple
+
+
+# 顶层阶段行，例如 " make[2] package/compile"、" make[2] target/install"
+STAGE_PATTERN = re.compile(r"make\[\d+\] (tools|toolchain|target|package)/(\w+)(?=\s|$)")
+
+# 软件包构建步骤行，例如 " make[2] package/feeds/packages/curl/compile"、
+# " make[3] -C package/utils/busybox compile"、" make[2] toolchain/gcc/initial/compile"
+PHASE_PATTERN = re.compile(
+    r"make\[\d+\] (?:-C )?((?:package|feeds|tools|toolchain|target)/\S+?)[/ ]"
+    r"((?:host/)?(?:download|prepare|configure|compile|install))(?=\s|$)"
+)
+
+# 构建系统输出的精确计时行，例如 "time: package/utils/busybox/compile#12.31#3.05#17.42"（用户/系统/实际秒数）
+TIME_PATTERN = re.compile(
+    r"^time: ((?:package|feeds|tools|toolchain|target)/\S+?)/((?:host/)?\w+)#[\d.]+#[\d.]+#([\d.]+)"
+)
+
+# 软件包目录行，例如 " make[3] -C package/utils/busybox compile"、
+# "make[3]: Entering directory '/home/lede/feeds/packages/net/curl'"
+PACKAGE_PATTERN = re.compile(
+    r"(?:-C |Entering directory [`'])(?:\S*/)?(?:package|feeds)/([^\s']+?)/?(?:'|\s|$)"
+)
+
+# 没有 .config 统计时退回的关键词进度
+KEYWORD_PATTERN = re.compile(
+    r"checking|downloading|extracting|patching|configuring|building|compiling|"
+    r"installing|packaging|successfully",
+    re.IGNORECASE
+)
+KEYWORD_PROGRESS = {
+    'checking': 5,
+    'downloading': 10,
+    'extracting': 15,
+    'patching': 20,
+    'configuring': 25,
+    'building': 30,
+    'compiling': 40,
+    'installing': 80,
+    'packaging': 90,
+    'successfully': 95
+}
+
+# .config 中选中的软件包（内置或模块）
+CONFIG_PACKAGE_PATTERN = re.compile(r"^CONFIG_PACKAGE_(\S+)=[ym]$", re.MULTILINE)
+
+
+def load_package_sources(work_dir: Path) -> Dict[str, str]:
+    """
+    读取 make defconfig 生成的 tmp/.packageinfo，得到软件包到源码目录名的映射
+
+    一个源码目录（Makefile）可以生成多个软件包，例如所有 kmod-* 都来自 package/kernel/linux。
+
+    Args:
+        work_dir: LEDE源码目录
+
+    Returns:
+        dict: {软件包名: 源码目录名}
+    """
+    package_info = Path(work_dir) / "tmp" / ".packageinfo"
+    sources: Dict[str, str] = {}
+    if not package_info.exists():
+        return sources
+
+    source_dir = None
+    with open(package_info, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if line.startswith("Source-Makefile: "):
+                source_dir = Path(line[len("Source-Makefile: "):].strip()).parent.name
+            elif line.startswith("Package: ") and source_dir:
+                sources[line[len("Package: "):].strip()] = source_dir
+    return sources
+
+
+def load_expected_packages(work_dir: Path) -> Optional[Set[str]]:
+    """
+    统计本次编译需要构建的软件包源码目录
+
+    Args:
+        work_dir: LEDE源码目录
+
+    Returns:
+        set: 源码目录名集合；缺少 .config 或 tmp/.packageinfo 时返回None
+    """
+    config_file = Path(work_dir) / ".config"
+    if not config_file.exists():
+        return None
+
+    sources = load_package_sources(work_dir)
+    if not sources:
+        return None
+
+    selected = CONFIG_PACKAGE_PATTERN.findall(config_file.read_text(encoding='utf-8', errors='replace'))
+    expected = {sources[name] for name in selected if name in sources}
+    return expected or None
+
+
+class CompileProgressTracker:
+    """编译进度跟踪器"""
+
+    def __init__(self, expected_packages: Optional[Set[str]] = None,
+                 start_progress: float = 30.0, end_progress: float = 95.0):
+        """
+        初始化进度跟踪器
+
+        Args:
+            expected_packages: 需要构建的软件包源码目录名（未知时退回关键词估算）
+            start_progress: 编译阶段开始时的进度
+            end_progress: 所有软件包完成时的进度（剩余部分留给固件打包）
+        """
+        self.expected_packages = expected_packages or set()
+        self.start_progress = start_progress
+        self.end_progress = end_progress
+
+        self.stage: Optional[str] = None
+        self.current_package: Optional[str] = None
+        self.seen_packages: Set[str] = set()
+        self.completed_packages = 0
+        self.entered_dirs = 0
+        self.progress = 0.0
+        self.lines = 0
+        self.start_time = time.time()
+
+        # 各make阶段和软件包的耗时（软件包按进入下一个软件包目录的时刻近似划分）
+        self.stage_durations: Dict[str, float] = {}
+        self.package_durations: Dict[str, float] = {}
+        self._stage_start = self.start_time
+        self._package_start = self.start_time
+
+        # 各软件包每个构建步骤（download/prepare/compile/install）的耗时：{软件包路径: {步骤: 秒}}
+        # 默认按下一个步骤开始的时刻近似划分，出现构建系统的 time: 行时以其精确值为准
+        self.phase_durations: Dict[str, Dict[str, float]] = {}
+        self.package_stages: Dict[str, str] = {}
+        self._current_phase: Optional[Tuple[str, str]] = None
+        self._phase_start = self.start_time
+        self._timed_phases: Set[Tuple[str, str]] = set()
+        self._finished = False
+
+    @classmethod
+    def from_workspace(cls, work_dir: Path, **kwargs) -> "CompileProgressTracker":
+        """
+        根据源码目录中的 .config 创建跟踪器
+
+        Args:
+            work_dir: LEDE源码目录
+
+        Returns:
+            CompileProgressTracker: 进度跟踪器
+        """
+        return cls(load_expected_packages(work_dir), **kwargs)
+
+    @property
+    def total_packages(self) -> int:
+        """预计构建的软件包数（未知时为0）"""
+        return len(self.expected_packages)
+
+    @property
+    def fraction(self) -> Optional[float]:
+        """已完成软件包的比例，总数未知时为None"""
+        if not self.expected_packages:
+            return None
+        return min(self.completed_packages, self.total_packages) / self.total_packages
+
+    def feed(self, line: str) -> bool:
+        """
+        处理一行输出
+
+        Args:
+            line: 输出行
+
+        Returns:
+            bool: 已完成的软件包数或阶段是否变化
+        """
+        self.lines += 1
+        changed = False
+
+        # 先用子串判断过滤掉绝大多数编译命令行
+        if "make[" in line:
+            match = STAGE_PATTERN.search(line)
+            if match:
+                stage = f"{match.group(1)}/{match.group(2)}"
+                if stage != self.stage:
+                    # 离开软件包编译阶段时，最后一个软件包也已完成
+                    if self.stage == "package/compile":
+                        self._finish_current_package()
+                    self._finish_stage()
+                    self.stage = stage
+                    changed = True
+            else:
+                match = PHASE_PATTERN.search(line)
+                if match:
+                    self._enter_phase(match.group(1), match.group(2))
+
+            if "-C " in line or "Entering directory" in line:
+                match = PACKAGE_PATTERN.search(line)
+                if match:
+                    self.entered_dirs += 1
+                    changed = self._enter_package(match.group(1).rsplit("/", 1)[-1]) or changed
+
+        elif line.startswith("time: "):
+            match = TIME_PATTERN.match(line)
+            if match:
+                self._record_phase_time(match.group(1), match.group(2), float(match.group(3)))
+
+        if not self.expected_packages:
+            match = KEYWORD_PATTERN.search(line)
+            if match:
+                self.progress = max(self.progress, KEYWORD_PROGRESS[match.group(0).lower()])
+
+        return changed
+
+    def feed_lines(self, lines: List[str]) -> bool:
+        """
+        批量处理输出行
+
+        Args:
+            lines: 输出行列表
+
+        Returns:
+            bool: 已完成的软件包数或阶段是否变化
+        """
+        changed = False
+        for line in lines:
+            changed = self.feed(line) or changed
+        return changed
+
+    def _enter_package(self, package: str) -> bool:
+        """进入软件包目录"""
+        if package in self.seen_packages:
+            return False
+
+        self.seen_packages.add(package)
+
+        if self.expected_packages and package not in self.expected_packages:
+            return False
+
+        # 进入下一个软件包时，上一个视为完成
+        self._finish_current_package()
+        self.current_package = package
+        self._package_start = time.time()
+
+        if not self.expected_packages:
+            # 不知道总数时假设约100个主要编译目标
+            self.progress = max(self.progress, min(30 + len(self.seen_packages) * 0.5, 85))
+            return False
+
+        return True
+
+    def _enter_phase(self, package: str, phase: str):
+        """软件包进入新的构建步骤"""
+        key = (package, phase)
+        if key == self._current_phase:
+            return
+
+        self._finish_phase()
+        self._current_phase = key
+        self._phase_start = time.time()
+        if self.stage:
+            self.package_stages.setdefault(package, self.stage)
+
+    def _finish_phase(self):
+        """记录当前构建步骤的耗时（已有精确计时的步骤不再累加估算值）"""
+        now = time.time()
+        if self._current_phase and self._current_phase not in self._timed_phases:
+            package, phase = self._current_phase
+            phases = self.phase_durations.setdefault(package, {})
+            phases[phase] = phases.get(phase, 0.0) + now - self._phase_start
+        self._current_phase = None
+        self._phase_start = now
+
+    def _record_phase_time(self, package: str, phase: str, seconds: float):
+        """记录构建系统给出的精确步骤耗时"""
+        key = (package, phase)
+        phases = self.phase_durations.setdefault(package, {})
+        if key in self._timed_phases:
+            phases[phase] = phases.get(phase, 0.0) + seconds
+        else:
+            phases[phase] = seconds
+            self._timed_phases.add(key)
+        if self.stage:
+            self.package_stages.setdefault(package, self.stage)
+
+    def _finish_stage(self):
+        """记录当前make阶段的耗时"""
+        now = time.time()
+        if self.stage:
+            self.stage_durations[self.stage] = (
+                self.stage_durations.get(self.stage, 0.0) + now - self._stage_start
+            )
+        self._stage_start = now
+
+    def _finish_current_package(self):
+        """当前软件包完成，记录耗时并更新进度"""
+        if self.current_package is None:
+            return
+
+        self.package_durations[self.current_package] = time.time() - self._package_start
+        self.current_package = None
+
+        if not self.expected_packages:
+            return
+
+        self.completed_packages += 1
+
+        ratio = min(self.completed_packages, self.total_packages) / self.total_packages
+        self.progress = max(self.progress,
+                            self.start_progress + (self.end_progress - self.start_progress) * ratio)
+
+    def finish(self):
+        """编译结束时结算最后的阶段、软件包和构建步骤耗时（重复调用无效）"""
+        if self._finished:
+            return
+        self._finished = True
+        self._finish_current_package()
+        self._finish_phase()
+        self._finish_stage()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取进度快照
+
+        Returns:
+            dict: 进度信息
+        """
+        return {
+            "progress": round(self.progress, 1),
+            "stage": self.stage,
+            "current_package": self.current_package,
+            "packages_done": self.completed_packages,
+            "packages_total": self.total_packages,
+            "lines": self.lines,
+            "elapsed_seconds": int(time.time() - self.start_time)
+        }
+
+    def describe(self) -> str:
+        """进度描述"""
+        if self.total_packages and self.current_package:
+            return (f"正在编译软件包 {min(self.completed_packages + 1, self.total_packages)}/"
+                    f"{self.total_packages}: {self.current_package}")
+        if self.total_packages and self.completed_packages:
+            return f"已编译软件包 {self.completed_packages}/{self.total_packages}，编译阶段: {self.stage}"
+        if self.stage:
+            return f"编译阶段: {self.stage}"
+        return "编译中..."
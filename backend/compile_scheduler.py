@@ -0,0 +1,471 @@
+"""
+编译任务调度器
+多工作线程并发编译，按用户公平分配槽位，并在运行中的编译之间分配CPU预算（make -j）
+"""
+
+import time
+import itertools
+import threading
+from enum import Enum
+from queue import Empty
+from typing import Optional, Dict, Any, Callable, List
+
+
+class CompilePriority(Enum):
+    """编译任务优先级"""
+    LOW = 1
+    NORMAL = 2
+    HIGH = 3
+
+
+class FairShareQueue:
+    """按用户公平调度、支持优先级的编译任务队列"""
+
+    def __init__(self, max_per_user: int = 0):
+        """
+        初始化队列
+
+        Args:
+            max_per_user: 每个用户最多排队的任务数（0表示不限制）
+        """
+        self.max_per_user = max(0, int(max_per_user))
+
+        self._tasks: Dict[str, Any] = {}
+        self._seq = itertools.count()
+        self._order: Dict[str, int] = {}
+        self._last_served: Dict[str, float] = {}
+        self._cond = threading.Condition()
+
+    def count_user(self, username: str) -> int:
+        """统计用户排队中的任务数"""
+        with self._cond:
+            return sum(1 for task in self._tasks.values() if task.username == username)
+
+    def check_quota(self, username: str):
+        """
+        检查用户排队配额
+
+        Raises:
+            ValueError: 超出排队上限
+        """
+        if self.max_per_user and self.count_user(username) >= self.max_per_user:
+            raise ValueError(f"排队任务数已达上限 ({self.max_per_user})，请等待已有任务完成")
+
+    def put(self, task, enforce_quota: bool = True):
+        """
+        添加任务
+
+        Args:
+            task: 编译任务（需要 task_id、username、priority 属性）
+            enforce_quota: 是否检查用户排队上限
+
+        Raises:
+            ValueError: 超出排队上限
+        """
+        with self._cond:
+            queued = sum(1 for t in self._tasks.values() if t.username == task.username)
+            if enforce_quota and self.max_per_user and queued >= self.max_per_user:
+                raise ValueError(f"排队任务数已达上限 ({self.max_per_user})，请等待已有任务完成")
+
+            self._tasks[task.task_id] = task
+            self._order[task.task_id] = next(self._seq)
+            self._cond.notify()
+
+    def remove(self, task_id: str) -> bool:
+        """
+        从队列中移除任务
+
+        Args:
+            task_id: 任务ID
+
+        Returns:
+            bool: 是否移除成功
+        """
+        with self._cond:
+            if task_id not in self._tasks:
+                return False
+            del self._tasks[task_id]
+            del self._order[task_id]
+            return True
+
+    def _sort_key(self, task, running_by_user: Dict[str, int], last_served: Dict[str, float]):
+        """排序键：优先级 > 用户运行中任务数 > 用户上次被调度时间 > 提交顺序"""
+        return (
+            -task.priority.value,
+            running_by_user.get(task.username, 0),
+            last_served.get(task.username, 0.0),
+            self._order[task.task_id]
+        )
+
+    def get(self, running_by_user: Callable[[], Dict[str, int]], timeout: float = None):
+        """
+        取出下一个应执行的任务
+
+        Args:
+            running_by_user: 返回各用户运行中任务数的函数
+            timeout: 等待超时（秒）
+
+        Returns:
+            编译任务
+
+        Raises:
+            Empty: 超时仍无任务
+        """
+        with self._cond:
+            if not self._tasks:
+                self._cond.wait(timeout)
+                if not self._tasks:
+                    raise Empty
+
+            running = running_by_user()
+            task = min(self._tasks.values(),
+                       key=lambda t: self._sort_key(t, running, self._last_served))
+
+            del self._tasks[task.task_id]
+            del self._order[task.task_id]
+            self._last_served[task.username] = time.time()
+            return task
+
+    def snapshot(self, running_by_user: Dict[str, int]) -> List[Any]:
+        """
+        按预计出队顺序返回排队中的任务
+
+        Args:
+            running_by_user: 各用户运行中任务数
+
+        Returns:
+            list: 任务列表
+        """
+        with self._cond:
+            pending = list(self._tasks.values())
+            running = dict(running_by_user)
+            last_served = dict(self._last_served)
+
+            ordered = []
+            clock = time.time()
+            while pending:
+                task = min(pending, key=lambda t: self._sort_key(t, running, last_served))
+                pending.remove(task)
+                ordered.append(task)
+
+                # 模拟出队后的状态变化
+                running[task.username] = running.get(task.username, 0) + 1
+                clock += 1e-6
+                last_served[task.username] = clock
+
+            return ordered
+
+    def qsize(self) -> int:
+        """队列长度"""
+        with self._cond:
+            return len(self._tasks)
+
+
+class CompileScheduler:
+    """编译任务调度器"""
+
+    def __init__(self, max_workers: int, total_jobs: int, logger=None,
+                 max_queued_per_user: int = 0, default_duration: int = 7200):
+        """
+        初始化编译调度器
+
+        Args:
+            max_workers: 并发编译槽位数
+            total_jobs: 所有编译共享的make并发总数（CPU预算）
+            logger: 日志记录器
+            max_queued_per_user: 每个用户最多排队的任务数（0表示不限制）
+            default_duration: 无历史数据时假定的单次编译耗时（秒）
+        """
+        self.logger = logger
+        self.max_workers = max(1, int(max_workers))
+        self.total_jobs = max(1, int(total_jobs))
+
+        # 每个槽位保底可获得的并发数
+        self.min_jobs = max(1, self.total_jobs // self.max_workers)
+
+        self.task_queue = FairShareQueue(max_queued_per_user)
+
+        # 正在占用槽位的任务 {task_id: {"username", "jobs"(未开始make时为0), "start_time"}}
+        self.active_tasks: Dict[str, Dict[str, Any]] = {}
+
+        # 编译耗时的指数移动平均，用于估算排队任务的开始时间
+        self.average_duration = float(default_duration)
+
+        self._executor: Optional[Callable] = None
+        self._workers = []
+        self._running = False
+        self._lock = threading.Lock()
+
+    def _log(self, level: str, message: str):
+        """记录日志"""
+        if self.logger:
+            getattr(self.logger, level.lower())(message)
+        else:
+            print(f"[{level.upper()}] {message}")
+
+    def start(self, executor: Callable):
+        """
+        启动工作线程
+
+        Args:
+            executor: 任务执行函数，接收任务对象
+        """
+        if self._running:
+            return
+
+        self._executor = executor
+        self._running = True
+
+        for i in range(self.max_workers):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"compile-worker-{i}",
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+        self._log("info", f"编译调度器已启动: {self.max_workers} 个槽位, CPU预算 {self.total_jobs}")
+
+    def stop(self):
+        """停止工作线程（正在执行的任务会继续完成）"""
+        self._running = False
+
+    def check_quota(self, username: str):
+        """
+        检查用户是否还能提交任务
+
+        Raises:
+            ValueError: 超出排队上限
+        """
+        self.task_queue.check_quota(username)
+
+    def submit(self, task, enforce_quota: bool = True):
+        """
+        提交编译任务
+
+        Args:
+            task: 编译任务
+            enforce_quota: 是否检查用户排队上限（恢复重启前的任务时不检查）
+
+        Raises:
+            ValueError: 超出排队上限
+        """
+        if not getattr(task, "queued_time", None):
+            task.queued_time = time.time()
+        self.task_queue.put(task, enforce_quota)
+
+    def cancel(self, task_id: str) -> bool:
+        """
+        取消排队中的任务
+
+        Args:
+            task_id: 任务ID
+
+        Returns:
+            bool: 任务是否仍在队列中并已移除
+        """
+        return self.task_queue.remove(task_id)
+
+    def run_now(self, task, jobs: Optional[int] = None):
+        """
+        立即执行任务，不经过排队（用于后端重启后重连仍在运行的编译）
+
+        重连的make进程已经在消耗CPU，因此即使超出槽位数也要计入运行中任务。
+
+        Args:
+            task: 编译任务
+            jobs: 进程已使用的并发数
+        """
+        with self._lock:
+            self.active_tasks[task.task_id] = {
+                "username": task.username,
+                "jobs": jobs or 0,
+                "start_time": time.time()
+            }
+
+        def run():
+            try:
+                self._executor(task)
+            except Exception as e:
+                self._log("error", f"编译工作线程错误: {e}")
+            finally:
+                self.release_jobs(task.task_id)
+
+        # 执行函数在 start() 中设置，需在其后调用
+        if self._executor is None:
+            raise RuntimeError("调度器尚未启动")
+
+        threading.Thread(target=run, name=f"compile-resume-{task.task_id}", daemon=True).start()
+
+    def _running_by_user(self) -> Dict[str, int]:
+        """统计各用户运行中的任务数"""
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for info in self.active_tasks.values():
+                counts[info["username"]] = counts.get(info["username"], 0) + 1
+            return counts
+
+    def _worker_loop(self):
+        """工作线程主循环"""
+        while self._running:
+            try:
+                task = self.task_queue.get(self._running_by_user, timeout=1)
+            except Empty:
+                continue
+
+            start_time = time.time()
+            try:
+                with self._lock:
+                    self.active_tasks[task.task_id] = {
+                        "username": task.username,
+                        "jobs": 0,
+                        "start_time": start_time
+                    }
+
+                self._executor(task)
+
+                # 只统计真正执行过的任务
+                duration = time.time() - start_time
+                if duration > 60:
+                    with self._lock:
+                        self.average_duration = 0.7 * self.average_duration + 0.3 * duration
+
+            except Exception as e:
+                self._log("error", f"编译工作线程错误: {e}")
+            finally:
+                self.release_jobs(task.task_id)
+
+    def acquire_jobs(self, task_id: str, max_jobs: Optional[int] = None) -> int:
+        """
+        为即将启动make的任务分配并发数
+
+        预算按当前占用槽位的任务数平分，且不超过剩余预算；
+        剩余预算不足时退回到每槽位保底值，保证超额有上限。
+
+        Args:
+            task_id: 任务ID
+            max_jobs: 本任务的并发上限（用户指定的线程数或按内存估算的上限）
+
+        Returns:
+            int: make -j 使用的并发数
+        """
+        with self._lock:
+            running = max(1, len(self.active_tasks))
+            allocated = sum(info["jobs"] for tid, info in self.active_tasks.items() if tid != task_id)
+            free_jobs = self.total_jobs - allocated
+
+            fair_share = self.total_jobs // running
+            jobs = min(fair_share, free_jobs)
+            if jobs < self.min_jobs:
+                jobs = self.min_jobs
+            if max_jobs:
+                jobs = max(1, min(jobs, int(max_jobs)))
+
+            if task_id in self.active_tasks:
+                self.active_tasks[task_id]["jobs"] = jobs
+
+        self._log("info", f"任务 {task_id} 分配并发数: -j{jobs} (运行中: {running})")
+        return jobs
+
+    def allocated_jobs(self, exclude: Optional[str] = None) -> int:
+        """
+        运行中的任务已分配的并发数之和
+
+        Args:
+            exclude: 不计入的任务ID
+
+        Returns:
+            int: 并发数
+        """
+        with self._lock:
+            return sum(info["jobs"] for tid, info in self.active_tasks.items() if tid != exclude)
+
+    def release_jobs(self, task_id: str):
+        """
+        释放任务占用的槽位和并发数
+
+        Args:
+            task_id: 任务ID
+        """
+        with self._lock:
+            self.active_tasks.pop(task_id, None)
+
+    def get_queue_status(self) -> Dict[str, Any]:
+        """
+        获取队列状态，包括排队位置和预计开始时间
+
+        预计开始时间按平均编译耗时模拟各槽位的空闲时刻得出。
+
+        Returns:
+            dict: 队列状态
+        """
+        now = time.time()
+        with self._lock:
+            active = {tid: dict(info) for tid, info in self.active_tasks.items()}
+            average = self.average_duration
+
+        running_by_user: Dict[str, int] = {}
+        for info in active.values():
+            running_by_user[info["username"]] = running_by_user.get(info["username"], 0) + 1
+
+        # 各槽位预计空闲时刻
+        slot_free_at = sorted(
+            max(now, info["start_time"] + average) for info in active.values()
+        )
+        slot_free_at += [now] * (self.max_workers - len(slot_free_at))
+        slot_free_at.sort()
+
+        queued = []
+        for position, task in enumerate(self.task_queue.snapshot(running_by_user), start=1):
+            start_at = slot_free_at.pop(0)
+            slot_free_at.append(start_at + average)
+            slot_free_at.sort()
+
+            queued.append({
+                "task_id": task.task_id,
+                "username": task.username,
+                "priority": task.priority.name.lower(),
+                "position": position,
+                "queued_time": getattr(task, "queued_time", None),
+                "estimated_start_time": start_at,
+                "estimated_wait_seconds": int(start_at - now)
+            })
+
+        running = [
+            {
+                "task_id": task_id,
+                "username": info["username"],
+                "jobs": info["jobs"],
+                "start_time": info["start_time"],
+                "estimated_end_time": max(now, info["start_time"] + average)
+            }
+            for task_id, info in active.items()
+        ]
+
+        return {
+            "running": running,
+            "queued": queued,
+            "average_duration": int(average),
+            "stats": self.get_stats()
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取调度器状态
+
+        Returns:
+            dict: 调度器状态
+        """
+        with self._lock:
+            active = {tid: info["jobs"] for tid, info in self.active_tasks.items()}
+
+        return {
+            "max_workers": self.max_workers,
+            "total_jobs": self.total_jobs,
+            "max_queued_per_user": self.task_queue.max_per_user,
+            "running_tasks": len(active),
+            "allocated_jobs": sum(active.values()),
+            "active_tasks": active,
+            "queued_tasks": self.task_queue.qsize()
+        }
@@ -6,17 +6,34 @@ import os
 import re
 import time
 import threading
+import uuid
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional, Dict, Any, Callable, List
 from enum import Enum
-from queue import Queue, Empty
 import shutil
+import sqlite3
 
 from utils.git_helper import GitHelper
 from utils.process_manager import ProcessManager, ProcessStatus
+from utils.task_log import TaskLog, LogArchive
 from repository_manager import RepositoryManager
 from email_notifier import EmailNotifier
 from user_manager import UserManager
+from compile_scheduler import CompileScheduler, CompilePriority
+from compile_progress import CompileProgressTracker
+from build_history import BuildHistory, load_build_target, extrapolate_eta
+from build_profile import BuildProfile, load_profile_report
+from utils.resource_sampler import ResourceSampler, save_series, load_series
+from utils.cgroup import CgroupManager
+from utils.jobserver import MakeJobserver
+from utils.ccache import SharedCcache
+from utils.download_cache import DownloadCache
+from auto_jobs import parse_compile_threads, select_jobs, MemoryGovernor
+from toolchain_cache import ToolchainCache
+from feeds_cache import update_and_install_feeds
+from firmware_cache import FirmwareCache, build_fingerprint, hash_files
+from task_store import TaskStore
 
 
 class CompileStatus(Enum):
@@ -44,17 +61,95 @@ class CompileTask:
         self.start_time = None
         self.end_time = None
         self.error_message = None
-        self.output_lines = []
+        self.log: Optional[TaskLog] = None  # 执行期间打开的任务日志
+        self.progress_tracker: Optional[CompileProgressTracker] = None  # 编译阶段的进度跟踪
+        self.stage_durations: Dict[str, float] = {}  # 各阶段耗时（秒）
+        self.current_stage = None
+        self.stage_start = None
+        self.build_target = None  # 编译目标 board/subtarget
+        self.make_jobs = None  # 编译阶段的 make 并发数
+        self.resource_summary = None  # 编译阶段的资源采样摘要
+        self.ccache_stats = None  # 编译阶段的 ccache 命中统计
+        self.source_revisions = None  # 准备阶段记录的 LEDE 和各 feed 的提交
+        self.firmware_fingerprint = None  # 准备阶段（defconfig 之前）计算的编译指纹
+        self.cached_from = None  # 命中固件缓存时原编译的任务ID
+        self.eta_model = None  # 剩余时间预测模型
         self.firmware_files = []
         self.device_name = config.get("device_name", "未知设备")
         self.session_id = None  # 用户会话ID
+        self.priority = self._parse_priority(config.get("priority"))
+        self.queued_time = None
+        self.resume_compile = False  # 重启后重连到仍在运行的make进程
+        self.cancelled = False  # 已请求取消（各阶段会覆盖 status，不能只看状态）
+
+    @staticmethod
+    def _parse_priority(value) -> CompilePriority:
+        """解析任务优先级"""
+        if isinstance(value, CompilePriority):
+            return value
+        try:
+            return CompilePriority[str(value).upper()]
+        except KeyError:
+            return CompilePriority.NORMAL
+
+    def to_record(self) -> Dict[str, Any]:
+        """转换为持久化记录"""
+        return {
+            "task_id": self.task_id,
+            "username": self.username,
+            "status": self.status.value,
+            "progress": self.progress,
+            "priority": self.priority.name.lower(),
+            "device_name": self.device_name,
+            "session_id": self.session_id,
+            "config": self.config,
+            "queued_time": self.queued_time,
+            "start_time": self.start_time.isoformat() if self.start_time else None,
+            "end_time": self.end_time.isoformat() if self.end_time else None,
+            "error_message": self.error_message,
+            "result": {"firmware_files": self.firmware_files, "stage_durations": self.stage_durations,
+                       "ccache_stats": self.ccache_stats, "cached_from": self.cached_from}
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "CompileTask":
+        """从持久化记录恢复任务"""
+        task = cls(record["task_id"], record["username"], record.get("config") or {})
+        task.status = CompileStatus(record["status"])
+        task.progress = record.get("progress") or 0.0
+        task.priority = cls._parse_priority(record.get("priority"))
+        task.session_id = record.get("session_id")
+        task.queued_time = record.get("queued_time")
+        task.error_message = record.get("error_message")
+        if record.get("start_time"):
+            task.start_time = datetime.fromisoformat(record["start_time"])
+        if record.get("end_time"):
+            task.end_time = datetime.fromisoformat(record["end_time"])
+        result = record.get("result") or {}
+        task.firmware_files = result.get("firmware_files", [])
+        task.stage_durations = result.get("stage_durations") or {}
+        task.ccache_stats = result.get("ccache_stats")
+        task.cached_from = result.get("cached_from")
+        return task
 
 
 class CompilerManager:
     """编译管理器"""
+
+    # 重启后需要恢复的任务状态（排队中或执行中被中断）
+    ACTIVE_STATUSES = [
+        CompileStatus.IDLE, CompileStatus.PREPARING, CompileStatus.DOWNLOADING,
+        CompileStatus.CONFIGURING, CompileStatus.COMPILING, CompileStatus.PACKAGING
+    ]
+
+    # 编译结束后等待被终止的 make 进程组退出的最长时间（秒），之后才能重新填充 jobserver 令牌池
+    JOBSERVER_RECONCILE_WAIT = 10
+
+    # 编译指纹中按内容计算未跟踪文件的 LEDE 源码目录（files/ 为 rootfs 覆盖层）
+    FINGERPRINT_SOURCE_DIRS = ("files", "package", "target", "toolchain", "tools")
     
     def __init__(self, config, logger=None, socketio=None, websocket_handler=None,
-                 user_manager=None):
+                 user_manager=None, source_mirrors=None):
         """
         初始化编译管理器
 
@@ -64,29 +159,178 @@ class CompilerManager:
             socketio: SocketIO实例
             websocket_handler: WebSocket处理器
             user_manager: 用户管理器
+            source_mirrors: 本地源码镜像（SourceMirrors），克隆和 feeds 更新从镜像获取
         """
         self.config = config
         self.logger = logger
         self.socketio = socketio
         self.websocket_handler = websocket_handler
         self.user_manager = user_manager
+        self.source_mirrors = source_mirrors
 
         # 初始化工具
         self.git_helper = GitHelper(logger)
-        self.process_manager = ProcessManager(logger)
-        self.repository_manager = RepositoryManager(config, logger, websocket_handler)
+
+        # 可选的 cgroup v2 隔离：编译进程树与后端分组，后端保留一定的 CPU/IO 份额
+        cgroup_manager = None
+        self.build_cgroup_limits = None
+        if getattr(config, 'CGROUP_ISOLATION', False):
+            cgroup_manager = CgroupManager(
+                logger, backend_reserved_share=getattr(config, 'CGROUP_BACKEND_RESERVED_SHARE', 20)
+            )
+            if cgroup_manager.setup():
+                self.build_cgroup_limits = {
+                    "cpu_weight": getattr(config, 'CGROUP_BUILD_CPU_WEIGHT', 100),
+                    "memory_max": getattr(config, 'CGROUP_BUILD_MEMORY_MAX', None),
+                    "io_weight": getattr(config, 'CGROUP_BUILD_IO_WEIGHT', 100)
+                }
+
+        self.process_manager = ProcessManager(
+            logger,
+            state_dir=getattr(config, 'PROCESS_STATE_DIR', Path(config.WORKSPACE_DIR) / "processes"),
+            io_backend=getattr(config, 'PROCESS_IO_BACKEND', 'reactor'),
+            cgroup_manager=cgroup_manager
+        )
+
+        # 所有编译共享的 make jobserver（总并发不超过 MAX_COMPILE_JOBS）
+        self.jobserver = None
+        if getattr(config, 'MAKE_JOBSERVER', True):
+            try:
+                jobserver = MakeJobserver(
+                    getattr(config, 'MAKE_JOBSERVER_FIFO', Path(config.WORKSPACE_DIR) / "jobserver.fifo"),
+                    getattr(config, 'MAX_COMPILE_JOBS', 4),
+                    logger
+                )
+                # 重启前的编译进程仍在使用管道时保留其中的令牌
+                jobserver.open(reset=not self.process_manager.list_detached_processes())
+                self.jobserver = jobserver
+            except OSError as e:
+                self._log("warning", f"创建 make jobserver 失败，改为按任务分配并发数: {e}")
+
+        # compile_threads 为 auto 时按内存和负载选择并发数；共享 jobserver 时由调节器在编译中按内存压力和负载扣留令牌
+        self.auto_jobs_memory_per_job = getattr(config, 'AUTO_JOBS_MEMORY_PER_JOB', 2 * 1024 ** 3)
+        self.auto_jobs_memory_reserve = getattr(config, 'AUTO_JOBS_MEMORY_RESERVE', 2 * 1024 ** 3)
+        self.memory_governor = None
+        if self.jobserver:
+            self.memory_governor = MemoryGovernor(
+                self.jobserver,
+                lambda: self._memory_per_job(None),
+                self.auto_jobs_memory_reserve,
+                logger,
+                interval=getattr(config, 'MEMORY_GOVERNOR_INTERVAL', 5)
+            )
+        self.repository_manager = RepositoryManager(config, logger, websocket_handler, source_mirrors)
         self.email_notifier = EmailNotifier(config, logger)
 
+        # 任务日志（内存只保留最近的行，完整日志写入文件）
+        self.task_log_dir = Path(getattr(config, 'TASK_LOG_DIR', Path(config.WORKSPACE_DIR) / "task_logs"))
+        self.task_log_buffer_lines = getattr(config, 'TASK_LOG_BUFFER_LINES', 2000)
+        self.task_log_index_interval = getattr(config, 'TASK_LOG_INDEX_INTERVAL', 1000)
+        self.task_log_archive = getattr(config, 'TASK_LOG_ARCHIVE', True)
+        self.task_log_archive_frame_lines = getattr(config, 'TASK_LOG_ARCHIVE_FRAME_LINES', 10000)
+
+        # 编译耗时分析（最慢软件包报告和火焰图数据）
+        self.build_profile_dir = Path(getattr(config, 'BUILD_PROFILE_DIR',
+                                              Path(config.WORKSPACE_DIR) / "build_profiles"))
+
+        # 编译进程树资源采样（CPU、内存、IO、编译器进程数）
+        self.resource_sampler = ResourceSampler(
+            logger,
+            interval=getattr(config, 'RESOURCE_SAMPLE_INTERVAL', 5),
+            max_points=getattr(config, 'RESOURCE_SAMPLE_MAX_POINTS', 1440)
+        )
+        self.resource_sample_dir = Path(getattr(config, 'RESOURCE_SAMPLE_DIR',
+                                                Path(config.WORKSPACE_DIR) / "resource_samples"))
+
+        # 所有用户工作区共享的 ccache
+        self.ccache = None
+        if getattr(config, 'ENABLE_CCACHE', False):
+            try:
+                ccache = SharedCcache(
+                    getattr(config, 'CCACHE_DIR', Path(config.WORKSPACE_DIR) / "ccache"),
+                    max_size=getattr(config, 'CCACHE_MAX_SIZE', "50G"),
+                    stats_dir=getattr(config, 'CCACHE_STATS_DIR', Path(config.WORKSPACE_DIR) / "ccache_stats"),
+                    logger=logger
+                )
+                ccache.setup()
+                self.ccache = ccache
+            except OSError as e:
+                self._log("warning", f"创建共享 ccache 失败，编译不使用 ccache: {e}")
+
+        # 所有用户工作区共享的 dl/ 源码包
+        self.download_cache = None
+        if getattr(config, 'DOWNLOAD_CACHE', False):
+            try:
+                download_cache = DownloadCache(
+                    getattr(config, 'DOWNLOAD_CACHE_DIR', Path(config.WORKSPACE_DIR) / "dl_cache"),
+                    getattr(config, 'DOWNLOAD_CACHE_MAX_SIZE', 100 * 1024 ** 3),
+                    logger
+                )
+                download_cache.setup()
+                self.download_cache = download_cache
+            except (OSError, sqlite3.Error) as e:
+                self._log("warning", f"创建共享下载缓存失败，各工作区单独下载: {e}")
+
+        # 按工作区、编译目标和源码提交缓存的预编译工具链
+        self.toolchain_cache = None
+        if getattr(config, 'TOOLCHAIN_CACHE', False):
+            try:
+                toolchain_cache = ToolchainCache(
+                    getattr(config, 'TOOLCHAIN_CACHE_DIR', Path(config.WORKSPACE_DIR) / "toolchain_cache"),
+                    getattr(config, 'TOOLCHAIN_CACHE_MAX_SIZE', 50 * 1024 ** 3),
+                    logger
+                )
+                toolchain_cache.setup()
+                self.toolchain_cache = toolchain_cache
+            except (OSError, sqlite3.Error) as e:
+                self._log("warning", f"创建工具链缓存失败，每个工作区单独编译工具链: {e}")
+
+        # 按源码版本和配置缓存的固件
+        self.firmware_cache = None
+        if getattr(config, 'FIRMWARE_CACHE', False):
+            try:
+                firmware_cache = FirmwareCache(
+                    getattr(config, 'FIRMWARE_CACHE_DIR', Path(config.WORKSPACE_DIR) / "firmware_cache"),
+                    getattr(config, 'FIRMWARE_CACHE_MAX_SIZE', 20 * 1024 ** 3),
+                    logger
+                )
+                firmware_cache.setup()
+                self.firmware_cache = firmware_cache
+            except (OSError, sqlite3.Error) as e:
+                self._log("warning", f"创建固件缓存失败，所有编译都会重新执行: {e}")
+
         # 任务管理
         self.tasks: Dict[str, CompileTask] = {}
-        self.current_task: Optional[CompileTask] = None
-        self.task_queue = Queue()
+        self.scheduler = CompileScheduler(
+            max_workers=getattr(config, 'MAX_CONCURRENT_COMPILES', 1),
+            total_jobs=getattr(config, 'MAX_COMPILE_JOBS', 4),
+            logger=logger,
+            max_queued_per_user=getattr(config, 'MAX_QUEUED_TASKS_PER_USER', 0),
+            default_duration=getattr(config, 'DEFAULT_COMPILE_DURATION', 7200)
+        )
+
+        # 任务持久化存储
+        db_file = getattr(config, 'TASK_DB_FILE', Path(config.WORKSPACE_DIR) / "compile_tasks.db")
+        self.task_store = TaskStore(db_file, logger)
+        self.build_history = BuildHistory(db_file, logger)
 
         # 线程锁
         self._lock = threading.Lock()
+        # 每个任务的日志锁：关闭、压缩日志和读取日志互斥，读取时日志不会被关闭或删除
+        self._task_log_locks: Dict[str, threading.Lock] = {}
+        # 使用共享令牌池的编译（任务ID -> make 进程组）和任务结束后仍未退出的进程组，
+        # 都结束后才能重新填充令牌池
+        self._jobserver_makes: Dict[str, Optional[int]] = {}
+        self._jobserver_lingering = set()
 
         # 启动任务处理线程
         self._start_task_processor()
+
+        # 恢复重启前未完成的任务
+        self._restore_tasks()
+
+        if self.memory_governor:
+            self.memory_governor.start()
     
     def _log(self, level: str, message: str):
         """记录日志"""
@@ -108,32 +352,234 @@ class CompilerManager:
             except Exception as e:
                 self._log("error", f"发送SocketIO事件失败: {e}")
     
-    def _start_task_processor(self):
-        """启动任务处理线程"""
-        def process_tasks():
-            while True:
-                try:
-                    task = self.task_queue.get(timeout=1)
-                    if task:
-                        self._execute_task(task)
-                        self.task_queue.task_done()
-                except Empty:
+    def _save_task(self, task: CompileTask):
+        """持久化任务状态"""
+        self.task_store.save_task(task.to_record())
+
+    def _restore_tasks(self):
+        """恢复重启前排队中或执行中被中断的任务，重新加入队列"""
+        try:
+            records = self.task_store.list_tasks(
+                statuses=[status.value for status in self.ACTIVE_STATUSES],
+                limit=1000
+            )
+
+            # 按原提交顺序重新排队
+            records.sort(key=lambda r: r.get("queued_time") or r.get("created_at") or 0)
+
+            detached = set(self.process_manager.list_detached_processes())
+
+            for record in records:
+                task = CompileTask.from_record(record)
+                process_id = f"compile_{task.task_id}"
+
+                # 编译进程在重启期间仍在运行（或已结束），直接重连而不是重新编译
+                if task.status == CompileStatus.COMPILING and process_id in detached:
+                    detached.discard(process_id)
+                    self._restore_progress_tracker(task)
+                    if self.process_manager.reattach_process(
+                            process_id,
+                            batch_output_callback=self._make_compile_output_callback(task)):
+                        if self.jobserver:
+                            self.jobserver.adopt(task.task_id)
+                            info = self.process_manager.get_process_info(process_id) or {}
+                            self._jobserver_makes[task.task_id] = info.get("pgid")
+                        self._log("info", f"已重连编译进程: {task.task_id}")
+                        task.resume_compile = True
+                        self.tasks[task.task_id] = task
+                        self.scheduler.run_now(task, self._parse_make_jobs(process_id))
+                        continue
+
+                if task.status != CompileStatus.IDLE:
+                    self._log("warning", f"任务在 {task.status.value} 阶段被中断，重新排队: {task.task_id}")
+                    task.status = CompileStatus.IDLE
+                    task.progress = 0.0
+                    task.start_time = None
+
+                self.tasks[task.task_id] = task
+                self.scheduler.submit(task, enforce_quota=False)
+                self._save_task(task)
+
+            if records:
+                self._log("info", f"已恢复 {len(records)} 个未完成的编译任务")
+
+            # 没有对应任务的遗留编译进程
+            for process_id in detached:
+                self.process_manager.discard_detached_process(process_id)
+
+            # 归还已不在运行的编译（以及重启前未结束的令牌调节）之外的持有者的令牌
+            if self.jobserver:
+                for owner in self.jobserver.owners():
+                    if owner != MemoryGovernor.OWNER and not (
+                            owner in self.tasks and self.tasks[owner].resume_compile):
+                        self.jobserver.release(owner)
+
+            # 结束没有对应任务的遗留编译会话
+            if self.user_manager:
+                self.user_manager.close_orphaned_compile_sessions(
+                    set(self.tasks.keys()), "后端重启，编译任务已丢失"
+                )
+
+        except Exception as e:
+            self._log("error", f"恢复编译任务失败: {e}")
+
+    def _parse_make_jobs(self, process_id: str) -> Optional[int]:
+        """从已重连编译进程的命令中解析 -j 并发数"""
+        info = self.process_manager.get_process_info(process_id) or {}
+        match = re.search(r"-j\s*(\d+)", info.get("command", ""))
+        return int(match.group(1)) if match else None
+
+    def _source_revisions(self, work_dir: Path) -> Optional[Dict[str, Any]]:
+        """
+        LEDE 和各 feed 的当前提交及未跟踪文件的摘要
+
+        .gitignore 忽略的 files/ 覆盖层、本地添加的软件包等不在提交中，按内容计入版本；
+        已跟踪文件有未提交修改的仓库、不是 git 仓库的 feed（src-link 等）无法确定版本，返回None。
+        """
+        lede = self.git_helper.get_head_commit(work_dir)
+        if not lede or self.git_helper.is_dirty(work_dir):
+            return None
+
+        untracked = {}
+        if not self._hash_untracked(work_dir, "lede", untracked, self.FINGERPRINT_SOURCE_DIRS):
+            return None
+
+        feeds = {}
+        feeds_dir = work_dir / "feeds"
+        if feeds_dir.is_dir():
+            for feed_dir in sorted(feeds_dir.iterdir()):
+                # feeds/ 下还有 <feed>.index、<feed>.tmp 等索引文件和临时目录
+                if not feed_dir.is_dir() or feed_dir.suffix:
                     continue
-                except Exception as e:
-                    self._log("error", f"任务处理线程错误: {e}")
-        
-        thread = threading.Thread(target=process_tasks, daemon=True)
-        thread.start()
+                if feed_dir.is_symlink() or not (feed_dir / ".git").exists():
+                    return None
+                commit = self.git_helper.get_head_commit(feed_dir)
+                if not commit or self.git_helper.is_dirty(feed_dir):
+                    return None
+                if not self._hash_untracked(feed_dir, f"feeds/{feed_dir.name}", untracked):
+                    return None
+                feeds[feed_dir.name] = commit
+
+        return {"lede": lede, "feeds": feeds, "untracked": untracked}
+
+    def _hash_untracked(self, repo_dir: Path, name: str, digests: Dict[str, str], paths=()) -> bool:
+        """计算仓库中未跟踪文件（包括被忽略的文件）的摘要存入 digests，无法列出时返回False"""
+        files = self.git_helper.list_untracked_files(repo_dir, paths)
+        if files is None:
+            return False
+        if files:
+            digests[name] = hash_files(repo_dir, files)
+        return True
+
+    def _lookup_firmware_cache(self, task: CompileTask) -> Optional[Dict[str, Any]]:
+        """查询固件缓存，命中时固件已放入用户工作区的 bin/"""
+        if not self.firmware_cache or not self._config_flag(task, "use_cache"):
+            return None
+        # 指定了 make 目标的编译不一定生成完整固件
+        if 'target' in task.config:
+            return None
+
+        # 工作区中有排队或正在执行的编译时不能替换 bin/
+        with self._lock:
+            busy = any(other.username == task.username and other.status in self.ACTIVE_STATUSES
+                       for other in self.tasks.values())
+        if busy:
+            return None
+
+        work_dir = Path(self.config.WORKSPACE_DIR) / "users" / task.username / "lede"
+        try:
+            revisions = self._source_revisions(work_dir)
+            fingerprint = build_fingerprint(work_dir, revisions) if revisions else None
+            if not fingerprint:
+                return None
+            return self.firmware_cache.restore(fingerprint, work_dir)
+        except Exception as e:
+            self._log("warning", f"查询固件缓存失败 {task.task_id}: {e}")
+            return None
+
+    def _complete_from_cache(self, task: CompileTask, cached: Dict[str, Any]) -> Dict[str, Any]:
+        """命中固件缓存的任务直接完成"""
+        task.start_time = task.end_time = datetime.now()
+        task.status = CompileStatus.COMPLETED
+        task.progress = 100
+        task.firmware_files = cached["firmware_files"]
+        task.cached_from = cached["meta"].get("task_id")
+
+        if self.user_manager:
+            task.session_id = self.user_manager.start_compile_session(task.username, task.task_id, task.config)
+            if task.session_id:
+                self.user_manager.end_compile_session(task.username, task.session_id, True, {
+                    "firmware_files": task.firmware_files,
+                    "compile_time": self._format_duration(timedelta(0)),
+                    "device_name": task.device_name,
+                    "cached_from": task.cached_from
+                })
+
+        with self._lock:
+            self.tasks[task.task_id] = task
+        self._save_task(task)
+
+        self._log("info", f"编译任务命中固件缓存: {task.task_id} (原任务: {task.cached_from})")
+        self._emit_task_event('compile_completed', task, "命中固件缓存，编译完成")
+        self._send_email_notification(task, True, self._format_duration(timedelta(0)))
+
+        return {
+            "success": True,
+            "task_id": task.task_id,
+            "cached": True,
+            "cached_from": task.cached_from,
+            "message": "命中固件缓存，编译已完成"
+        }
+
+    def _save_firmware(self, task: CompileTask):
+        """编译成功后按编译指纹缓存固件（源码版本在编译期间变化时跳过）"""
+        if not self.firmware_cache or not task.firmware_fingerprint or 'target' in task.config:
+            return
+        work_dir = Path(self.config.WORKSPACE_DIR) / "users" / task.username / "lede"
+        try:
+            revisions = self._source_revisions(work_dir)
+            if revisions != task.source_revisions:
+                self._log("info", f"编译期间源码版本发生变化，不缓存固件: {task.task_id}")
+                return
+            # 使用 defconfig 之前的指纹：查询时读取的也是未经 defconfig 展开的 .config，
+            # 最小配置或 diffconfig 与展开后的完整配置指纹不同
+            self.firmware_cache.save(task.firmware_fingerprint, work_dir, task.firmware_files, {
+                "task_id": task.task_id,
+                "username": task.username,
+                "device_name": task.device_name,
+                "revisions": revisions
+            })
+        except Exception as e:
+            self._log("warning", f"缓存固件失败 {task.task_id}: {e}")
+
+    def _start_task_processor(self):
+        """启动任务处理线程（由调度器管理多个编译槽位）"""
+        self.scheduler.start(self._execute_task)
         self._log("info", "任务处理线程已启动")
 
     def start_compile(self, username: str, task_config: Dict[str, Any]) -> Dict[str, Any]:
         """开始编译任务"""
         try:
-            task_id = f"compile_{username}_{int(time.time())}"
+            # 同一用户可排队多个任务，时间戳后加随机后缀避免同一秒内提交的任务ID相同
+            task_id = f"compile_{username}_{int(time.time())}_{uuid.uuid4().hex[:8]}"
 
             # 创建编译任务
             task = CompileTask(task_id, username, task_config)
 
+            # 高优先级仅限管理员使用（所有提交编译的接口都经过这里）
+            if task.priority == CompilePriority.HIGH and not (
+                    self.user_manager and self.user_manager.is_admin(username)):
+                task.priority = CompilePriority.NORMAL
+                task.config = dict(task.config, priority="normal")
+
+            # 相同源码版本和配置已编译过时直接使用缓存的固件，不进入队列
+            cached = self._lookup_firmware_cache(task)
+            if cached:
+                return self._complete_from_cache(task, cached)
+
+            # 检查用户排队配额
+            self.scheduler.check_quota(username)
+
             # 开始用户编译会话
             if self.user_manager:
                 session_id = self.user_manager.start_compile_session(
@@ -141,10 +587,12 @@ class CompilerManager:
                 )
                 task.session_id = session_id
 
-            self.tasks[task_id] = task
-            self.task_queue.put(task)
+            with self._lock:
+                self.tasks[task_id] = task
+            self.scheduler.submit(task)
+            self._save_task(task)
 
-            self._log("info", f"编译任务已创建: {task_id} (用户: {username})")
+            self._log("info", f"编译任务已创建: {task_id} (用户: {username}, 优先级: {task.priority.name})")
 
             return {
                 "success": True,
@@ -152,6 +600,12 @@ class CompilerManager:
                 "message": "编译任务已启动"
             }
 
+        except ValueError as e:
+            self._log("warning", f"编译任务被拒绝 (用户: {username}): {e}")
+            return {
+                "success": False,
+                "message": str(e)
+            }
         except Exception as e:
             error_msg = f"启动编译任务失败: {e}"
             self._log("error", error_msg)
@@ -162,52 +616,209 @@ class CompilerManager:
 
     def _execute_task(self, task: CompileTask):
         """执行编译任务"""
+        if task.status == CompileStatus.CANCELLED:
+            self._log("info", f"任务已取消，跳过执行: {task.task_id}")
+            return
+
+        try:
+            if task.resume_compile:
+                self._resume_task(task)
+            else:
+                self._run_task(task)
+        finally:
+            if self.jobserver:
+                self.jobserver.release(task.task_id)
+                self._reconcile_jobserver(task.task_id)
+            self._save_build_profile(task)
+            if task.status == CompileStatus.COMPLETED:
+                self._save_firmware(task)
+                self._save_toolchain(task)
+            self._close_task_log(task)
+
+    def _run_task(self, task: CompileTask):
+        """按阶段执行编译任务"""
         try:
-            self.current_task = task
             task.start_time = datetime.now()
             task.status = CompileStatus.PREPARING
 
             self._emit_task_event('compile_started', task)
 
-            # 1. 准备工作环境
-            prepare_result = self._prepare_workspace(task)
-            if not prepare_result["success"]:
-                self._handle_task_failure(task, prepare_result["message"])
-                return
+            stages = [
+                ("prepare", self._prepare_workspace),    # 1. 准备工作环境
+                ("download", self._download_packages),   # 2. 下载依赖包
+                ("configure", self._configure_build),    # 3. 配置编译选项
+                ("compile", self._execute_compile),      # 4. 执行编译
+                ("package", self._collect_firmware)      # 5. 收集固件文件
+            ]
+            for stage, func in stages:
+                result = self._run_stage(task, stage, func)
+                if task.cancelled:
+                    self._finish_cancelled_task(task)
+                    return
+                if not result["success"]:
+                    self._handle_task_failure(task, result["message"])
+                    return
 
-            # 2. 下载依赖包
-            download_result = self._download_packages(task)
-            if not download_result["success"]:
-                self._handle_task_failure(task, download_result["message"])
-                return
+            # 编译成功
+            self._handle_task_success(task, result)
 
-            # 3. 配置编译选项
-            config_result = self._configure_build(task)
-            if not config_result["success"]:
-                self._handle_task_failure(task, config_result["message"])
-                return
+        except Exception as e:
+            error_msg = f"执行编译任务时发生错误: {e}"
+            self._log("error", error_msg)
+            self._handle_task_failure(task, error_msg)
+
+    def _resume_task(self, task: CompileTask):
+        """后端重启后继续执行已重连编译进程的任务"""
+        task.resume_compile = False
+        try:
+            process_id = f"compile_{task.task_id}"
+
+            # 编译阶段从进程启动时开始计时
+            info = self.process_manager.get_process_info(process_id) or {}
+            task.current_stage = "compile"
+            task.stage_start = info.get("start_time") or time.time()
+            self._prepare_eta(task)
 
-            # 4. 执行编译
-            compile_result = self._execute_compile(task)
+            self._emit_task_event('compile_progress', task, "后端已重启，继续跟踪编译进程...")
+
+            compile_result = self._wait_compile_process(task, process_id)
+            task.stage_durations["compile"] = time.time() - task.stage_start
+            if task.cancelled:
+                self._finish_cancelled_task(task)
+                return
             if not compile_result["success"]:
                 self._handle_task_failure(task, compile_result["message"])
                 return
 
-            # 5. 收集固件文件
-            collect_result = self._collect_firmware(task)
+            collect_result = self._run_stage(task, "package", self._collect_firmware)
+            if task.cancelled:
+                self._finish_cancelled_task(task)
+                return
             if not collect_result["success"]:
                 self._handle_task_failure(task, collect_result["message"])
                 return
 
-            # 编译成功
             self._handle_task_success(task, collect_result)
 
         except Exception as e:
-            error_msg = f"执行编译任务时发生错误: {e}"
+            error_msg = f"继续编译任务时发生错误: {e}"
             self._log("error", error_msg)
             self._handle_task_failure(task, error_msg)
+
+    def _run_stage(self, task: CompileTask, stage: str, func: Callable) -> Dict[str, Any]:
+        """执行一个阶段并记录耗时（任务已取消时不再执行）"""
+        if task.cancelled:
+            return {"success": False, "message": "编译任务已取消"}
+        task.current_stage = stage
+        task.stage_start = time.time()
+        try:
+            return func(task)
         finally:
-            self.current_task = None
+            task.stage_durations[stage] = time.time() - task.stage_start
+
+    def _memory_per_job(self, target: Optional[str]) -> float:
+        """单个编译进程预计的峰值内存：取历史编译的采样结果，没有记录时使用配置的默认值"""
+        try:
+            recorded = self.build_history.memory_per_job(target)
+        except Exception as e:
+            self._log("warning", f"读取历史编译内存占用失败: {e}")
+            recorded = None
+        return recorded or self.auto_jobs_memory_per_job
+
+    def _select_auto_jobs(self, task: CompileTask, work_dir: Path) -> int:
+        """compile_threads 为 auto 时根据可用内存、历史内存占用和系统负载选择并发数"""
+        try:
+            target = load_build_target(work_dir)
+        except Exception:
+            target = None
+
+        selection = select_jobs(
+            self.scheduler.total_jobs,
+            self._memory_per_job(target),
+            self.auto_jobs_memory_reserve,
+            own_jobs=self.scheduler.allocated_jobs(exclude=task.task_id)
+        )
+        self._log("info", f"自动选择编译并发数: {selection['jobs']} "
+                          f"(CPU {selection['cpu_jobs']}, 内存 {selection['memory_jobs']}, "
+                          f"负载 {selection['load_jobs']}; 可用内存 {selection['available_memory'] / 1024 ** 3:.1f}G, "
+                          f"单进程峰值 {selection['memory_per_job'] / 1024 ** 2:.0f}M, "
+                          f"负载均值 {selection['load_average']})")
+        return selection["jobs"]
+
+    def _prepare_eta(self, task: CompileTask):
+        """编译阶段开始时读取编译目标并根据历史编译构建剩余时间预测模型"""
+        work_dir = Path(self.config.WORKSPACE_DIR) / "users" / task.username / "lede"
+        try:
+            task.build_target = load_build_target(work_dir)
+            if task.make_jobs is None:
+                task.make_jobs = self._parse_make_jobs(f"compile_{task.task_id}") or \
+                    (self.jobserver.jobs if self.jobserver else None)
+            packages = task.progress_tracker.expected_packages if task.progress_tracker else set()
+            task.eta_model = self.build_history.build_model(task.build_target, packages, task.make_jobs)
+        except Exception as e:
+            self._log("warning", f"构建剩余时间预测模型失败: {e}")
+            task.eta_model = None
+
+    def _estimate_eta(self, task: CompileTask) -> Optional[Dict[str, Any]]:
+        """估算任务剩余时间，无法估算时返回None"""
+        if task.status not in self.ACTIVE_STATUSES or not task.current_stage or not task.stage_start:
+            return None
+
+        elapsed = time.time() - task.stage_start
+        fraction = None
+        if task.current_stage == "compile" and task.progress_tracker:
+            fraction = task.progress_tracker.fraction
+
+        if task.eta_model:
+            return task.eta_model.estimate(task.current_stage, elapsed, fraction)
+        if fraction is not None:
+            return extrapolate_eta(elapsed, fraction)
+        return None
+
+    def _record_build_history(self, task: CompileTask):
+        """记录成功编译的阶段和软件包耗时，供之后的任务预测剩余时间"""
+        try:
+            tracker = task.progress_tracker
+            if tracker:
+                tracker.finish()
+
+            packages = sorted(tracker.expected_packages) if tracker and tracker.expected_packages \
+                else sorted(task.config.get("packages") or [])
+
+            self.build_history.record_build({
+                "task_id": task.task_id,
+                "username": task.username,
+                "target": task.build_target or task.config.get("device_id"),
+                "threads": task.make_jobs,
+                "memory_per_job": (task.resource_summary or {}).get("peak_rss_per_compiler"),
+                "packages": packages,
+                "stage_durations": task.stage_durations,
+                "make_stage_durations": tracker.stage_durations if tracker else {},
+                "package_durations": tracker.package_durations if tracker else {},
+                "total_duration": (task.end_time - task.start_time).total_seconds()
+            })
+        except Exception as e:
+            self._log("error", f"记录编译历史失败: {e}")
+
+    def _save_build_profile(self, task: CompileTask):
+        """保存编译阶段各软件包的耗时报告和火焰图数据（未进入编译阶段的任务没有数据）"""
+        tracker = task.progress_tracker
+        if tracker is None:
+            return
+
+        try:
+            tracker.finish()
+            if not tracker.phase_durations:
+                return
+            profile = BuildProfile.from_tracker(task.task_id, tracker)
+            profile.save(self.build_profile_dir)
+
+            slowest = profile.packages()[:3]
+            summary = ", ".join(f"{item['name']} {item['total_seconds']:.0f}s" for item in slowest)
+            self._log("info", f"编译耗时分析已保存: {task.task_id} ({len(profile.phase_durations)} 个软件包"
+                              f"{'，最慢: ' + summary if summary else ''})")
+        except Exception as e:
+            self._log("error", f"保存编译耗时分析失败 {task.task_id}: {e}")
 
     def _prepare_workspace(self, task: CompileTask) -> Dict[str, Any]:
         """准备工作环境"""
@@ -226,6 +837,12 @@ class CompilerManager:
                     "message": "源码仓库不存在，请先克隆仓库"
                 }
 
+            # 记录源码版本和 defconfig 之前的编译指纹，编译成功后用于缓存固件
+            if self.firmware_cache:
+                task.source_revisions = self._source_revisions(work_dir)
+                if task.source_revisions:
+                    task.firmware_fingerprint = build_fingerprint(work_dir, task.source_revisions)
+
             # 清理之前的编译文件
             self._clean_previous_build(work_dir)
 
@@ -252,9 +869,12 @@ class CompilerManager:
 
             work_dir = Path(self.config.WORKSPACE_DIR) / "users" / task.username / "lede"
 
-            def output_callback(process_id, line):
-                task.output_lines.append(line)
-                self._emit_task_event('compile_log', task, line)
+            # 先从共享下载缓存中取已有的源码包
+            if self.download_cache:
+                try:
+                    self.download_cache.prepare(work_dir)
+                except OSError as e:
+                    self._log("warning", f"登记共享下载缓存失败: {e}")
 
             # 执行 make download
             download_jobs = self.config.DOWNLOAD_JOBS
@@ -265,7 +885,7 @@ class CompilerManager:
                 process_id=process_id,
                 command=command,
                 cwd=work_dir,
-                output_callback=output_callback,
+                batch_output_callback=self._make_log_output_callback(task),
                 timeout=3600  # 1小时超时
             )
 
@@ -275,21 +895,16 @@ class CompilerManager:
                     "message": "启动下载进程失败"
                 }
 
-            # 等待下载完成
-            while True:
-                status = self.process_manager.get_process_status(process_id)
-                if status in [ProcessStatus.COMPLETED, ProcessStatus.FAILED,
-                             ProcessStatus.CANCELLED, ProcessStatus.TIMEOUT]:
-                    break
-
-                # 更新进度
-                task.progress = 20  # 下载阶段占20%
-                self._emit_task_event('compile_progress', task, "正在下载依赖包...")
+            # 更新进度
+            task.progress = 20  # 下载阶段占20%
+            self._emit_task_event('compile_progress', task, "正在下载依赖包...")
 
-                time.sleep(2)
+            # 等待下载完成
+            status = self.process_manager.wait_process(process_id)
 
             if status == ProcessStatus.COMPLETED:
                 self._log("info", f"依赖包下载完成: {task.task_id}")
+                self._ingest_downloads(task, work_dir)
                 return {
                     "success": True,
                     "message": "依赖包下载完成"
@@ -310,6 +925,478 @@ class CompilerManager:
                 "message": error_msg
             }
 
+    def _ingest_downloads(self, task: CompileTask, work_dir: Path):
+        """把工作区下载的源码包收入共享下载缓存（失败不影响编译）"""
+        if not self.download_cache:
+            return
+        try:
+            result = self.download_cache.ingest(work_dir)
+            self._log("info", f"共享下载缓存 {task.task_id}: 新收入 {result['added']} 个源码包，"
+                              f"{result['linked']} 个换成链接，节省 {result['saved_bytes'] / 1024 ** 2:.0f}M")
+        except (OSError, sqlite3.Error) as e:
+            self._log("warning", f"收入共享下载缓存失败 {task.task_id}: {e}")
+
+    def prefetch_downloads(self, work_dir: Path) -> Dict[str, Any]:
+        """
+        为预热工作区下载源码包：按默认配置执行 make defconfig 和 make download（低优先级），
+        完成后收入共享下载缓存并删除默认配置，保留 dl/
+
+        Args:
+            work_dir: 源码目录
+
+        Returns:
+            dict: 操作结果
+        """
+        work_dir = Path(work_dir)
+        if self.download_cache:
+            try:
+                self.download_cache.prepare(work_dir)
+            except OSError as e:
+                self._log("warning", f"登记共享下载缓存失败: {e}")
+
+        process_id = f"prefetch_{work_dir.parent.name}"
+        commands = ["nice -n 19 make defconfig", f"nice -n 19 make download -j{self.config.DOWNLOAD_JOBS}"]
+        for command in commands:
+            success = self.process_manager.start_process(
+                process_id=process_id,
+                command=command,
+                cwd=work_dir,
+                timeout=3600
+            )
+            if not success:
+                return {"success": False, "message": f"启动命令失败: {command}"}
+
+            status = self.process_manager.wait_process(process_id)
+            self.process_manager.cleanup_process(process_id)
+            if status != ProcessStatus.COMPLETED:
+                return {"success": False, "message": f"命令执行失败: {command}, 状态: {status.value}"}
+
+        if self.download_cache:
+            try:
+                self.download_cache.ingest(work_dir)
+            except (OSError, sqlite3.Error) as e:
+                self._log("warning", f"收入共享下载缓存失败 {work_dir}: {e}")
+
+        # 默认配置和 tmp/ 中的扫描结果由用户第一次编译重新生成
+        (work_dir / ".config").unlink(missing_ok=True)
+        shutil.rmtree(work_dir / "tmp", ignore_errors=True)
+        return {"success": True, "message": "源码包下载完成"}
+
+    def is_idle(self) -> bool:
+        """没有运行或排队的编译且系统负载较低"""
+        stats = self.scheduler.get_stats()
+        if stats["running_tasks"] or stats["queued_tasks"]:
+            return False
+        return os.getloadavg()[0] < (os.cpu_count() or 1) / 2
+
+    def _restore_toolchain(self, task: CompileTask, work_dir: Path):
+        """工作区没有编译好的工具链时从缓存恢复（失败时由 make 正常编译）"""
+        if not self.toolchain_cache:
+            return
+        try:
+            commit = self.git_helper.get_head_commit(work_dir)
+            if self.toolchain_cache.restore(work_dir, commit):
+                self._emit_task_event('compile_progress', task, "已从缓存恢复预编译工具链")
+        except Exception as e:
+            self._log("warning", f"恢复预编译工具链失败 {task.task_id}: {e}")
+
+    def _save_toolchain(self, task: CompileTask):
+        """编译成功后缓存工作区的工具链，工作区被清理后可直接恢复"""
+        if not self.toolchain_cache:
+            return
+        work_dir = Path(self.config.WORKSPACE_DIR) / "users" / task.username / "lede"
+        try:
+            commit = self.git_helper.get_head_commit(work_dir)
+            self.toolchain_cache.save(work_dir, commit)
+        except Exception as e:
+            self._log("warning", f"缓存预编译工具链失败 {task.task_id}: {e}")
+
+    def _configure_build(self, task: CompileTask) -> Dict[str, Any]:
+        """配置编译选项 (make defconfig)"""
+        try:
+            self._log("info", f"配置编译选项: {task.task_id}")
+            task.status = CompileStatus.CONFIGURING
+            task.progress = 25
+            self._emit_task_event('compile_progress', task, "配置编译选项...")
+
+            work_dir = Path(self.config.WORKSPACE_DIR) / "users" / task.username / "lede"
+
+            # 在 defconfig 之前写入 ccache 选项，由 defconfig 补全依赖项
+            if self.ccache:
+                try:
+                    self.ccache.apply_config(work_dir, self._use_ccache(task))
+                except OSError as e:
+                    self._log("warning", f"写入 ccache 配置失败: {e}")
+
+            process_id = f"configure_{task.task_id}"
+            success = self.process_manager.start_process(
+                process_id=process_id,
+                command="make defconfig",
+                cwd=work_dir,
+                batch_output_callback=self._make_log_output_callback(task),
+                timeout=600  # 10分钟超时
+            )
+
+            if not success:
+                return {
+                    "success": False,
+                    "message": "启动配置进程失败"
+                }
+
+            # 等待配置完成
+            status = self.process_manager.wait_process(process_id)
+
+            self.process_manager.cleanup_process(process_id)
+
+            if status == ProcessStatus.COMPLETED:
+                self._restore_toolchain(task, work_dir)
+                return {
+                    "success": True,
+                    "message": "编译配置完成"
+                }
+            else:
+                return {
+                    "success": False,
+                    "message": f"编译配置失败，状态: {status.value}"
+                }
+
+        except Exception as e:
+            error_msg = f"配置编译选项时发生错误: {e}"
+            self._log("error", error_msg)
+            return {
+                "success": False,
+                "message": error_msg
+            }
+
+    def _execute_compile(self, task: CompileTask) -> Dict[str, Any]:
+        """执行编译 (make -jN)"""
+        try:
+            task.status = CompileStatus.COMPILING
+            task.progress = 30
+            self._emit_task_event('compile_progress', task, "开始编译...")
+
+            work_dir = Path(self.config.WORKSPACE_DIR) / "users" / task.username / "lede"
+
+            # 根据 .config 统计需要构建的软件包数
+            task.progress_tracker = self._create_progress_tracker(task)
+            if task.progress_tracker.total_packages:
+                self._log("info", f"预计构建软件包: {task.progress_tracker.total_packages} 个")
+
+            requested_jobs = parse_compile_threads(task.config.get("compile_threads"))
+            env = None
+            pass_fds = ()
+            if self.jobserver and requested_jobs is None:
+                # 共享 jobserver 令牌：命令行不带 -j，并发数由 MAKEFLAGS 中的令牌池决定，
+                # 内存不足时由调节器扣留令牌
+                with self._lock:
+                    self._jobserver_makes[task.task_id] = None
+                self.jobserver.acquire(task.task_id)
+                jobs = self.jobserver.jobs
+                command = "make"
+                env = self.jobserver.env()
+                pass_fds = self.jobserver.pass_fds()
+            elif self.jobserver:
+                # 指定了线程数：从共享令牌池中划出固定份额，使用独立的 -jN
+                jobs = max(1, self.jobserver.acquire(task.task_id,
+                                                     count=min(requested_jobs, self.jobserver.jobs)))
+                if jobs < requested_jobs:
+                    self._log("info", f"共享令牌不足，编译线程数 {requested_jobs} -> {jobs}")
+                command = f"make -j{jobs}"
+            else:
+                # 从调度器获取本任务可用的并发数，auto 时再按内存和负载限制
+                max_jobs = requested_jobs or self._select_auto_jobs(task, work_dir)
+                jobs = self.scheduler.acquire_jobs(task.task_id, max_jobs=max_jobs)
+                command = f"make -j{jobs}"
+
+            if self.ccache and self._use_ccache(task):
+                env = {**(env or {}), **self.ccache.env(task.task_id)}
+
+            task.make_jobs = jobs
+            self._prepare_eta(task)
+
+            # 如果有特定目标，添加到命令中
+            if 'target' in task.config:
+                command += f" {task.config['target']}"
+
+            self._log("info", f"编译命令: {command}" +
+                      (f" (MAKEFLAGS={env['MAKEFLAGS']})" if env and 'MAKEFLAGS' in env else ""))
+
+            process_id = f"compile_{task.task_id}"
+            timeout = getattr(self.config, 'COMPILE_TIMEOUT', 21600)
+
+            # 编译进程独立于后端运行，后端重启后可重连
+            success = self.process_manager.start_process(
+                process_id=process_id,
+                command=command,
+                cwd=work_dir,
+                env=env,
+                batch_output_callback=self._make_compile_output_callback(task),
+                timeout=timeout,
+                persistent=True,
+                cgroup=self.build_cgroup_limits,
+                pass_fds=pass_fds
+            )
+
+            if not success:
+                return {
+                    "success": False,
+                    "message": "启动编译进程失败"
+                }
+
+            if env and 'MAKEFLAGS' in env:
+                info = self.process_manager.get_process_info(process_id) or {}
+                with self._lock:
+                    self._jobserver_makes[task.task_id] = info.get("pgid")
+
+            return self._wait_compile_process(task, process_id)
+
+        except Exception as e:
+            error_msg = f"执行编译时发生错误: {e}"
+            self._log("error", error_msg)
+            return {
+                "success": False,
+                "message": error_msg
+            }
+
+    @staticmethod
+    def _process_group_exists(pgid: int) -> bool:
+        """进程组中是否还有进程"""
+        try:
+            os.killpg(pgid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass
+        return True
+
+    def _reconcile_jobserver(self, task_id: str):
+        """
+        使用共享令牌池的编译结束后，没有其他 make 使用令牌池时重新填充令牌池
+
+        被取消或超时的 make 会被强制终止，已取走的令牌不会归还；不在此时补回，
+        每次取消都会让所有编译共享的并发数永久减少。
+        """
+        with self._lock:
+            if task_id not in self._jobserver_makes:
+                return
+            pgid = self._jobserver_makes.pop(task_id)
+            if pgid:
+                self._jobserver_lingering.add(pgid)
+
+        # 被终止的 make 及其子进程可能仍在退出
+        deadline = time.time() + self.JOBSERVER_RECONCILE_WAIT
+        while pgid and self._process_group_exists(pgid) and time.time() < deadline:
+            time.sleep(0.2)
+
+        with self._lock:
+            self._jobserver_lingering = {group for group in self._jobserver_lingering
+                                         if self._process_group_exists(group)}
+            if self._jobserver_makes or self._jobserver_lingering:
+                return
+            self.jobserver.reconcile()
+
+    def _get_task_log(self, task: CompileTask) -> TaskLog:
+        """获取（必要时打开）任务日志，重连的任务会在原日志文件后继续追加"""
+        if task.log is None:
+            task.log = TaskLog(
+                self.task_log_dir / f"{task.task_id}.log",
+                buffer_lines=self.task_log_buffer_lines,
+                index_interval=self.task_log_index_interval
+            )
+        return task.log
+
+    def _task_log_lock(self, task_id: str) -> threading.Lock:
+        """任务的日志锁"""
+        with self._lock:
+            return self._task_log_locks.setdefault(task_id, threading.Lock())
+
+    def _close_task_log(self, task: CompileTask):
+        """任务结束后关闭日志，之后只从文件读取"""
+        with self._task_log_lock(task.task_id):
+            if task.log is None:
+                return
+
+            task.log.close()
+            task.log = None
+
+            if self.task_log_archive:
+                self._archive_task_log(task.task_id)
+
+    def _archive_task_log(self, task_id: str):
+        """将已结束任务的日志压缩为分帧归档，并删除原始日志"""
+        log_file = self.task_log_dir / f"{task_id}.log"
+        try:
+            archive = LogArchive.create(
+                log_file, self.task_log_dir / f"{task_id}.log.gz",
+                frame_lines=self.task_log_archive_frame_lines
+            )
+            raw_size = log_file.stat().st_size
+            TaskLog(log_file, readonly=True).delete()
+            self._log("info", f"任务日志已压缩: {task_id} "
+                              f"({raw_size} -> {archive.size()} 字节, {archive.line_count} 行)")
+        except Exception as e:
+            self._log("error", f"压缩任务日志失败 {task_id}: {e}")
+
+    def _open_task_log_reader(self, task_id: str):
+        """打开已结束任务的日志（优先读取压缩归档），不存在时返回None"""
+        archive_file = self.task_log_dir / f"{task_id}.log.gz"
+        for _ in range(2):
+            if archive_file.exists():
+                return LogArchive(archive_file)
+            try:
+                return TaskLog(self.task_log_dir / f"{task_id}.log", buffer_lines=1,
+                               index_interval=self.task_log_index_interval, readonly=True)
+            except FileNotFoundError:
+                # 可能正在压缩，原始日志刚被删除
+                continue
+        return None
+
+    def _make_log_output_callback(self, task: CompileTask) -> Callable:
+        """创建写入任务日志并推送实时日志的批量输出回调"""
+        def output_callback(process_id, lines):
+            self._get_task_log(task).append(lines)
+            self._emit_task_event('compile_log', task, "\n".join(lines), {"lines": lines})
+
+        return output_callback
+
+    def _create_progress_tracker(self, task: CompileTask) -> CompileProgressTracker:
+        """根据用户源码目录的 .config 创建进度跟踪器"""
+        work_dir = Path(self.config.WORKSPACE_DIR) / "users" / task.username / "lede"
+        try:
+            return CompileProgressTracker.from_workspace(work_dir)
+        except Exception as e:
+            self._log("warning", f"统计软件包数量失败，使用关键词估算进度: {e}")
+            return CompileProgressTracker()
+
+    def _restore_progress_tracker(self, task: CompileTask):
+        """重连编译进程前用已写入的任务日志重建进度跟踪器"""
+        task.progress_tracker = self._create_progress_tracker(task)
+        log_file = self.task_log_dir / f"{task.task_id}.log"
+        if not log_file.exists():
+            return
+
+        try:
+            with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    task.progress_tracker.feed(line.rstrip("\n"))
+            task.progress = max(task.progress, task.progress_tracker.progress)
+        except OSError as e:
+            self._log("warning", f"读取任务日志失败 {task.task_id}: {e}")
+
+    def _make_compile_output_callback(self, task: CompileTask) -> Callable:
+        """创建编译阶段的批量输出回调（make V=s 输出量很大，按批处理和推送）"""
+        def output_callback(process_id, lines):
+            self._get_task_log(task).append(lines)
+
+            # 重连的任务在第一批输出时创建跟踪器
+            if task.progress_tracker is None:
+                task.progress_tracker = self._create_progress_tracker(task)
+            tracker = task.progress_tracker
+
+            changed = tracker.feed_lines(lines)
+            if tracker.progress > task.progress:
+                task.progress = tracker.progress
+
+            # 每批发送一次实时日志
+            self._emit_task_event('compile_log', task, "\n".join(lines), {"lines": lines})
+
+            # 软件包或阶段变化时推送进度（次数与软件包数成正比）
+            if changed:
+                self._emit_task_event('compile_progress', task, tracker.describe(), tracker.snapshot())
+
+        return output_callback
+
+    def _wait_compile_process(self, task: CompileTask, process_id: str) -> Dict[str, Any]:
+        """等待编译进程结束"""
+        try:
+            self._start_resource_sampling(task, process_id)
+
+            # 等待编译完成
+            try:
+                status = self.process_manager.wait_process(process_id)
+            finally:
+                self._stop_resource_sampling(task)
+
+            cgroup_stats = (self.process_manager.get_process_info(process_id) or {}).get("cgroup_stats")
+            if cgroup_stats:
+                self._log("info", f"编译进程 cgroup 统计 {task.task_id}: {cgroup_stats}")
+
+            if self.ccache:
+                task.ccache_stats = self.ccache.get_task_stats(task.task_id)
+                if task.ccache_stats:
+                    self._log("info", f"ccache 统计 {task.task_id}: 命中 {task.ccache_stats['hits']}，"
+                                      f"未命中 {task.ccache_stats['misses']}")
+
+            # 清理进程信息
+            self.process_manager.cleanup_process(process_id)
+
+            if status == ProcessStatus.COMPLETED:
+                self._log("info", f"编译完成: {task.task_id}")
+                return {
+                    "success": True,
+                    "message": "编译完成"
+                }
+            else:
+                return {
+                    "success": False,
+                    "message": f"编译失败，进程状态: {status.value}"
+                }
+
+        except Exception as e:
+            error_msg = f"等待编译进程时发生错误: {e}"
+            self._log("error", error_msg)
+            return {
+                "success": False,
+                "message": error_msg
+            }
+
+    def _config_flag(self, task: CompileTask, name: str, default: bool = True) -> bool:
+        """读取编译配置中的开关（兼容 "false"/"0" 等字符串）"""
+        return str(task.config.get(name, default)).lower() not in ("false", "0", "no")
+
+    def _use_ccache(self, task: CompileTask) -> bool:
+        """任务是否使用共享 ccache（用户可在编译配置中关闭）"""
+        return self._config_flag(task, "enable_ccache")
+
+    def _start_resource_sampling(self, task: CompileTask, process_id: str):
+        """开始采样编译进程树的资源占用"""
+        info = self.process_manager.get_process_info(process_id) or {}
+        if info.get("pid"):
+            self.resource_sampler.track(task.task_id, info["pid"], make_jobs=task.make_jobs)
+
+    def _stop_resource_sampling(self, task: CompileTask):
+        """停止采样并保存资源时间序列"""
+        series = self.resource_sampler.untrack(task.task_id)
+        if not series:
+            return
+        task.resource_summary = series.get("summary")
+
+        try:
+            save_series(self.resource_sample_dir, task.task_id, series)
+        except Exception as e:
+            self._log("error", f"保存资源采样失败 {task.task_id}: {e}")
+
+    def _collect_firmware(self, task: CompileTask) -> Dict[str, Any]:
+        """收集固件文件"""
+        task.status = CompileStatus.PACKAGING
+        task.progress = 95
+        self._emit_task_event('compile_progress', task, "收集固件文件...")
+
+        work_dir = Path(self.config.WORKSPACE_DIR) / "users" / task.username / "lede"
+        firmware_files = self._collect_firmware_files(work_dir)
+
+        if not firmware_files:
+            return {
+                "success": False,
+                "message": "未找到固件文件"
+            }
+
+        return {
+            "success": True,
+            "firmware_files": firmware_files,
+            "message": f"找到 {len(firmware_files)} 个固件文件"
+        }
+
     def _handle_task_success(self, task: CompileTask, collect_result: Dict[str, Any]):
         """处理编译成功"""
         try:
@@ -324,6 +1411,8 @@ class CompilerManager:
 
             self._log("info", f"编译任务完成: {task.task_id}, 耗时: {compile_time_str}")
 
+            self._record_build_history(task)
+
             # 结束用户编译会话
             if self.user_manager and task.session_id:
                 result_data = {
@@ -344,8 +1433,19 @@ class CompilerManager:
         except Exception as e:
             self._log("error", f"处理编译成功时发生错误: {e}")
 
+    def _finish_cancelled_task(self, task: CompileTask):
+        """已取消的任务在当前阶段结束后停止执行，恢复被阶段覆盖的取消状态"""
+        if task.status != CompileStatus.CANCELLED:
+            task.status = CompileStatus.CANCELLED
+            self._save_task(task)
+            self._emit_compile_status(task)
+        self._log("info", f"编译任务已停止: {task.task_id} (已取消)")
+
     def _handle_task_failure(self, task: CompileTask, error_message: str):
         """处理编译失败"""
+        if task.cancelled or task.status == CompileStatus.CANCELLED:
+            return
+
         try:
             task.end_time = datetime.now()
             task.status = CompileStatus.FAILED
@@ -478,7 +1578,8 @@ class CompilerManager:
         except Exception as e:
             self._log("warning", f"清理编译文件时发生错误: {e}")
 
-    def _emit_task_event(self, event_type: str, task: CompileTask, message: str = ""):
+    def _emit_task_event(self, event_type: str, task: CompileTask, message: str = "",
+                         extra: Optional[Dict[str, Any]] = None):
         """发送任务事件"""
         try:
             event_data = {
@@ -490,6 +1591,18 @@ class CompilerManager:
                 "device_name": task.device_name,
                 "timestamp": datetime.now().isoformat()
             }
+            if extra:
+                event_data.update(extra)
+
+            # 进度事件附带预计剩余时间
+            if event_type == 'compile_progress':
+                eta = self._estimate_eta(task)
+                if eta:
+                    event_data.update(eta)
+
+            # 阶段变化时持久化（日志行不触发）
+            if event_type != 'compile_log':
+                self._save_task(task)
 
             if self.websocket_handler:
                 self.websocket_handler.broadcast_message(event_type, event_data)
@@ -538,13 +1651,22 @@ class CompilerManager:
                     'message': message
                 })
             
+            # 有本地镜像时通过 alternates 共享镜像的对象库
+            mirror = None
+            if self.source_mirrors:
+                mirror = self.source_mirrors.ensure(repo_url, max_age=self.source_mirrors.max_age)
+
             success, message = self.git_helper.clone_repository(
-                repo_url, 
+                str(mirror) if mirror else repo_url,
                 lede_dir,
-                progress_callback=progress_callback
+                branch=self.config.LEDE_BRANCH if mirror else None,
+                progress_callback=progress_callback,
+                shared=bool(mirror)
             )
             
             if success:
+                if mirror:
+                    self.source_mirrors.attach(lede_dir, repo_url)
                 repo_info = self.git_helper.get_repository_info(lede_dir)
                 self._emit_event('clone_complete', {
                     'success': True,
@@ -626,74 +1748,80 @@ class CompilerManager:
                         f.write('src-git istore https://github.com/linkease/istore;main\n')
                     self._log("info", "iStore源已添加到feeds.conf.default")
 
-            # 更新feeds
-            def output_callback(process_id, line):
-                self._emit_event('feeds_log', {
-                    'process_id': process_id,
-                    'line': line,
-                    'username': username
-                })
+            # 有本地镜像时 feed 从镜像克隆和更新
+            env = self.source_mirrors.feed_env(lede_dir) if self.source_mirrors else None
 
-            # 执行feeds更新命令
-            commands = [
-                "./scripts/feeds update -a",
-                "./scripts/feeds install -a"
-            ]
+            def run_command(command: str, feed: Optional[str] = None) -> bool:
+                # 各 feed 的命令并发执行，输出按 feed 标记
+                process_id = f"feeds_update_{username or 'default'}" + (f"_{feed}" if feed else "")
 
-            if enable_istore:
-                commands.extend([
-                    "./scripts/feeds update istore",
-                    "./scripts/feeds install -d y -p istore luci-app-store"
-                ])
+                def output_callback(process_id, line):
+                    self._emit_event('feeds_log', {
+                        'process_id': process_id,
+                        'feed': feed,
+                        'line': line,
+                        'username': username
+                    })
 
-            for i, command in enumerate(commands):
-                process_id = f"feeds_update_{i}"
                 self._log("info", f"执行命令: {command}")
 
                 success = self.process_manager.start_process(
                     process_id=process_id,
                     command=command,
                     cwd=lede_dir,
+                    env=env,
                     output_callback=output_callback,
                     timeout=1800  # 30分钟超时
                 )
 
                 if not success:
-                    return {
-                        "success": False,
-                        "message": f"启动命令失败: {command}"
-                    }
+                    self._log("error", f"启动命令失败: {command}")
+                    return False
 
                 # 等待进程完成
-                while True:
-                    status = self.process_manager.get_process_status(process_id)
-                    if status in [ProcessStatus.COMPLETED, ProcessStatus.FAILED,
-                                 ProcessStatus.CANCELLED, ProcessStatus.TIMEOUT]:
-                        break
-                    time.sleep(1)
+                status = self.process_manager.wait_process(process_id)
+                self.process_manager.cleanup_process(process_id)
 
                 # 检查结果
                 if status != ProcessStatus.COMPLETED:
-                    error_msg = f"命令执行失败: {command}"
-                    self._log("error", error_msg)
-                    return {
-                        "success": False,
-                        "message": error_msg
-                    }
+                    self._log("error", f"命令执行失败: {command}")
+                    return False
+                return True
 
-            self._log("info", "feeds更新成功")
-            return {
-                    "success": True,
-                    "message": "feeds更新成功"
-                }
-            else:
-                error_msg = f"feeds更新失败，状态: {status.value}"
-                self._log("error", error_msg)
+            install_commands = ["./scripts/feeds install -a"]
+            if enable_istore:
+                install_commands.append("./scripts/feeds install -d y -p istore luci-app-store")
+            workers = getattr(self.config, 'FEEDS_UPDATE_WORKERS', 4)
+
+            # 各 feed 提交组合相同时直接恢复缓存的索引和安装结果
+            result = None
+            feeds_cache = self.repository_manager.feeds_cache
+            if feeds_cache:
+                result = feeds_cache.update_feeds(lede_dir, run_command, install_commands, workers)
+            if result is None:
+                result = update_and_install_feeds(lede_dir, run_command, install_commands, workers)
+
+            if not result["success"]:
+                self._log("error", result["message"])
                 return {
                     "success": False,
-                    "message": error_msg
+                    "message": result["message"]
                 }
-                
+
+            if result.get("cached"):
+                self._log("info", "feeds更新成功（使用缓存）")
+                return {
+                    "success": True,
+                    "message": "feeds更新成功",
+                    "cached": True
+                }
+
+            self._log("info", "feeds更新成功")
+            return {
+                "success": True,
+                "message": "feeds更新成功"
+            }
+
         except Exception as e:
             error_msg = f"更新feeds时发生错误: {e}"
             self._log("error", error_msg)
@@ -745,12 +1873,7 @@ class CompilerManager:
                 }
             
             # 等待进程完成
-            while True:
-                status = self.process_manager.get_process_status(process_id)
-                if status in [ProcessStatus.COMPLETED, ProcessStatus.FAILED, 
-                             ProcessStatus.CANCELLED, ProcessStatus.TIMEOUT]:
-                    break
-                time.sleep(1)
+            status = self.process_manager.wait_process(process_id)
             
             # 检查结果
             if status == ProcessStatus.COMPLETED:
@@ -775,213 +1898,6 @@ class CompilerManager:
                 "message": error_msg
             }
 
-    def start_compile(self, task_id: str, config: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        开始编译任务
-
-        Args:
-            task_id: 任务ID
-            config: 编译配置
-
-        Returns:
-            dict: 操作结果
-        """
-        try:
-            with self._lock:
-                if self.current_task and self.current_task.status in [
-                    CompileStatus.CLONING, CompileStatus.UPDATING_FEEDS,
-                    CompileStatus.INSTALLING_FEEDS, CompileStatus.CONFIGURING,
-                    CompileStatus.COMPILING
-                ]:
-                    return {
-                        "success": False,
-                        "message": "已有编译任务正在进行中"
-                    }
-
-            # 创建编译任务
-            task = CompileTask(task_id, config)
-            task.start_time = time.time()
-
-            with self._lock:
-                self.tasks[task_id] = task
-                self.current_task = task
-
-            # 添加到任务队列
-            self.task_queue.put(task)
-
-            self._log("info", f"编译任务已添加到队列: {task_id}")
-
-            return {
-                "success": True,
-                "message": "编译任务已启动",
-                "task_id": task_id
-            }
-
-        except Exception as e:
-            error_msg = f"启动编译任务时发生错误: {e}"
-            self._log("error", error_msg)
-            return {
-                "success": False,
-                "message": error_msg
-            }
-
-    def _execute_task(self, task: CompileTask):
-        """
-        执行编译任务
-
-        Args:
-            task: 编译任务
-        """
-        try:
-            self._log("info", f"开始执行编译任务: {task.task_id}")
-
-            # 检查LEDE源码
-            lede_dir = Path(self.config.LEDE_DIR)
-            if not self.git_helper.check_repository_exists(lede_dir):
-                task.status = CompileStatus.FAILED
-                task.error_message = "LEDE源码不存在"
-                self._emit_compile_status(task)
-                return
-
-            # 开始编译
-            task.status = CompileStatus.COMPILING
-            task.progress = 0.0
-            self._emit_compile_status(task)
-
-            # 构建编译命令
-            jobs = getattr(self.config, 'MAX_COMPILE_JOBS', 4)
-            command = f"make -j{jobs}"
-
-            # 如果有特定目标，添加到命令中
-            if 'target' in task.config:
-                command += f" {task.config['target']}"
-
-            self._log("info", f"编译命令: {command}")
-
-            # 启动编译进程
-            def output_callback(process_id, line):
-                task.output_lines.append(line)
-
-                # 计算编译进度
-                progress = self._calculate_compile_progress(line, task.output_lines)
-                if progress > task.progress:
-                    task.progress = progress
-
-                # 发送实时日志
-                self._emit_event('compile_log', {
-                    'task_id': task.task_id,
-                    'line': line,
-                    'progress': task.progress
-                })
-
-            process_id = f"compile_{task.task_id}"
-            timeout = getattr(self.config, 'COMPILE_TIMEOUT', 21600)  # 6小时默认超时
-
-            success = self.process_manager.start_process(
-                process_id=process_id,
-                command=command,
-                cwd=lede_dir,
-                output_callback=output_callback,
-                timeout=timeout
-            )
-
-            if not success:
-                task.status = CompileStatus.FAILED
-                task.error_message = "启动编译进程失败"
-                self._emit_compile_status(task)
-                return
-
-            # 等待编译完成
-            while True:
-                status = self.process_manager.get_process_status(process_id)
-                if status in [ProcessStatus.COMPLETED, ProcessStatus.FAILED,
-                             ProcessStatus.CANCELLED, ProcessStatus.TIMEOUT]:
-                    break
-                time.sleep(5)  # 每5秒检查一次状态
-
-            # 处理编译结果
-            if status == ProcessStatus.COMPLETED:
-                task.status = CompileStatus.COMPLETED
-                task.progress = 100.0
-                task.end_time = time.time()
-
-                # 收集固件文件
-                task.firmware_files = self._collect_firmware_files(lede_dir)
-
-                self._log("info", f"编译任务完成: {task.task_id}")
-                self._emit_event('compile_complete', {
-                    'task_id': task.task_id,
-                    'firmware_files': task.firmware_files
-                })
-            else:
-                task.status = CompileStatus.FAILED
-                task.end_time = time.time()
-                task.error_message = f"编译失败，进程状态: {status.value}"
-
-                self._log("error", f"编译任务失败: {task.task_id}, 状态: {status.value}")
-                self._emit_event('compile_error', {
-                    'task_id': task.task_id,
-                    'error': task.error_message
-                })
-
-            self._emit_compile_status(task)
-
-            # 清理进程信息
-            self.process_manager.cleanup_process(process_id)
-
-        except Exception as e:
-            task.status = CompileStatus.FAILED
-            task.end_time = time.time()
-            task.error_message = f"执行编译任务时发生错误: {e}"
-
-            self._log("error", f"执行编译任务失败: {e}")
-            self._emit_compile_status(task)
-
-    def _calculate_compile_progress(self, line: str, all_lines: List[str]) -> float:
-        """
-        计算编译进度
-
-        Args:
-            line: 当前输出行
-            all_lines: 所有输出行
-
-        Returns:
-            float: 进度百分比 (0-100)
-        """
-        try:
-            # 基于关键词的进度估算
-            progress_keywords = {
-                'Checking': 5,
-                'Downloading': 10,
-                'Extracting': 15,
-                'Patching': 20,
-                'Configuring': 25,
-                'Building': 30,
-                'Compiling': 40,
-                'Installing': 80,
-                'Packaging': 90,
-                'Successfully': 95
-            }
-
-            # 检查当前行的关键词
-            current_progress = 0
-            for keyword, progress in progress_keywords.items():
-                if keyword.lower() in line.lower():
-                    current_progress = max(current_progress, progress)
-
-            # 基于编译目标数量的进度估算
-            if 'make[' in line and '] Entering directory' in line:
-                # 统计已进入的目录数量
-                entering_count = sum(1 for l in all_lines if '] Entering directory' in l)
-                # 假设总共有100个主要编译目标
-                target_progress = min(30 + (entering_count * 0.5), 85)
-                current_progress = max(current_progress, target_progress)
-
-            return current_progress
-
-        except Exception:
-            return 0.0
-
     def _collect_firmware_files(self, lede_dir: Path) -> List[Dict[str, Any]]:
         """
         收集固件文件
@@ -1029,8 +1945,8 @@ class CompilerManager:
             'task_id': task.task_id,
             'status': task.status.value,
             'progress': task.progress,
-            'start_time': task.start_time,
-            'end_time': task.end_time,
+            'start_time': task.start_time.isoformat() if task.start_time else None,
+            'end_time': task.end_time.isoformat() if task.end_time else None,
             'error_message': task.error_message
         })
 
@@ -1060,13 +1976,24 @@ class CompilerManager:
                         "message": "任务已完成或已取消"
                     }
 
-            # 终止编译进程
-            process_id = f"compile_{task_id}"
-            self.process_manager.kill_process(process_id)
-
-            # 更新任务状态
+            # 更新任务状态并移出队列（执行中的任务在当前阶段结束后停止）
+            task.cancelled = True
             task.status = CompileStatus.CANCELLED
-            task.end_time = time.time()
+            task.end_time = datetime.now()
+            self.scheduler.cancel(task_id)
+            self._save_task(task)
+
+            # 结束用户编译会话
+            if self.user_manager and task.session_id:
+                self.user_manager.end_compile_session(
+                    task.username, task.session_id, False,
+                    {"error_message": "编译任务已取消", "device_name": task.device_name}
+                )
+
+            # 终止当前阶段的进程
+            for prefix in ("download", "configure", "compile"):
+                self.process_manager.kill_process(f"{prefix}_{task_id}")
+
             self._emit_compile_status(task)
 
             self._log("info", f"编译任务已取消: {task_id}")
@@ -1095,42 +2022,252 @@ class CompilerManager:
             dict: 任务状态信息
         """
         with self._lock:
-            if task_id not in self.tasks:
+            task = self.tasks.get(task_id)
+
+        # 不在内存中的历史任务从存储中读取
+        if task is None:
+            record = self.task_store.get_task(task_id)
+            if record is None:
                 return None
+            task = CompileTask.from_record(record)
+
+        return {
+            "task_id": task.task_id,
+            "username": task.username,
+            "status": task.status.value,
+            "progress": task.progress,
+            "start_time": task.start_time,
+            "end_time": task.end_time,
+            "error_message": task.error_message,
+            "firmware_files": task.firmware_files,
+            "cached_from": task.cached_from,
+            "config": task.config,
+            "progress_detail": task.progress_tracker.snapshot() if task.progress_tracker else None,
+            "eta": self._estimate_eta(task)
+        }
+
+    def list_tasks(self, username: str = None, status: str = None,
+                   limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        列出任务
 
-            task = self.tasks[task_id]
+        Args:
+            username: 按用户筛选（可选）
+            status: 按状态筛选（可选）
+            limit: 最大返回数量
 
-            return {
+        Returns:
+            list: 任务列表
+        """
+        records = self.task_store.list_tasks(
+            username=username,
+            statuses=[status] if status else None,
+            limit=limit
+        )
+
+        tasks = []
+        for record in records:
+            # 运行中的任务使用内存中的实时进度
+            with self._lock:
+                task = self.tasks.get(record["task_id"])
+            if task is None:
+                task = CompileTask.from_record(record)
+
+            tasks.append({
                 "task_id": task.task_id,
+                "username": task.username,
                 "status": task.status.value,
                 "progress": task.progress,
                 "start_time": task.start_time,
                 "end_time": task.end_time,
                 "error_message": task.error_message,
-                "firmware_files": task.firmware_files,
                 "config": task.config
-            }
+            })
+        return tasks
 
-    def list_tasks(self) -> List[Dict[str, Any]]:
+    def get_task_log(self, task_id: str, start: Optional[int] = None,
+                     count: int = 500, tail: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """
-        列出所有任务
+        读取任务日志
+
+        Args:
+            task_id: 任务ID
+            start: 起始行号（从0开始，负数表示从末尾倒数）
+            count: 读取行数
+            tail: 读取最后N行（指定时忽略 start）
 
         Returns:
-            list: 任务列表
+            dict: 日志行及总行数，日志不存在时返回None
         """
         with self._lock:
-            tasks = []
-            for task in self.tasks.values():
-                tasks.append({
-                    "task_id": task.task_id,
-                    "status": task.status.value,
-                    "progress": task.progress,
-                    "start_time": task.start_time,
-                    "end_time": task.end_time,
-                    "error_message": task.error_message,
-                    "config": task.config
-                })
-            return tasks
+            task = self.tasks.get(task_id)
+
+        # 持有日志锁期间任务日志不会被关闭或压缩删除
+        with self._task_log_lock(task_id):
+            log = task.log if task else None
+
+            # 已结束的任务直接打开日志文件或压缩归档读取
+            opened = False
+            if log is None:
+                log = self._open_task_log_reader(task_id)
+                if log is None:
+                    return None
+                opened = True
+
+            try:
+                count = max(0, min(int(count), 10000))
+                if tail is not None:
+                    lines = log.tail(min(int(tail), 10000))
+                    start = max(0, log.line_count - len(lines))
+                else:
+                    start = int(start or 0)
+                    if start < 0:
+                        start = max(0, log.line_count + start)
+                    lines = log.read_lines(start, count)
+
+                return {
+                    "task_id": task_id,
+                    "total_lines": log.line_count,
+                    "start": start,
+                    "lines": lines,
+                    "compressed": isinstance(log, LogArchive)
+                }
+            finally:
+                if opened:
+                    log.close()
+
+    def get_build_profile(self, task_id: str, limit: Optional[int] = 20) -> Optional[Dict[str, Any]]:
+        """
+        获取任务的最慢软件包报告
+
+        Args:
+            task_id: 任务ID
+            limit: 最多返回的软件包数（None表示全部）
+
+        Returns:
+            dict: 耗时报告，任务未结束或没有数据时返回None
+        """
+        try:
+            return load_profile_report(self.build_profile_dir, task_id, limit)
+        except (OSError, ValueError) as e:
+            self._log("error", f"读取编译耗时分析失败 {task_id}: {e}")
+            return None
+
+    def get_build_profile_folded(self, task_id: str) -> Optional[str]:
+        """
+        获取任务的火焰图数据（folded stacks 格式）
+
+        Args:
+            task_id: 任务ID
+
+        Returns:
+            str: 文件内容，不存在时返回None
+        """
+        folded_file = self.build_profile_dir / f"{task_id}.folded"
+        if not folded_file.exists():
+            return None
+        return folded_file.read_text(encoding='utf-8')
+
+    def get_task_resources(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取任务编译阶段的资源时间序列（运行中的任务返回当前采样结果）
+
+        Args:
+            task_id: 任务ID
+
+        Returns:
+            dict: interval、cpu_count、make_jobs、summary 以及各列数据，不存在时返回None
+        """
+        series = self.resource_sampler.get_series(task_id)
+        if series is not None:
+            return series
+
+        try:
+            return load_series(self.resource_sample_dir, task_id)
+        except (OSError, ValueError) as e:
+            self._log("error", f"读取资源采样失败 {task_id}: {e}")
+            return None
+
+    def get_task_ccache_stats(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取任务编译阶段的 ccache 命中统计（运行中的任务返回当前统计）
+
+        Args:
+            task_id: 任务ID
+
+        Returns:
+            dict: hits、misses、uncacheable、hit_rate、counters，没有统计时返回None
+        """
+        if self.ccache:
+            try:
+                stats = self.ccache.get_task_stats(task_id)
+                if stats is not None:
+                    return stats
+            except OSError as e:
+                self._log("error", f"读取 ccache 统计失败 {task_id}: {e}")
+
+        task = self.tasks.get(task_id)
+        if task is None:
+            record = self.task_store.get_task(task_id)
+            return ((record or {}).get("result") or {}).get("ccache_stats")
+        return task.ccache_stats
+
+    def get_ccache_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        获取共享 ccache 的总体统计
+
+        Returns:
+            dict: cache_dir、max_size、命中统计和缓存大小，未启用时返回None
+        """
+        if not self.ccache:
+            return None
+
+        # 系统没有安装 ccache 时使用 OpenWrt 编译出的 ccache
+        search_dirs = [Path(self.config.LEDE_DIR) / "staging_dir" / "host" / "bin"]
+        search_dirs += sorted((Path(self.config.WORKSPACE_DIR) / "users").glob("*/lede/staging_dir/host/bin"))
+        return self.ccache.get_stats(search_dirs)
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        获取各共享缓存的统计
+
+        Returns:
+            dict: ccache、downloads、feeds、toolchains、firmware（未启用的为None）
+        """
+        feeds_cache = self.repository_manager.feeds_cache
+        return {
+            "ccache": self.get_ccache_stats(),
+            "downloads": self.download_cache.get_stats() if self.download_cache else None,
+            "feeds": feeds_cache.get_stats() if feeds_cache else None,
+            "toolchains": self.toolchain_cache.get_stats() if self.toolchain_cache else None,
+            "firmware": self.firmware_cache.get_stats() if self.firmware_cache else None
+        }
+
+    def get_queue_status(self, username: str = None) -> Dict[str, Any]:
+        """
+        获取编译队列状态
+
+        Args:
+            username: 仅返回该用户的任务（可选）
+
+        Returns:
+            dict: 队列状态，包括排队位置和预计开始时间
+        """
+        queue_status = self.scheduler.get_queue_status()
+        if self.jobserver:
+            queue_status["stats"]["jobserver"] = self.jobserver.get_stats()
+        if self.memory_governor:
+            queue_status["stats"]["memory_governor"] = self.memory_governor.get_status()
+
+        if username:
+            queue_status["running"] = [
+                item for item in queue_status["running"] if item["username"] == username
+            ]
+            queue_status["queued"] = [
+                item for item in queue_status["queued"] if item["username"] == username
+            ]
+
+        return queue_status
 
     def get_repository_status(self) -> Dict[str, Any]:
         """
@@ -45,12 +45,66 @@ class Config:
     LEDE_BRANCH = "master"
     ISTORE_REPO_URL = "https://github.com/linkease/istore"
     ISTORE_BRANCH = "main"
+    SOURCE_MIRROR = os.environ.get('SOURCE_MIRROR', 'false').lower() == 'true'  # 本地镜像 LEDE、iStore 和各 feed 仓库
+    SOURCE_MIRROR_DIR = WORKSPACE_DIR / "mirrors"  # 裸仓库镜像目录（用户工作区通过 alternates 引用，不能随意删除）
+    SOURCE_MIRROR_REFRESH_INTERVAL = 3600  # 镜像定时更新间隔（秒）
+    SOURCE_MIRROR_MAX_AGE = 300  # 克隆、拉取和 feeds 更新前镜像超过该时间（秒）未更新时先更新
+    FEEDS_CACHE = os.environ.get('FEEDS_CACHE', 'true').lower() == 'true'  # 按 LEDE、feeds.conf 和各 feed 提交缓存 feeds 索引和安装结果
+    FEEDS_CACHE_DIR = WORKSPACE_DIR / "feeds_cache"  # feeds 缓存目录
+    FEEDS_CACHE_MAX_SIZE = int(os.environ.get('FEEDS_CACHE_MAX_SIZE', 5 * 1024 ** 3))  # feeds 缓存大小上限（字节）
+    FEEDS_UPDATE_WORKERS = int(os.environ.get('FEEDS_UPDATE_WORKERS', 4))  # 同时更新的 feed 数上限
+    GOLDEN_WORKSPACE = os.environ.get('GOLDEN_WORKSPACE', 'false').lower() == 'true'  # 用户工作区从每个 LEDE 提交的黄金工作区复制
+    GOLDEN_WORKSPACE_DIR = WORKSPACE_DIR / "golden"  # 黄金工作区目录（与用户工作区在同一文件系统时才能使用 reflink/硬链接）
+    GOLDEN_WORKSPACE_COPY_MODE = os.environ.get('GOLDEN_WORKSPACE_COPY_MODE', 'auto')  # auto/reflink/hardlink/copy
+    GOLDEN_WORKSPACE_KEEP = 2  # 保留的黄金工作区数（按是否启用iStore分别计算）
+    WORKSPACE_POOL_SIZE = int(os.environ.get('WORKSPACE_POOL_SIZE', 0))  # 预热工作区数（已安装 feeds 并下载源码包），0 表示不预热
+    WORKSPACE_POOL_DIR = WORKSPACE_DIR / "pool"  # 预热工作区目录（需与用户工作区在同一文件系统）
+    WORKSPACE_POOL_INTERVAL = 300  # 检查是否需要补充预热工作区的间隔（秒）
 
     # 编译配置
-    MAX_COMPILE_JOBS = os.cpu_count() or 4
+    MAX_COMPILE_JOBS = os.cpu_count() or 4  # 所有并发编译共享的CPU预算
+    MAKE_JOBSERVER = os.environ.get('MAKE_JOBSERVER', 'true').lower() == 'true'  # 所有编译共享一个 make jobserver（令牌数为 MAX_COMPILE_JOBS）
+    MAKE_JOBSERVER_FIFO = WORKSPACE_DIR / "jobserver.fifo"  # jobserver 命名管道
+    AUTO_JOBS_MEMORY_PER_JOB = 2 * 1024 ** 3  # compile_threads 为 auto 时，没有历史记录时假定的单个编译进程峰值内存（字节）
+    AUTO_JOBS_MEMORY_RESERVE = 2 * 1024 ** 3  # 为系统和后端保留的内存（字节）
+    MEMORY_GOVERNOR_INTERVAL = 5  # 共享 jobserver 时内存压力检查间隔（秒）
+    MAX_CONCURRENT_COMPILES = int(os.environ.get('MAX_CONCURRENT_COMPILES', 2))  # 并发编译槽位数
+    MAX_QUEUED_TASKS_PER_USER = 3  # 每个用户最多排队的编译任务数
+    DEFAULT_COMPILE_DURATION = 3600 * 2  # 无历史数据时估算排队时间用的编译耗时
+    TASK_DB_FILE = WORKSPACE_DIR / "compile_tasks.db"  # 编译任务持久化数据库
+    PROCESS_STATE_DIR = WORKSPACE_DIR / "processes"  # 可重连编译进程的状态和日志目录
+    PROCESS_IO_BACKEND = os.environ.get('PROCESS_IO_BACKEND', 'reactor')  # 子进程输出读取方式: reactor/threads
+    TASK_LOG_DIR = WORKSPACE_DIR / "task_logs"  # 编译任务完整日志目录
+    TASK_LOG_BUFFER_LINES = 2000  # 每个任务在内存中保留的最近日志行数
+    TASK_LOG_INDEX_INTERVAL = 1000  # 日志行偏移索引间隔（行）
+    TASK_LOG_ARCHIVE = True  # 任务结束后将日志压缩为可随机读取的归档
+    TASK_LOG_ARCHIVE_FRAME_LINES = 10000  # 压缩归档每帧行数
+    BUILD_PROFILE_DIR = WORKSPACE_DIR / "build_profiles"  # 编译耗时报告和火焰图数据目录
+    RESOURCE_SAMPLE_INTERVAL = 5  # 编译进程树资源采样间隔（秒）
+    RESOURCE_SAMPLE_MAX_POINTS = 1440  # 每个任务最多保留的采样点（超过后相邻点合并）
+    RESOURCE_SAMPLE_DIR = WORKSPACE_DIR / "resource_samples"  # 资源采样时间序列保存目录
+
+    # cgroup v2 资源隔离（需要后端所在的 cgroup 可写，例如 systemd 服务设置 Delegate=yes）
+    CGROUP_ISOLATION = os.environ.get('CGROUP_ISOLATION', 'false').lower() == 'true'
+    CGROUP_BACKEND_RESERVED_SHARE = 20  # 资源争用时后端保留的 CPU/IO 份额（%）
+    CGROUP_BUILD_CPU_WEIGHT = 100  # 每个编译任务的 cpu.weight
+    CGROUP_BUILD_IO_WEIGHT = 100  # 每个编译任务的 io.weight
+    CGROUP_BUILD_MEMORY_MAX = os.environ.get('CGROUP_BUILD_MEMORY_MAX')  # 每个编译任务的 memory.max，例如 "8G"
     COMPILE_TIMEOUT = 3600 * 8  # 8小时超时
     DOWNLOAD_JOBS = 8  # make download并发数
-    ENABLE_CCACHE = True
+    DOWNLOAD_CACHE = os.environ.get('DOWNLOAD_CACHE', 'true').lower() == 'true'  # 所有用户工作区共享 dl/ 源码包
+    DOWNLOAD_CACHE_DIR = WORKSPACE_DIR / "dl_cache"  # 共享下载缓存目录（与工作区在同一文件系统时使用硬链接）
+    DOWNLOAD_CACHE_MAX_SIZE = int(os.environ.get('DOWNLOAD_CACHE_MAX_SIZE', 100 * 1024 ** 3))  # 下载缓存大小上限（字节）
+    TOOLCHAIN_CACHE = os.environ.get('TOOLCHAIN_CACHE', 'false').lower() == 'true'  # 缓存预编译工具链（只恢复到产出它的工作区）
+    TOOLCHAIN_CACHE_DIR = WORKSPACE_DIR / "toolchain_cache"  # 工具链缓存目录
+    TOOLCHAIN_CACHE_MAX_SIZE = int(os.environ.get('TOOLCHAIN_CACHE_MAX_SIZE', 50 * 1024 ** 3))  # 工具链缓存大小上限（字节）
+    FIRMWARE_CACHE = os.environ.get('FIRMWARE_CACHE', 'true').lower() == 'true'  # 相同源码版本和配置的编译直接使用已有固件
+    FIRMWARE_CACHE_DIR = WORKSPACE_DIR / "firmware_cache"  # 固件缓存目录
+    FIRMWARE_CACHE_MAX_SIZE = int(os.environ.get('FIRMWARE_CACHE_MAX_SIZE', 20 * 1024 ** 3))  # 固件缓存大小上限（字节）
+    ENABLE_CCACHE = os.environ.get('ENABLE_CCACHE', 'true').lower() == 'true'  # 所有用户工作区共享一个 ccache
+    CCACHE_DIR = WORKSPACE_DIR / "ccache"  # 共享 ccache 目录
+    CCACHE_MAX_SIZE = os.environ.get('CCACHE_MAX_SIZE', '50G')  # ccache 大小上限，超过后自动清理最久未用的条目
+    CCACHE_STATS_DIR = WORKSPACE_DIR / "ccache_stats"  # 各任务的 ccache 统计日志
 
     # 用户管理配置
     USER_SESSION_TIMEOUT = timedelta(hours=24)
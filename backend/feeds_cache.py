@@ -0,0 +1,326 @@
+"""
+feeds 缓存
+feeds 的索引（feeds/<名称>.index、feeds/<名称>.tmp）、package/feeds 符号链接和 tmp/info 只取决于 LEDE 提交、
+feeds.conf 和各 feed 的提交，相同组合的工作区直接恢复缓存，不再重新生成索引（已有 .config 时仍执行安装以刷新配置）。
+各 feed 的 git 仓库互不依赖，按 feed 并发更新（线程数有上限）；生成索引和安装会改写共享的 tmp/ 和 .config，依次执行
+"""
+
+import re
+import json
+import shlex
+import shutil
+import hashlib
+from pathlib import Path, PurePath
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Callable
+
+from utils.artifact_cache import ArtifactCache
+from utils.git_helper import GitHelper
+
+
+FEED_LINE_PATTERN = re.compile(r"^\s*(src-\S+)\s+(\S+)\s+(\S+)")
+GIT_FEED_TYPES = ("src-git", "src-git-full")
+
+# 缓存的文件（相对源码目录的 glob）：前三项为 feeds 索引，其余为安装结果
+INDEX_PATTERNS = ("feeds/*.index", "feeds/*.targetindex", "feeds/*.tmp")
+ARTIFACT_PATTERNS = INDEX_PATTERNS + ("package/feeds", "tmp/info")
+
+
+def parse_feeds_conf(content: str) -> List[Dict[str, Optional[str]]]:
+    """
+    解析 feeds.conf
+
+    Args:
+        content: feeds.conf 内容
+
+    Returns:
+        list: 各 feed 的 type、name、url、branch（;分支）、commit（^提交）
+    """
+    feeds = []
+    for line in content.splitlines():
+        match = FEED_LINE_PATTERN.match(line)
+        if not match:
+            continue
+        feed_type, name, source = match.groups()
+        url, branch, commit = source, None, None
+        if "^" in source:
+            url, commit = source.split("^", 1)
+        elif ";" in source:
+            url, branch = source.split(";", 1)
+        feeds.append({"type": feed_type, "name": name, "url": url, "branch": branch, "commit": commit})
+    return feeds
+
+
+def feeds_conf_path(work_dir: Path) -> Path:
+    """工作区使用的 feeds.conf（没有时为 feeds.conf.default）"""
+    work_dir = Path(work_dir)
+    feeds_conf = work_dir / "feeds.conf"
+    return feeds_conf if feeds_conf.exists() else work_dir / "feeds.conf.default"
+
+
+def feed_sync_command(work_dir: Path, feed: Dict[str, Optional[str]]) -> str:
+    """
+    更新单个 git feed 仓库的命令（与 scripts/feeds update 的 git 操作相同，但不生成索引）
+
+    Args:
+        work_dir: 源码目录
+        feed: parse_feeds_conf 返回的 feed
+
+    Returns:
+        str: 在源码目录中执行的 shell 命令
+    """
+    path = shlex.quote(f"feeds/{feed['name']}")
+    url = shlex.quote(feed["url"])
+    depth = "" if feed["type"] == "src-git-full" else "--depth 1 "
+    if (Path(work_dir) / "feeds" / feed["name"] / ".git").is_dir():
+        if feed["commit"]:
+            command = f"git -C {path} fetch origin && git -C {path} checkout -f {shlex.quote(feed['commit'])}"
+        else:
+            command = f"git -C {path} pull --ff-only"
+    elif feed["commit"]:
+        commit = shlex.quote(feed["commit"])
+        command = f"git clone {url} {path} && git -C {path} checkout -b {commit} {commit}"
+    elif feed["branch"]:
+        command = f"git clone {depth}--branch {shlex.quote(feed['branch'])} {url} {path}"
+    else:
+        command = f"git clone {depth}{url} {path}"
+    return f"{command} && git -C {path} submodule update --init --recursive"
+
+
+def run_per_feed(feeds: List[Dict[str, Optional[str]]],
+                 command_for: Callable[[Dict[str, Optional[str]]], str],
+                 run_command: Callable[[str, Optional[str]], bool], workers: int = 1) -> List[str]:
+    """
+    按 feed 并发执行命令
+
+    Args:
+        feeds: parse_feeds_conf 返回的 feed
+        command_for: 返回 feed 对应命令的函数
+        run_command: 执行命令的函数，参数为 (命令, feed名称)，返回是否成功
+        workers: 同时执行的命令数上限
+
+    Returns:
+        list: 失败的 feed 名称
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="feeds") as pool:
+        futures = {feed["name"]: pool.submit(run_command, command_for(feed), feed["name"]) for feed in feeds}
+    return [name for name, future in futures.items() if not future.result()]
+
+
+def update_and_install_feeds(work_dir: Path, run_command: Callable[[str, Optional[str]], bool],
+                             install_commands: List[str], workers: int = 1) -> Dict[str, Any]:
+    """
+    不使用缓存更新并安装 feeds：并发更新各 git feed 的仓库，再执行一次 scripts/feeds update
+    生成索引（有非 git 类型的 feed 时为 update -a，同时更新这些 feed），最后依次执行安装命令
+
+    Args:
+        work_dir: 源码目录
+        run_command: 在源码目录中执行命令的函数，参数为 (命令, feed名称)，返回是否成功
+        install_commands: 安装 feeds 的命令
+        workers: 同时更新的 feed 数上限
+
+    Returns:
+        dict: success、message
+    """
+    conf = feeds_conf_path(work_dir)
+    feeds = parse_feeds_conf(conf.read_text(encoding='utf-8', errors='replace')) if conf.exists() else []
+    git_feeds = [feed for feed in feeds if feed["type"] in GIT_FEED_TYPES]
+    if git_feeds:
+        failed = run_per_feed(git_feeds, lambda feed: feed_sync_command(work_dir, feed), run_command, workers)
+        if failed:
+            return {"success": False, "message": f"更新feed失败: {', '.join(failed)}"}
+
+    # scripts/feeds update 会写共享的 tmp/ 并按已有的 .config 刷新配置，并发执行会互相覆盖，只执行一次
+    index_command = "./scripts/feeds update -i" if feeds and len(git_feeds) == len(feeds) else "./scripts/feeds update -a"
+    for command in [index_command] + install_commands:
+        if not run_command(command, None):
+            return {"success": False, "message": f"命令执行失败: {command}"}
+    return {"success": True, "message": "feeds更新完成"}
+
+
+class FeedsCache:
+    """按 LEDE 提交、feeds.conf 和各 feed 提交缓存的 feeds 索引与安装结果"""
+
+    def __init__(self, cache_dir: Path, max_size: int, logger=None):
+        """
+        初始化 feeds 缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_size: 大小上限（字节），超过后淘汰最久未使用的条目
+            logger: 日志记录器
+        """
+        self.cache = ArtifactCache(cache_dir, max_size, logger, name="feeds缓存")
+        self.logger = logger
+        self.git_helper = GitHelper(logger)
+
+    def _log(self, level: str, message: str):
+        """记录日志"""
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    def setup(self):
+        """创建缓存目录和索引"""
+        self.cache.setup()
+
+    def feeds_key(self, work_dir: Path, install_commands: List[str]) -> Optional[str]:
+        """
+        计算工作区当前 feeds 状态的缓存键
+
+        Args:
+            work_dir: 源码目录
+            install_commands: 安装 feeds 的命令（不同的安装方式结果不同）
+
+        Returns:
+            str: sha256，LEDE 或某个 feed 不是 git 仓库、有未提交的修改时返回None
+        """
+        work_dir = Path(work_dir)
+        lede = self.git_helper.get_head_commit(work_dir)
+        if not lede:
+            return None
+
+        content = feeds_conf_path(work_dir).read_text(encoding='utf-8', errors='replace')
+        revisions = {}
+        for feed in parse_feeds_conf(content):
+            feed_dir = work_dir / "feeds" / feed["name"]
+            commit = self.git_helper.get_head_commit(feed_dir)
+            if not commit or self.git_helper.is_dirty(feed_dir):
+                return None
+            revisions[feed["name"]] = commit
+
+        payload = {"lede": lede, "feeds_conf": content, "feeds": revisions, "install": install_commands}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _artifacts(work_dir: Path, patterns=ARTIFACT_PATTERNS) -> List[Path]:
+        """工作区中需要缓存的文件和目录"""
+        paths = []
+        for pattern in patterns:
+            paths += sorted(Path(work_dir).glob(pattern))
+        return paths
+
+    @staticmethod
+    def _remove(path: Path):
+        """删除文件、符号链接或目录"""
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path, ignore_errors=True)
+        elif path.is_symlink() or path.exists():
+            path.unlink()
+
+    def restore(self, work_dir: Path, key: str, patterns=ARTIFACT_PATTERNS) -> bool:
+        """
+        恢复缓存的 feeds 索引、package/feeds 和 tmp/info（替换工作区中已有的）
+
+        Args:
+            work_dir: 源码目录
+            key: 缓存键
+            patterns: 恢复的部分（默认全部，INDEX_PATTERNS 为只恢复索引）
+
+        Returns:
+            bool: 是否命中并恢复
+        """
+        entry = self.cache.lookup(key)
+        if not entry:
+            return False
+
+        work_dir = Path(work_dir)
+        for path in self._artifacts(work_dir, patterns):
+            self._remove(path)
+
+        for relative in entry["meta"].get("paths", []):
+            if not any(PurePath(relative).match(pattern) for pattern in patterns):
+                continue
+            source = entry["path"] / relative
+            target = work_dir / relative
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if source.is_dir() and not source.is_symlink():
+                shutil.copytree(source, target, symlinks=True)
+            else:
+                shutil.copy2(source, target, follow_symlinks=False)
+        return True
+
+    def save(self, work_dir: Path, key: str) -> bool:
+        """
+        保存工作区的 feeds 索引、package/feeds 和 tmp/info
+
+        Args:
+            work_dir: 源码目录
+            key: 缓存键
+
+        Returns:
+            bool: 是否保存成功
+        """
+        work_dir = Path(work_dir)
+        paths = [str(path.relative_to(work_dir)) for path in self._artifacts(work_dir)]
+        if not paths:
+            return False
+
+        def populate(entry_dir: Path):
+            for relative in paths:
+                source = work_dir / relative
+                target = entry_dir / relative
+                target.parent.mkdir(parents=True, exist_ok=True)
+                if source.is_dir() and not source.is_symlink():
+                    shutil.copytree(source, target, symlinks=True)
+                else:
+                    shutil.copy2(source, target, follow_symlinks=False)
+
+        return self.cache.store(key, populate, {"paths": paths})
+
+    def update_feeds(self, work_dir: Path, run_command: Callable[[str, Optional[str]], bool],
+                     install_commands: List[str], workers: int = 1) -> Optional[Dict[str, Any]]:
+        """
+        更新并安装 feeds：先并发更新各 feed 的 git 仓库，相同的提交组合命中缓存时直接恢复，
+        否则重新生成索引（scripts/feeds update -i，只执行一次）并执行安装命令，然后写入缓存
+
+        Args:
+            work_dir: 源码目录
+            run_command: 在源码目录中执行命令的函数，参数为 (命令, feed名称)，返回是否成功
+            install_commands: 安装 feeds 的命令
+            workers: 同时更新的 feed 数上限
+
+        Returns:
+            dict: success、cached、message；feeds.conf 中有非 git 类型的 feed 时返回None（调用方照常执行 scripts/feeds）
+        """
+        work_dir = Path(work_dir)
+        conf = feeds_conf_path(work_dir)
+        if not conf.exists():
+            return None
+        feeds = parse_feeds_conf(conf.read_text(encoding='utf-8', errors='replace'))
+        if not feeds or any(feed["type"] not in GIT_FEED_TYPES for feed in feeds):
+            return None
+
+        failed = run_per_feed(feeds, lambda feed: feed_sync_command(work_dir, feed), run_command, workers)
+        if failed:
+            return {"success": False, "cached": False, "message": f"更新feed失败: {', '.join(failed)}"}
+
+        key = self.feeds_key(work_dir, install_commands)
+        if key and not (work_dir / ".config").exists() and self.restore(work_dir, key):
+            self._log("info", f"feeds 缓存命中，已恢复索引和安装结果: {work_dir}")
+            return {"success": True, "cached": True, "message": "feeds更新完成（使用缓存）"}
+
+        # 已有 .config 时只恢复索引，安装命令照常执行：scripts/feeds install 会按新安装的软件包
+        # 刷新 .config（包括 -d y 的默认选中），与未命中时的结果相同
+        if key and (work_dir / ".config").exists() and self.restore(work_dir, key, INDEX_PATTERNS):
+            self._log("info", f"feeds 缓存命中，已恢复索引: {work_dir}")
+            for command in install_commands:
+                if not run_command(command, None):
+                    return {"success": False, "cached": False, "message": f"命令执行失败: {command}"}
+            return {"success": True, "cached": True, "message": "feeds更新完成（使用缓存）"}
+
+        for command in ["./scripts/feeds update -i"] + install_commands:
+            if not run_command(command, None):
+                return {"success": False, "cached": False, "message": f"命令执行失败: {command}"}
+
+        if key:
+            self.save(work_dir, key)
+        return {"success": True, "cached": False, "message": "feeds更新完成"}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计
+
+        Returns:
+            dict: entries、size_bytes、max_size_bytes、hits、misses、hit_rate 等
+        """
+        return self.cache.get_stats()
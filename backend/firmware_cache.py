@@ -0,0 +1,219 @@
+"""
+固件结果缓存
+以 LEDE 提交、各 feed 提交、未跟踪文件（files/ 覆盖层、本地软件包等）的内容和规范化后的 .config
+计算编译指纹，相同指纹的编译直接使用已有的固件
+"""
+
+import os
+import re
+import json
+import stat
+import shutil
+import hashlib
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from utils.artifact_cache import ArtifactCache
+
+
+CONFIG_SET_PATTERN = re.compile(r"^(CONFIG_[A-Za-z0-9_]+)=(.*)$")
+CONFIG_UNSET_PATTERN = re.compile(r"^# (CONFIG_[A-Za-z0-9_]+) is not set$")
+
+# 不影响固件内容的配置项（编译缓存、下载目录等由后端写入的选项）
+IGNORED_OPTIONS = re.compile(r"^CONFIG_(?:CCACHE|CCACHE_DIR|LOCALMIRROR|DOWNLOAD_FOLDER|BUILD_LOG|BUILD_LOG_DIR)$")
+
+
+def normalize_config(content: str) -> List[str]:
+    """
+    规范化 .config 内容
+
+    只保留设置和显式关闭的选项，去掉注释、空行和不影响固件的选项并排序，
+    顺序或注释不同的相同配置得到相同的结果。
+
+    Args:
+        content: .config 或 diffconfig 内容
+
+    Returns:
+        list: 规范化后的选项（"CONFIG_X=y"，显式关闭的为 "CONFIG_X=n"）
+    """
+    options = {}
+    for line in content.splitlines():
+        line = line.strip()
+        match = CONFIG_SET_PATTERN.match(line)
+        if match:
+            name, value = match.groups()
+        else:
+            match = CONFIG_UNSET_PATTERN.match(line)
+            if not match:
+                continue
+            name, value = match.group(1), "n"
+        if not IGNORED_OPTIONS.match(name):
+            options[name] = value
+    return [f"{name}={value}" for name, value in sorted(options.items())]
+
+
+def hash_files(base_dir: Path, paths: List[str]) -> str:
+    """
+    计算一组文件的内容摘要
+
+    路径、权限和内容一起计算，符号链接按链接目标计算（不跟随）。
+
+    Args:
+        base_dir: 基准目录
+        paths: 相对基准目录的文件路径
+
+    Returns:
+        str: sha256 摘要
+    """
+    base_dir = Path(base_dir)
+    digest = hashlib.sha256()
+    for relative in sorted(paths):
+        path = base_dir / relative
+        digest.update(os.fsencode(relative) + b"\0")
+        try:
+            info = path.lstat()
+        except FileNotFoundError:
+            digest.update(b"missing\0")
+            continue
+        if stat.S_ISLNK(info.st_mode):
+            digest.update(b"link:" + os.fsencode(os.readlink(path)) + b"\0")
+            continue
+        digest.update(f"{stat.S_IMODE(info.st_mode):o}:".encode('ascii'))
+        if stat.S_ISREG(info.st_mode):
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def build_fingerprint(work_dir: Path, revisions: Dict[str, Any]) -> Optional[str]:
+    """
+    计算编译指纹
+
+    Args:
+        work_dir: 源码目录
+        revisions: 源码版本 {"lede": 提交, "feeds": {feed名称: 提交},
+                   "untracked": {仓库名称: 未跟踪文件摘要}}
+
+    Returns:
+        str: sha256 指纹，没有 .config 时返回None
+    """
+    config_file = Path(work_dir) / ".config"
+    if not config_file.exists():
+        return None
+
+    content = config_file.read_text(encoding='utf-8', errors='replace')
+    payload = {
+        "lede": revisions.get("lede"),
+        "feeds": dict(sorted((revisions.get("feeds") or {}).items())),
+        "untracked": dict(sorted((revisions.get("untracked") or {}).items())),
+        "config": normalize_config(content)
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _link_or_copy(source: Path, target: Path):
+    """硬链接文件，跨文件系统时复制"""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+class FirmwareCache:
+    """按编译指纹缓存的固件"""
+
+    def __init__(self, cache_dir: Path, max_size: int, logger=None):
+        """
+        初始化固件缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_size: 大小上限（字节），超过后淘汰最久未使用的固件
+            logger: 日志记录器
+        """
+        self.cache = ArtifactCache(cache_dir, max_size, logger, name="固件缓存")
+        self.logger = logger
+
+    def _log(self, level: str, message: str):
+        """记录日志"""
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    def setup(self):
+        """创建缓存目录和索引"""
+        self.cache.setup()
+
+    def restore(self, fingerprint: str, work_dir: Path) -> Optional[Dict[str, Any]]:
+        """
+        查询指纹对应的固件，命中时放入工作区的 bin/（替换原有内容）
+
+        Args:
+            fingerprint: 编译指纹
+            work_dir: 源码目录
+
+        Returns:
+            dict: firmware_files（与编译收集的格式相同）和缓存的元数据，未命中时返回None
+        """
+        entry = self.cache.lookup(fingerprint)
+        if not entry:
+            return None
+
+        work_dir = Path(work_dir)
+        files = entry["meta"].get("firmware_files", [])
+        if not files or not all((entry["path"] / item["path"]).is_file() for item in files):
+            self._log("warning", f"固件缓存条目不完整，已删除: {fingerprint}")
+            self.cache.remove(fingerprint)
+            return None
+
+        shutil.rmtree(work_dir / "bin", ignore_errors=True)
+        firmware_files = []
+        for item in files:
+            target = work_dir / item["path"]
+            _link_or_copy(entry["path"] / item["path"], target)
+            stat = target.stat()
+            firmware_files.append({
+                "name": target.name,
+                "path": item["path"],
+                "size": stat.st_size,
+                "modified": stat.st_mtime
+            })
+
+        return {"firmware_files": firmware_files, "meta": entry["meta"]}
+
+    def save(self, fingerprint: str, work_dir: Path, firmware_files: List[Dict[str, Any]],
+             meta: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        保存编译出的固件
+
+        Args:
+            fingerprint: 编译指纹
+            work_dir: 源码目录
+            firmware_files: 收集到的固件文件（path 为相对源码目录的路径）
+            meta: 附加的元数据（任务ID、源码版本等）
+
+        Returns:
+            bool: 是否保存成功
+        """
+        if not firmware_files:
+            return False
+        work_dir = Path(work_dir)
+
+        def populate(entry_dir: Path):
+            for item in firmware_files:
+                _link_or_copy(work_dir / item["path"], entry_dir / item["path"])
+
+        entry_meta = dict(meta or {})
+        entry_meta["firmware_files"] = [{"name": item["name"], "path": item["path"]} for item in firmware_files]
+        return self.cache.store(fingerprint, populate, entry_meta)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计
+
+        Returns:
+            dict: entries、size_bytes、max_size_bytes、hits、misses、hit_rate 等
+        """
+        return self.cache.get_stats()
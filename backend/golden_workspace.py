@@ -0,0 +1,283 @@
+"""
+黄金工作区
+每个 LEDE 提交只完整克隆并更新、安装 feeds 一次，新用户的工作区从中复制（reflink 或硬链接），
+重建工作区也只需重新复制，不再重新克隆
+"""
+
+import os
+import time
+import fcntl
+import shutil
+import subprocess
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Dict, Any, Callable, List
+
+from utils.git_helper import GitHelper
+from source_mirror import branch_head
+
+
+READY_MARKER = ".golden-ready"
+
+# 硬链接模式下复制而不链接的文件：这些文件会被后端、scripts/feeds、make（scan.mk 以 > $@ 重写）
+# 或 git（FETCH_HEAD、reflog 追加）原地改写，链接会连带修改黄金工作区和其他用户的工作区。
+# 工作区根目录的文件（feeds.conf.default、.config 等）同样单独复制
+UNSHARED_DIRS = ("scripts", "tmp", "feeds/*.tmp", "staging_dir", "build_dir")
+
+# git 仓库（LEDE 和各 feed）中只有 objects/ 下的对象不会被原地修改，其余元数据单独复制
+GIT_DIRS = (".git", "feeds/*/.git")
+
+
+class GoldenWorkspaces:
+    """
+    按 LEDE 提交保存的黄金工作区
+
+    目录结构:
+
+        <黄金工作区目录>/
+            <提交前12位>[-istore]/lede    克隆并安装好 feeds 的源码
+            <...>.building/               构建中的工作区
+            .lock                         构建锁（多个仓库管理器实例和进程共用）
+    """
+
+    COPY_MODES = ("auto", "reflink", "hardlink", "copy")
+
+    def __init__(self, golden_dir: Path, repo_url: str, branch: str,
+                 builder: Callable[[Path, bool], Dict[str, Any]], copy_mode: str = "auto",
+                 keep: int = 2, source_mirrors=None, logger=None):
+        """
+        初始化黄金工作区
+
+        Args:
+            golden_dir: 黄金工作区目录（需与用户工作区位于同一文件系统才能使用 reflink 或硬链接）
+            repo_url: LEDE 仓库地址
+            branch: LEDE 分支
+            builder: 在指定目录克隆源码并更新、安装 feeds 的函数，参数为 (目录, 是否启用iStore)，返回操作结果
+            copy_mode: auto（支持 reflink 时使用 reflink，否则硬链接）、reflink、hardlink 或 copy
+            keep: 每种配置（是否启用iStore）保留的黄金工作区数
+            source_mirrors: 本地源码镜像，用于确定分支的最新提交
+            logger: 日志记录器
+        """
+        if copy_mode not in self.COPY_MODES:
+            raise ValueError(f"不支持的复制方式: {copy_mode}")
+
+        self.golden_dir = Path(golden_dir)
+        self.repo_url = repo_url
+        self.branch = branch
+        self.builder = builder
+        self.copy_mode = copy_mode
+        self.keep = max(1, keep)
+        self.source_mirrors = source_mirrors
+        self.logger = logger
+        self.git_helper = GitHelper(logger)
+
+        self._reflink_supported: Optional[bool] = None
+
+    def _log(self, level: str, message: str):
+        """记录日志"""
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    def setup(self):
+        """创建目录，清理上次中断的构建"""
+        self.golden_dir.mkdir(parents=True, exist_ok=True)
+        with self._build_lock():
+            for building in self.golden_dir.glob("*.building"):
+                shutil.rmtree(building, ignore_errors=True)
+
+    @contextmanager
+    def _build_lock(self):
+        """构建锁（文件锁，多个仓库管理器实例和进程同一时间只构建一个黄金工作区）"""
+        fd = os.open(self.golden_dir / ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def current_revision(self) -> Optional[str]:
+        """
+        LEDE 分支的最新提交（有本地镜像时读取镜像，否则查询上游）
+
+        Returns:
+            str: 提交哈希，无法确定时返回None
+        """
+        return branch_head(self.repo_url, self.branch, self.source_mirrors, self.logger)
+
+    def _golden_path(self, revision: str, enable_istore: bool) -> Path:
+        return self.golden_dir / (revision[:12] + ("-istore" if enable_istore else ""))
+
+    def _ready(self, path: Path) -> bool:
+        return (path / READY_MARKER).exists()
+
+    def ensure(self, enable_istore: bool = True) -> Optional[Path]:
+        """
+        确保最新提交的黄金工作区存在，不存在时构建
+
+        Args:
+            enable_istore: 是否启用iStore
+
+        Returns:
+            Path: 黄金工作区中的源码目录，构建失败时返回None
+        """
+        revision = self.current_revision()
+        if revision and self._ready(self._golden_path(revision, enable_istore)):
+            return self._golden_path(revision, enable_istore) / "lede"
+
+        with self._build_lock():
+            # 等待锁期间其他实例可能已经构建完成
+            if revision and self._ready(self._golden_path(revision, enable_istore)):
+                return self._golden_path(revision, enable_istore) / "lede"
+            return self._build(revision, enable_istore)
+
+    def _build(self, revision: Optional[str], enable_istore: bool) -> Optional[Path]:
+        """构建黄金工作区（调用方持有构建锁）"""
+        building = self.golden_dir / f"{int(time.time())}.building"
+        shutil.rmtree(building, ignore_errors=True)
+        building.mkdir(parents=True)
+
+        self._log("info", f"开始构建黄金工作区 (提交: {(revision or 'unknown')[:12]})")
+        try:
+            result = self.builder(building / "lede", enable_istore)
+            head = self.git_helper.get_head_commit(building / "lede") if result.get("success") else None
+        except Exception as e:
+            result, head = {"success": False, "message": str(e)}, None
+
+        if not head:
+            shutil.rmtree(building, ignore_errors=True)
+            self._log("error", f"构建黄金工作区失败: {result.get('message')}")
+            return None
+
+        # 以实际克隆到的提交命名（构建期间上游可能有新提交）
+        target = self._golden_path(head, enable_istore)
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(building, target)
+        (target / READY_MARKER).touch()
+        self._log("info", f"黄金工作区已就绪: {target}")
+
+        self.prune()
+        return target / "lede"
+
+    def _supports_reflink(self) -> bool:
+        """黄金工作区所在文件系统是否支持 reflink（btrfs、XFS 等）"""
+        if self._reflink_supported is None:
+            probe = self.golden_dir / ".reflink-probe"
+            probe.write_bytes(b"probe")
+            try:
+                result = subprocess.run(["cp", "--reflink=always", str(probe), f"{probe}.copy"],
+                                        capture_output=True, timeout=30)
+                self._reflink_supported = result.returncode == 0
+            except (OSError, subprocess.SubprocessError):
+                self._reflink_supported = False
+            finally:
+                for path in (probe, Path(f"{probe}.copy")):
+                    if path.exists():
+                        path.unlink()
+        return self._reflink_supported
+
+    def _copy_tree(self, source: Path, target: Path) -> str:
+        """复制黄金工作区，返回实际使用的方式"""
+        mode = self.copy_mode
+        if mode == "auto":
+            mode = "reflink" if self._supports_reflink() else "hardlink"
+
+        option = {"reflink": "--reflink=always", "hardlink": "--link", "copy": None}[mode]
+        command = ["cp", "-a"] + ([option] if option else []) + [str(source), str(target)]
+        subprocess.run(command, check=True, capture_output=True, timeout=3600)
+
+        if mode == "hardlink":
+            self._unshare(target)
+        return mode
+
+    @staticmethod
+    def _unshare(work_dir: Path):
+        """把会被原地改写的文件换成独立的副本"""
+        def regular_files(paths):
+            return [path for path in paths if path.is_file() and not path.is_symlink()]
+
+        files: List[Path] = regular_files(work_dir.iterdir())
+        for pattern in UNSHARED_DIRS:
+            for directory in work_dir.glob(pattern):
+                if directory.is_dir() and not directory.is_symlink():
+                    files += regular_files(directory.rglob("*"))
+        for pattern in GIT_DIRS:
+            for git_dir in work_dir.glob(pattern):
+                if git_dir.is_dir():
+                    files += [path for path in regular_files(git_dir.rglob("*"))
+                              if path.relative_to(git_dir).parts[0] != "objects"]
+
+        for path in files:
+            tmp = path.with_name(f".{path.name}.unshare")
+            shutil.copy2(path, tmp)
+            os.replace(tmp, path)
+
+    def provision(self, work_dir: Path, enable_istore: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        从最新的黄金工作区创建用户工作区
+
+        Args:
+            work_dir: 用户源码目录（不能已存在）
+            enable_istore: 是否启用iStore
+
+        Returns:
+            dict: revision（提交）、mode（复制方式）、seconds（耗时），没有可用的黄金工作区或复制失败时返回None
+        """
+        golden = self.ensure(enable_istore)
+        if golden is None:
+            return None
+
+        work_dir = Path(work_dir)
+        work_dir.parent.mkdir(parents=True, exist_ok=True)
+        start = time.time()
+        try:
+            mode = self._copy_tree(golden, work_dir)
+        except (OSError, subprocess.SubprocessError) as e:
+            self._log("error", f"从黄金工作区复制失败: {e}")
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return None
+
+        revision = self.git_helper.get_head_commit(work_dir)
+        seconds = round(time.time() - start, 1)
+        self._log("info", f"已从黄金工作区创建 {work_dir} ({mode}, {seconds}s)")
+        return {"revision": revision, "mode": mode, "seconds": seconds}
+
+    def prune(self) -> int:
+        """
+        删除较旧的黄金工作区（已复制出的用户工作区不受影响）
+
+        Returns:
+            int: 删除的黄金工作区数
+        """
+        removed = 0
+        for istore in (False, True):
+            ready = [path for path in self.golden_dir.iterdir()
+                     if path.is_dir() and path.name.endswith("-istore") == istore and self._ready(path)]
+            ready.sort(key=lambda path: (path / READY_MARKER).stat().st_mtime, reverse=True)
+            for path in ready[self.keep:]:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        获取黄金工作区状态
+
+        Returns:
+            dict: golden_dir、copy_mode 和各黄金工作区的 revision、istore、created_at
+        """
+        workspaces = []
+        for path in sorted(self.golden_dir.iterdir()):
+            if not path.is_dir() or not self._ready(path):
+                continue
+            workspaces.append({
+                "revision": self.git_helper.get_head_commit(path / "lede"),
+                "istore": path.name.endswith("-istore"),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S",
+                                            time.localtime((path / READY_MARKER).stat().st_mtime))
+            })
+        return {
+            "golden_dir": str(self.golden_dir),
+            "copy_mode": self.copy_mode,
+            "reflink_supported": self._reflink_supported,
+            "workspaces": workspaces
+        }
@@ -181,6 +181,64 @@ class RepositoryController:
             self.logger.error(error_msg)
             return error_response(error_msg, 500)
     
+    def get_mirror_status(self) -> Dict[str, Any]:
+        """获取本地源码镜像状态（管理员功能）"""
+        try:
+            source_mirrors = self.repository_manager.source_mirrors
+            if not source_mirrors:
+                return error_response("未启用本地源码镜像", 400)
+
+            return success_response(source_mirrors.get_status(), "源码镜像状态获取成功")
+
+        except Exception as e:
+            error_msg = f"获取源码镜像状态时发生错误: {e}"
+            self.logger.error(error_msg)
+            return error_response(error_msg, 500)
+
+    def refresh_mirrors(self) -> Dict[str, Any]:
+        """立即在后台更新所有本地源码镜像（管理员功能）"""
+        try:
+            source_mirrors = self.repository_manager.source_mirrors
+            if not source_mirrors:
+                return error_response("未启用本地源码镜像", 400)
+
+            threading.Thread(target=source_mirrors.refresh_all, name="source-mirror-refresh",
+                             daemon=True).start()
+            return success_response({"mirror_dir": str(source_mirrors.mirror_dir)}, "源码镜像更新已开始")
+
+        except Exception as e:
+            error_msg = f"更新源码镜像时发生错误: {e}"
+            self.logger.error(error_msg)
+            return error_response(error_msg, 500)
+
+    def get_golden_status(self) -> Dict[str, Any]:
+        """获取黄金工作区状态（管理员功能）"""
+        try:
+            golden_workspaces = self.repository_manager.golden_workspaces
+            if not golden_workspaces:
+                return error_response("未启用黄金工作区", 400)
+
+            return success_response(golden_workspaces.get_status(), "黄金工作区状态获取成功")
+
+        except Exception as e:
+            error_msg = f"获取黄金工作区状态时发生错误: {e}"
+            self.logger.error(error_msg)
+            return error_response(error_msg, 500)
+
+    def get_pool_status(self) -> Dict[str, Any]:
+        """获取预热工作区池状态（管理员功能）"""
+        try:
+            workspace_pool = self.repository_manager.workspace_pool
+            if not workspace_pool:
+                return error_response("未启用预热工作区", 400)
+
+            return success_response(workspace_pool.get_status(), "预热工作区状态获取成功")
+
+        except Exception as e:
+            error_msg = f"获取预热工作区状态时发生错误: {e}"
+            self.logger.error(error_msg)
+            return error_response(error_msg, 500)
+
     def cancel_operation(self, username: str) -> Dict[str, Any]:
         """取消当前操作"""
         try:
@@ -270,6 +328,42 @@ def create_repository_blueprint(repository_controller, user_manager):
         
         return repository_controller.get_all_repository_status()
     
+    @bp.route('/mirrors', methods=['GET'])
+    @require_auth
+    def get_mirror_status(username):
+        """获取本地源码镜像状态（管理员功能）"""
+        if not user_manager.is_admin(username):
+            return error_response("需要管理员权限", 403)
+
+        return repository_controller.get_mirror_status()
+
+    @bp.route('/mirrors/refresh', methods=['POST'])
+    @require_auth
+    def refresh_mirrors(username):
+        """立即更新本地源码镜像（管理员功能）"""
+        if not user_manager.is_admin(username):
+            return error_response("需要管理员权限", 403)
+
+        return repository_controller.refresh_mirrors()
+
+    @bp.route('/golden', methods=['GET'])
+    @require_auth
+    def get_golden_status(username):
+        """获取黄金工作区状态（管理员功能）"""
+        if not user_manager.is_admin(username):
+            return error_response("需要管理员权限", 403)
+
+        return repository_controller.get_golden_status()
+
+    @bp.route('/pool', methods=['GET'])
+    @require_auth
+    def get_pool_status(username):
+        """获取预热工作区池状态（管理员功能）"""
+        if not user_manager.is_admin(username):
+            return error_response("需要管理员权限", 403)
+
+        return repository_controller.get_pool_status()
+
     @bp.route('/cancel', methods=['POST'])
     @require_auth
     def cancel_operation(username):
@@ -4,7 +4,11 @@ Git仓库管理器
 """
 
 import os
+import shlex
+import time
 import shutil
+import sqlite3
+import threading
 import subprocess
 from pathlib import Path
 from typing import Dict, List, Optional, Any, Callable
@@ -12,6 +16,9 @@ from enum import Enum
 
 from utils.logger import setup_logger
 from utils.process_manager import ProcessManager, ProcessStatus
+from golden_workspace import GoldenWorkspaces
+from feeds_cache import FeedsCache, update_and_install_feeds
+from source_mirror import branch_head
 
 
 class RepositoryStatus(Enum):
@@ -26,18 +33,59 @@ class RepositoryStatus(Enum):
 class RepositoryManager:
     """Git仓库管理器"""
     
-    def __init__(self, config, logger=None, websocket_handler=None):
+    def __init__(self, config, logger=None, websocket_handler=None, source_mirrors=None):
         self.config = config
         self.logger = logger or setup_logger(__name__)
         self.websocket_handler = websocket_handler
-        self.process_manager = ProcessManager(logger)
+        self.process_manager = ProcessManager(
+            logger, io_backend=getattr(config, 'PROCESS_IO_BACKEND', 'reactor')
+        )
         
         # 仓库配置
         self.lede_repo_url = config.LEDE_REPO_URL
         self.lede_branch = config.LEDE_BRANCH
         self.istore_repo_url = config.ISTORE_REPO_URL
         self.istore_branch = config.ISTORE_BRANCH
+
+        # 本地源码镜像（SourceMirrors），克隆、拉取和 feeds 更新从镜像获取
+        self.source_mirrors = source_mirrors
+
+        # feeds 缓存：各 feed 提交组合相同的工作区直接恢复 feeds 索引和安装结果
+        self.feeds_cache = None
+        if getattr(config, 'FEEDS_CACHE', False):
+            try:
+                feeds_cache = FeedsCache(
+                    getattr(config, 'FEEDS_CACHE_DIR', Path(config.WORKSPACE_DIR) / "feeds_cache"),
+                    getattr(config, 'FEEDS_CACHE_MAX_SIZE', 5 * 1024 ** 3),
+                    self.logger
+                )
+                feeds_cache.setup()
+                self.feeds_cache = feeds_cache
+            except (OSError, sqlite3.Error) as e:
+                self.logger.warning(f"创建feeds缓存失败，每个工作区单独生成 feeds 索引: {e}")
+
+        # 黄金工作区：每个 LEDE 提交只克隆并安装 feeds 一次，用户工作区从中复制
+        self.golden_workspaces = None
+        if getattr(config, 'GOLDEN_WORKSPACE', False):
+            try:
+                golden_workspaces = GoldenWorkspaces(
+                    getattr(config, 'GOLDEN_WORKSPACE_DIR', Path(config.WORKSPACE_DIR) / "golden"),
+                    self.lede_repo_url,
+                    self.lede_branch,
+                    self._build_workspace,
+                    copy_mode=getattr(config, 'GOLDEN_WORKSPACE_COPY_MODE', 'auto'),
+                    keep=getattr(config, 'GOLDEN_WORKSPACE_KEEP', 2),
+                    source_mirrors=source_mirrors,
+                    logger=self.logger
+                )
+                golden_workspaces.setup()
+                self.golden_workspaces = golden_workspaces
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"创建黄金工作区失败，用户工作区单独克隆: {e}")
         
+        # 预热工作区池（WorkspacePool，由应用创建后设置），新用户第一次克隆时直接移交
+        self.workspace_pool = None
+
         # 状态跟踪
         self.status = RepositoryStatus.NOT_CLONED
         self.current_operation = None
@@ -60,7 +108,7 @@ class RepositoryManager:
             if work_dir.exists():
                 if force_rebuild:
                     self.logger.info("强制重建，删除现有仓库")
-                    shutil.rmtree(work_dir, ignore_errors=True)
+                    self._discard_workspace(work_dir)
                 else:
                     # 检查是否为有效的git仓库
                     if self._is_valid_git_repo(work_dir):
@@ -78,6 +126,36 @@ class RepositoryManager:
             
             # 确保父目录存在
             work_dir.parent.mkdir(parents=True, exist_ok=True)
+
+            # 优先使用预热好的工作区（已安装 feeds 并下载了源码包）
+            if self.workspace_pool and username:
+                pooled = self.workspace_pool.take(work_dir, enable_istore)
+                if pooled:
+                    self.status = RepositoryStatus.READY
+                    self.current_operation = None
+                    return {
+                        "success": True,
+                        "message": "仓库已从预热工作区创建",
+                        "path": str(work_dir),
+                        "status": "ready",
+                        "istore_enabled": enable_istore,
+                        "pooled": pooled
+                    }
+
+            # 从黄金工作区复制（已更新并安装 feeds），失败时照常克隆
+            if self.golden_workspaces:
+                provisioned = self.golden_workspaces.provision(work_dir, enable_istore)
+                if provisioned:
+                    self.status = RepositoryStatus.READY
+                    self.current_operation = None
+                    return {
+                        "success": True,
+                        "message": "仓库已从黄金工作区创建",
+                        "path": str(work_dir),
+                        "status": "ready",
+                        "istore_enabled": enable_istore,
+                        "provisioned": provisioned
+                    }
             
             # 克隆仓库
             clone_result = self._execute_git_clone(work_dir, progress_callback)
@@ -121,11 +199,87 @@ class RepositoryManager:
                 "status": "error"
             }
     
+    def _discard_workspace(self, work_dir: Path):
+        """
+        删除工作区：先改名再在后台删除，编译产物很大时重建不必等待删除完成
+
+        Args:
+            work_dir: 源码目录
+        """
+        trash = work_dir.with_name(f".{work_dir.name}.trash-{time.time_ns()}")
+        try:
+            os.rename(work_dir, trash)
+        except OSError:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return
+        threading.Thread(target=shutil.rmtree, args=(trash,), kwargs={"ignore_errors": True},
+                         name="workspace-discard", daemon=True).start()
+
+    def _build_workspace(self, work_dir: Path, enable_istore: bool) -> Dict[str, Any]:
+        """
+        克隆源码并更新、安装 feeds（黄金工作区和没有黄金工作区时的预热工作区）
+
+        Args:
+            work_dir: 源码目录
+            enable_istore: 是否启用iStore
+
+        Returns:
+            dict: 操作结果
+        """
+        clone_result = self._execute_git_clone(work_dir)
+        if not clone_result["success"]:
+            return clone_result
+
+        if enable_istore:
+            istore_result = self._integrate_istore(work_dir)
+            if not istore_result["success"]:
+                return istore_result
+
+        return self._update_feeds(work_dir, enable_istore)
+
+    def current_revision(self) -> Optional[str]:
+        """
+        LEDE 分支的最新提交（有本地镜像时读取镜像，否则查询上游）
+
+        Returns:
+            str: 提交哈希，无法确定时返回None
+        """
+        if self.golden_workspaces:
+            return self.golden_workspaces.current_revision()
+        return branch_head(self.lede_repo_url, self.lede_branch, self.source_mirrors, self.logger)
+
+    def provision_workspace(self, work_dir: Path, enable_istore: bool = True) -> Dict[str, Any]:
+        """
+        准备一个已安装 feeds 的工作区（启用黄金工作区时从中复制，否则克隆并更新 feeds）
+
+        Args:
+            work_dir: 源码目录（不能已存在）
+            enable_istore: 是否启用iStore
+
+        Returns:
+            dict: 操作结果
+        """
+        if self.golden_workspaces:
+            provisioned = self.golden_workspaces.provision(work_dir, enable_istore)
+            if provisioned:
+                return {"success": True, "message": "工作区已从黄金工作区创建", "provisioned": provisioned}
+
+        work_dir.parent.mkdir(parents=True, exist_ok=True)
+        return self._build_workspace(work_dir, enable_istore)
+
     def _execute_git_clone(self, work_dir: Path, progress_callback: Callable = None) -> Dict[str, Any]:
         """执行git克隆"""
         try:
-            # 使用git clone命令
-            cmd = f"git clone --depth 1 --branch {self.lede_branch} {self.lede_repo_url} {work_dir.name}"
+            # 有本地镜像时通过 alternates 共享镜像的对象库，不访问网络
+            mirror = None
+            if self.source_mirrors:
+                mirror = self.source_mirrors.ensure(self.lede_repo_url, max_age=self.source_mirrors.max_age)
+
+            if mirror:
+                cmd = (f"git clone --shared --branch {self.lede_branch} "
+                       f"{shlex.quote(str(mirror))} {work_dir.name}")
+            else:
+                cmd = f"git clone --depth 1 --branch {self.lede_branch} {self.lede_repo_url} {work_dir.name}"
             
             def output_callback(process_id, line):
                 if progress_callback:
@@ -150,9 +304,8 @@ class RepositoryManager:
             
             # 等待克隆完成
             while True:
-                status = self.process_manager.get_process_status(process_id)
-                if status in [ProcessStatus.COMPLETED, ProcessStatus.FAILED, 
-                             ProcessStatus.CANCELLED, ProcessStatus.TIMEOUT]:
+                status = self.process_manager.wait_process(process_id, timeout=2)
+                if status is not None:
                     break
                 
                 # 发送心跳
@@ -161,11 +314,13 @@ class RepositoryManager:
                         'status': 'cloning',
                         'timestamp': str(Path().ctime())
                     })
-                
-                import time
-                time.sleep(2)
+
+            # 同一进程ID在构建黄金工作区和之后的克隆中会再次使用
+            self.process_manager.cleanup_process(process_id)
             
             if status == ProcessStatus.COMPLETED:
+                if mirror:
+                    self.source_mirrors.attach(work_dir, self.lede_repo_url)
                 self.logger.info("Git克隆完成")
                 return {"success": True, "message": "Git克隆完成"}
             else:
@@ -220,55 +375,66 @@ class RepositoryManager:
             if progress_callback:
                 progress_callback("feeds", "正在更新feeds...")
             
-            def output_callback(process_id, line):
-                if progress_callback:
-                    progress_callback("feeds", line)
-                if self.websocket_handler:
-                    self.websocket_handler.broadcast_message('feeds_progress', {
-                        'message': line,
-                        'stage': 'feeds'
-                    })
-            
-            # 执行feeds更新命令
-            commands = [
-                "./scripts/feeds update -a",
-                "./scripts/feeds install -a"
-            ]
+            # 有本地镜像时 feed 从镜像克隆和更新
+            env = self.source_mirrors.feed_env(work_dir) if self.source_mirrors else None
             
-            if enable_istore:
-                commands.extend([
-                    "./scripts/feeds update istore",
-                    "./scripts/feeds install -d y -p istore luci-app-store"
-                ])
-            
-            for i, command in enumerate(commands):
-                process_id = f"feeds_update_{i}"
+            def run_command(command: str, feed: Optional[str] = None) -> bool:
+                # 各 feed 的命令并发执行，输出按 feed 标记；进程ID带上工作区名称，多个工作区可同时更新
+                process_id = f"feeds_update_{work_dir.parent.name}" + (f"_{feed}" if feed else "")
+                
+                def output_callback(process_id, line):
+                    if progress_callback:
+                        progress_callback("feeds", f"[{feed}] {line}" if feed else line)
+                    if self.websocket_handler:
+                        self.websocket_handler.broadcast_message('feeds_progress', {
+                            'message': line,
+                            'stage': 'feeds',
+                            'feed': feed
+                        })
+                
                 self.logger.info(f"执行命令: {command}")
                 
                 success = self.process_manager.start_process(
                     process_id=process_id,
                     command=command,
                     cwd=work_dir,
+                    env=env,
                     output_callback=output_callback,
                     timeout=1800  # 30分钟超时
                 )
                 
                 if not success:
-                    return {"success": False, "message": f"启动命令失败: {command}"}
+                    self.logger.error(f"启动命令失败: {command}")
+                    return False
                 
                 # 等待命令完成
-                while True:
-                    status = self.process_manager.get_process_status(process_id)
-                    if status in [ProcessStatus.COMPLETED, ProcessStatus.FAILED, 
-                                 ProcessStatus.CANCELLED, ProcessStatus.TIMEOUT]:
-                        break
-                    import time
-                    time.sleep(1)
+                status = self.process_manager.wait_process(process_id)
+                self.process_manager.cleanup_process(process_id)
                 
                 if status != ProcessStatus.COMPLETED:
-                    error_msg = f"命令执行失败: {command}, 状态: {status.value}"
-                    self.logger.error(error_msg)
-                    return {"success": False, "message": error_msg}
+                    self.logger.error(f"命令执行失败: {command}, 状态: {status.value}")
+                    return False
+                return True
+            
+            install_commands = ["./scripts/feeds install -a"]
+            if enable_istore:
+                install_commands.append("./scripts/feeds install -d y -p istore luci-app-store")
+            workers = getattr(self.config, 'FEEDS_UPDATE_WORKERS', 4)
+            
+            # 各 feed 提交组合相同时直接恢复缓存的索引和安装结果
+            result = None
+            if self.feeds_cache:
+                result = self.feeds_cache.update_feeds(work_dir, run_command, install_commands, workers)
+            if result is None:
+                result = update_and_install_feeds(work_dir, run_command, install_commands, workers)
+            
+            if not result["success"]:
+                self.logger.error(result["message"])
+                return {"success": False, "message": result["message"]}
+            
+            if result.get("cached"):
+                self.logger.info("Feeds更新完成（使用缓存）")
+                return {"success": True, "message": "Feeds更新完成", "cached": True}
             
             self.logger.info("Feeds更新完成")
             return {"success": True, "message": "Feeds更新完成"}
@@ -340,6 +506,11 @@ class RepositoryManager:
     def _execute_git_pull(self, work_dir: Path, progress_callback: Callable = None) -> Dict[str, Any]:
         """执行git pull"""
         try:
+            # 有本地镜像时先按需更新镜像，origin 通过 insteadOf 指向镜像（之前直接克隆的工作区也改为使用镜像）
+            if self.source_mirrors and self.source_mirrors.ensure(self.lede_repo_url,
+                                                                  max_age=self.source_mirrors.max_age):
+                self.source_mirrors.attach(work_dir, self.lede_repo_url)
+
             cmd = "git pull origin " + self.lede_branch
             
             def output_callback(process_id, line):
@@ -364,13 +535,8 @@ class RepositoryManager:
                 return {"success": False, "message": "启动git pull进程失败"}
             
             # 等待更新完成
-            while True:
-                status = self.process_manager.get_process_status(process_id)
-                if status in [ProcessStatus.COMPLETED, ProcessStatus.FAILED, 
-                             ProcessStatus.CANCELLED, ProcessStatus.TIMEOUT]:
-                    break
-                import time
-                time.sleep(1)
+            status = self.process_manager.wait_process(process_id)
+            self.process_manager.cleanup_process(process_id)
             
             if status == ProcessStatus.COMPLETED:
                 self.logger.info("Git更新完成")
@@ -387,7 +553,7 @@ class RepositoryManager:
     
     def rebuild_repository(self, username: str = None, enable_istore: bool = True, 
                           progress_callback: Callable = None) -> Dict[str, Any]:
-        """重构仓库（完全重新克隆）"""
+        """重构仓库（启用黄金工作区时重新复制最新的黄金工作区，否则完全重新克隆）"""
         return self.clone_repository(username, force_rebuild=True, 
                                    enable_istore=enable_istore, 
                                    progress_callback=progress_callback)
@@ -0,0 +1,359 @@
+"""
+源码镜像
+在本地维护 LEDE、iStore 和 feeds.conf.default 中各 feed 的裸仓库镜像并定时更新；
+用户工作区通过 alternates 共享镜像的对象库，克隆、拉取和 feeds 更新都从本地镜像获取，不再各自访问网络
+"""
+
+import os
+import re
+import time
+import shutil
+import hashlib
+import threading
+import subprocess
+from pathlib import Path
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Iterable
+
+
+FEED_LINE_PATTERN = re.compile(r"^\s*src-git(?:-full)?\s+(\S+)\s+([^\s;^]+)", re.MULTILINE)
+
+# 镜像只保存分支和标签（不包括 GitHub 的 refs/pull/* 等）
+MIRROR_REFSPECS = ("+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*")
+
+STAMP_FILE = "mirror-refreshed"
+
+
+def parse_feed_urls(content: str) -> Dict[str, str]:
+    """
+    解析 feeds.conf 中 git 类型 feed 的地址
+
+    Args:
+        content: feeds.conf 内容
+
+    Returns:
+        dict: feed名称 -> 仓库地址（去掉 ;分支 和 ^提交 部分）
+    """
+    return {name: url for name, url in FEED_LINE_PATTERN.findall(content)}
+
+
+def branch_head(url: str, branch: str, source_mirrors=None, logger=None) -> Optional[str]:
+    """
+    分支的最新提交（有本地镜像时读取镜像，否则查询上游）
+
+    Args:
+        url: 仓库地址
+        branch: 分支
+        source_mirrors: 本地源码镜像（SourceMirrors），为空时直接查询上游
+        logger: 日志记录器
+
+    Returns:
+        str: 提交哈希，无法确定时返回None
+    """
+    if source_mirrors:
+        mirror = source_mirrors.ensure(url, max_age=source_mirrors.max_age)
+        if mirror:
+            result = subprocess.run(["git", "--git-dir", str(mirror), "rev-parse", f"refs/heads/{branch}"],
+                                    capture_output=True, text=True, timeout=30)
+            if result.returncode == 0:
+                return result.stdout.strip()
+
+    try:
+        result = subprocess.run(["git", "ls-remote", url, f"refs/heads/{branch}"],
+                                capture_output=True, text=True, timeout=120)
+    except (OSError, subprocess.SubprocessError) as e:
+        if logger:
+            logger.warning(f"查询 {url} 最新提交失败: {e}")
+        return None
+    output = result.stdout.split()
+    return output[0] if result.returncode == 0 and output else None
+
+
+class SourceMirrors:
+    """
+    本地裸仓库镜像
+
+    目录结构:
+
+        <镜像目录>/<仓库名>-<地址摘要>.git    裸仓库（origin 指向上游地址）
+
+    镜像关闭了自动 gc 和不可达对象清理：用户工作区通过 alternates 引用镜像中的对象，
+    上游强制推送后旧对象仍可能被工作区使用，删除会损坏工作区。
+    """
+
+    def __init__(self, mirror_dir: Path, lede_repo_url: str, lede_branch: str,
+                 extra_urls: Iterable[str] = (), refresh_interval: float = 3600,
+                 max_age: float = 300, logger=None):
+        """
+        初始化源码镜像
+
+        Args:
+            mirror_dir: 镜像目录（需与用户工作区位于同一文件系统，feed 克隆才能使用硬链接）
+            lede_repo_url: LEDE 仓库地址，其 feeds.conf.default 中的 feed 一并镜像
+            lede_branch: LEDE 分支
+            extra_urls: 额外镜像的仓库地址（例如 iStore）
+            refresh_interval: 定时更新间隔（秒）
+            max_age: 克隆、拉取和 feeds 更新前镜像超过该时间（秒）未更新时先更新
+            logger: 日志记录器
+        """
+        self.mirror_dir = Path(mirror_dir)
+        self.lede_repo_url = lede_repo_url
+        self.lede_branch = lede_branch
+        self.extra_urls = list(extra_urls)
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.logger = logger
+
+        self._lock = threading.Lock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+        self._errors: Dict[str, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _log(self, level: str, message: str):
+        """记录日志"""
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    def setup(self):
+        """创建镜像目录，清理上次未完成的克隆"""
+        self.mirror_dir.mkdir(parents=True, exist_ok=True)
+        for tmp in self.mirror_dir.glob("*.git.tmp"):
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def start(self):
+        """启动定时更新线程（首次立即建立并更新所有镜像）"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="source-mirror", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止定时更新线程"""
+        self._stop.set()
+
+    def _loop(self):
+        while True:
+            try:
+                self.refresh_all()
+            except Exception as e:
+                self._log("error", f"更新源码镜像失败: {e}")
+            if self._stop.wait(self.refresh_interval):
+                break
+
+    @staticmethod
+    def _git(args: List[str], timeout: float = 3600) -> str:
+        result = subprocess.run(["git"] + args, capture_output=True, text=True, timeout=timeout)
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, args, result.stdout, result.stderr)
+        return result.stdout
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def mirror_path(self, url: str) -> Path:
+        """
+        仓库地址对应的镜像目录
+
+        Args:
+            url: 仓库地址
+
+        Returns:
+            Path: 例如 <镜像目录>/lede-1a2b3c4d.git
+        """
+        name = url.rstrip("/").rsplit("/", 1)[-1]
+        if name.endswith(".git"):
+            name = name[:-4]
+        name = re.sub(r"[^A-Za-z0-9._-]", "_", name) or "repo"
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()[:8]
+        return self.mirror_dir / f"{name}-{digest}.git"
+
+    def _last_refresh(self, mirror: Path) -> Optional[float]:
+        try:
+            return (mirror / STAMP_FILE).stat().st_mtime
+        except OSError:
+            return None
+
+    def _touch(self, mirror: Path):
+        (mirror / STAMP_FILE).touch()
+
+    def ensure(self, url: str, max_age: Optional[float] = None) -> Optional[Path]:
+        """
+        确保仓库的镜像存在，不存在时从上游克隆
+
+        Args:
+            url: 仓库地址
+            max_age: 镜像超过该时间（秒）未更新时先更新，None 表示不检查
+
+        Returns:
+            Path: 镜像目录，克隆失败时返回None（调用方改为直接访问上游）
+        """
+        mirror = self.mirror_path(url)
+        with self._url_lock(url):
+            if not (mirror / "HEAD").exists():
+                return self._clone(url, mirror)
+
+            last = self._last_refresh(mirror)
+            if max_age is not None and (last is None or time.time() - last > max_age):
+                self._fetch(url, mirror)
+            return mirror
+
+    def _clone(self, url: str, mirror: Path) -> Optional[Path]:
+        """建立镜像（调用方持有该地址的锁）"""
+        tmp = mirror.with_name(mirror.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        self._log("info", f"建立源码镜像: {url}")
+        try:
+            self._git(["clone", "--bare", "--quiet", url, str(tmp)])
+            git_dir = ["--git-dir", str(tmp)]
+            # 裸克隆不设置 fetch 规则，之后的 fetch 需要按规则更新分支和标签
+            self._git(git_dir + ["config", "remote.origin.fetch", MIRROR_REFSPECS[0]])
+            for refspec in MIRROR_REFSPECS[1:]:
+                self._git(git_dir + ["config", "--add", "remote.origin.fetch", refspec])
+            self._git(git_dir + ["config", "gc.auto", "0"])
+            self._git(git_dir + ["config", "gc.pruneExpire", "never"])
+            os.replace(tmp, mirror)
+        except (OSError, subprocess.SubprocessError) as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            self._errors[url] = str(getattr(e, "stderr", None) or e).strip()
+            self._log("error", f"建立源码镜像失败 {url}: {self._errors[url]}")
+            return None
+
+        self._touch(mirror)
+        self._errors.pop(url, None)
+        return mirror
+
+    def _fetch(self, url: str, mirror: Path) -> bool:
+        """从上游更新镜像（调用方持有该地址的锁）"""
+        try:
+            self._git(["--git-dir", str(mirror), "fetch", "--quiet", "--prune", "origin"])
+        except (OSError, subprocess.SubprocessError) as e:
+            # 更新失败时继续使用镜像中已有的内容
+            self._errors[url] = str(getattr(e, "stderr", None) or e).strip()
+            self._log("warning", f"更新源码镜像失败 {url}: {self._errors[url]}")
+            return False
+
+        self._touch(mirror)
+        self._errors.pop(url, None)
+        return True
+
+    def refresh(self, url: str) -> bool:
+        """
+        立即从上游更新镜像（不存在时建立）
+
+        Args:
+            url: 仓库地址
+
+        Returns:
+            bool: 是否成功
+        """
+        return self.ensure(url, max_age=0) is not None and url not in self._errors
+
+    def mirrored_urls(self) -> List[str]:
+        """已建立镜像的仓库地址"""
+        urls = []
+        for mirror in sorted(self.mirror_dir.glob("*.git")):
+            try:
+                url = self._git(["--git-dir", str(mirror), "config", "--get", "remote.origin.url"], timeout=10)
+            except (OSError, subprocess.SubprocessError):
+                continue
+            urls.append(url.strip())
+        return urls
+
+    def _lede_feed_urls(self) -> List[str]:
+        """LEDE 镜像中 feeds.conf.default 列出的 feed 地址"""
+        mirror = self.mirror_path(self.lede_repo_url)
+        try:
+            content = self._git(["--git-dir", str(mirror), "show", f"{self.lede_branch}:feeds.conf.default"],
+                                timeout=30)
+        except (OSError, subprocess.SubprocessError):
+            return []
+        return list(parse_feed_urls(content).values())
+
+    def refresh_all(self) -> Dict[str, Any]:
+        """
+        更新所有镜像：先更新 LEDE 和额外的仓库，再按 LEDE 最新的 feeds.conf.default 建立或更新 feed 镜像，
+        最后更新其他已有的镜像（用户工作区自定义的 feed）
+
+        Returns:
+            dict: refreshed（成功的地址数）、failed（失败的地址列表）
+        """
+        results: Dict[str, bool] = {}
+        for url in [self.lede_repo_url] + self.extra_urls:
+            results[url] = self.refresh(url)
+        for url in self._lede_feed_urls() + self.mirrored_urls():
+            if url not in results:
+                results[url] = self.refresh(url)
+
+        failed = [url for url, ok in results.items() if not ok]
+        refreshed = len(results) - len(failed)
+        self._log("info", f"源码镜像已更新: {refreshed} 个成功，{len(failed)} 个失败")
+        return {"refreshed": refreshed, "failed": failed}
+
+    def attach(self, work_dir: Path, url: str):
+        """
+        让工作区的 origin 指向上游地址，实际从镜像获取（url.<镜像>.insteadOf）
+
+        Args:
+            work_dir: 工作区目录
+            url: 上游仓库地址
+        """
+        mirror = self.mirror_path(url)
+        self._git(["-C", str(work_dir), "remote", "set-url", "origin", url], timeout=30)
+        self._git(["-C", str(work_dir), "config", f"url.{mirror}.insteadOf", url], timeout=30)
+
+    def feed_env(self, work_dir: Path) -> Dict[str, str]:
+        """
+        scripts/feeds 使用的环境变量：把工作区 feeds.conf（没有时为 feeds.conf.default）中各 feed 的地址替换为镜像
+
+        feed 克隆时 git 从本地镜像以硬链接的方式复制对象，--depth 被忽略；origin 仍记录上游地址。
+
+        Args:
+            work_dir: 源码目录
+
+        Returns:
+            dict: GIT_CONFIG_COUNT/GIT_CONFIG_KEY_n/GIT_CONFIG_VALUE_n，没有可用镜像时为空
+        """
+        work_dir = Path(work_dir)
+        feeds_conf = work_dir / "feeds.conf"
+        if not feeds_conf.exists():
+            feeds_conf = work_dir / "feeds.conf.default"
+        if not feeds_conf.exists():
+            return {}
+
+        urls = parse_feed_urls(feeds_conf.read_text(encoding='utf-8', errors='replace')).values()
+        env: Dict[str, str] = {}
+        count = 0
+        for url in dict.fromkeys(urls):
+            mirror = self.ensure(url, max_age=self.max_age)
+            if mirror is None:
+                continue
+            env[f"GIT_CONFIG_KEY_{count}"] = f"url.{mirror}.insteadOf"
+            env[f"GIT_CONFIG_VALUE_{count}"] = url
+            count += 1
+        if count:
+            env["GIT_CONFIG_COUNT"] = str(count)
+        return env
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        获取镜像状态
+
+        Returns:
+            dict: mirror_dir、refresh_interval 和各镜像的 url、path、last_refresh、error
+        """
+        mirrors = []
+        for url in self.mirrored_urls():
+            mirror = self.mirror_path(url)
+            last = self._last_refresh(mirror)
+            mirrors.append({
+                "url": url,
+                "path": str(mirror),
+                "last_refresh": datetime.fromtimestamp(last).isoformat() if last else None,
+                "error": self._errors.get(url)
+            })
+        return {
+            "mirror_dir": str(self.mirror_dir),
+            "refresh_interval": self.refresh_interval,
+            "mirrors": mirrors
+        }
@@ -0,0 +1,177 @@
+"""
+编译任务持久化存储
+基于SQLite保存编译任务、阶段和结果，后端重启后可恢复排队中的任务
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+from utils.logger import setup_logger
+
+
+class TaskStore:
+    """编译任务存储"""
+
+    # 表结构，JSON字段以文本保存
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS compile_tasks (
+            task_id TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            status TEXT NOT NULL,
+            progress REAL NOT NULL DEFAULT 0,
+            priority TEXT NOT NULL DEFAULT 'normal',
+            device_name TEXT,
+            session_id TEXT,
+            config TEXT,
+            queued_time REAL,
+            start_time TEXT,
+            end_time TEXT,
+            error_message TEXT,
+            result TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_compile_tasks_username ON compile_tasks (username);
+        CREATE INDEX IF NOT EXISTS idx_compile_tasks_status ON compile_tasks (status);
+        CREATE INDEX IF NOT EXISTS idx_compile_tasks_user_status ON compile_tasks (username, status);
+    """
+
+    JSON_FIELDS = ("config", "result")
+
+    def __init__(self, db_path: Path, logger=None):
+        """
+        初始化任务存储
+
+        Args:
+            db_path: 数据库文件路径
+            logger: 日志记录器
+        """
+        self.db_path = Path(db_path)
+        self.logger = logger or setup_logger(__name__)
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+            self._conn.commit()
+
+    def _row_to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """数据库行转换为字典"""
+        record = dict(row)
+        for field in self.JSON_FIELDS:
+            if record.get(field):
+                try:
+                    record[field] = json.loads(record[field])
+                except (TypeError, ValueError):
+                    record[field] = None
+        return record
+
+    def save_task(self, record: Dict[str, Any]):
+        """
+        保存（插入或更新）任务记录
+
+        Args:
+            record: 任务记录，必须包含 task_id、username、status
+        """
+        now = time.time()
+        values = dict(record)
+        for field in self.JSON_FIELDS:
+            if field in values and values[field] is not None:
+                values[field] = json.dumps(values[field], ensure_ascii=False, default=str)
+
+        values.setdefault("created_at", now)
+        values["updated_at"] = now
+
+        columns = list(values.keys())
+        placeholders = ", ".join("?" for _ in columns)
+        updates = ", ".join(f"{col} = excluded.{col}" for col in columns
+                            if col not in ("task_id", "created_at"))
+
+        sql = (f"INSERT INTO compile_tasks ({', '.join(columns)}) VALUES ({placeholders}) "
+               f"ON CONFLICT(task_id) DO UPDATE SET {updates}")
+
+        try:
+            with self._lock:
+                self._conn.execute(sql, [values[col] for col in columns])
+                self._conn.commit()
+        except sqlite3.Error as e:
+            self.logger.error(f"保存编译任务失败 {record.get('task_id')}: {e}")
+
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取任务记录
+
+        Args:
+            task_id: 任务ID
+
+        Returns:
+            dict: 任务记录
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM compile_tasks WHERE task_id = ?", (task_id,)
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list_tasks(self, username: str = None, statuses: List[str] = None,
+                   limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        按用户和状态查询任务
+
+        Args:
+            username: 用户名（可选）
+            statuses: 状态列表（可选）
+            limit: 最大返回数量
+
+        Returns:
+            list: 任务记录列表，按创建时间倒序
+        """
+        conditions = []
+        params: List[Any] = []
+
+        if username:
+            conditions.append("username = ?")
+            params.append(username)
+
+        if statuses:
+            conditions.append(f"status IN ({', '.join('?' for _ in statuses)})")
+            params.extend(statuses)
+
+        sql = "SELECT * FROM compile_tasks"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        params.append(int(limit))
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def delete_task(self, task_id: str) -> bool:
+        """
+        删除任务记录
+
+        Args:
+            task_id: 任务ID
+
+        Returns:
+            bool: 是否删除
+        """
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM compile_tasks WHERE task_id = ?", (task_id,))
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
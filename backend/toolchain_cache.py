@@ -0,0 +1,205 @@
+"""
+预编译工具链缓存
+编译成功后把工作区的主机工具和交叉工具链打包保存，同一工作区被清理（make dirclean、重建等）后
+在 make 之前直接解压，省去 30-60 分钟的工具链编译
+
+主机工具以 --prefix=$(STAGING_DIR_HOST) 编译，脚本、pkg-config/libtool 数据和 build_dir 中已配置的源码树
+都记录了产出它们的工作区的绝对路径，不能恢复到其他工作区，因此缓存键包含工作区路径
+"""
+
+import re
+import shutil
+import hashlib
+import subprocess
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from build_history import load_build_target
+from utils.artifact_cache import ArtifactCache
+
+
+# 影响工具链内容的配置项
+TOOLCHAIN_CONFIG_PATTERN = re.compile(
+    r"^CONFIG_(?:GCC_|BINUTILS_|LIBC|USE_(?:MUSL|GLIBC|UCLIBC)|TOOLCHAIN|EXTERNAL_TOOLCHAIN|KERNEL_HEADERS|"
+    r"GDB|INSTALL_GCC|SSP_|USE_SSTRIP|SOFT_FLOAT|TARGET_OPTIMIZATION|CPU_TYPE|ARCH|TARGET_ARCH_PACKAGES)"
+)
+ARCH_PACKAGES_PATTERN = re.compile(r'^CONFIG_TARGET_ARCH_PACKAGES="([^"]+)"', re.MULTILINE)
+
+ARCHIVE_NAME = "toolchain.tar"
+ARCHIVE_SUFFIXES = {"zstd": ".zst", "pigz": ".gz", "gzip": ".gz"}
+
+
+def _toolchain_pattern(work_dir: Path) -> str:
+    """当前编译目标的工具链目录名（toolchain-<CONFIG_TARGET_ARCH_PACKAGES>_gcc-..._<libc>）"""
+    content = (Path(work_dir) / ".config").read_text(encoding='utf-8', errors='replace')
+    arch = ARCH_PACKAGES_PATTERN.search(content)
+    return f"toolchain-{arch.group(1)}_*" if arch else "toolchain-*"
+
+
+def _compressor() -> Optional[str]:
+    """可用的压缩程序（zstd 解压速度远快于 gzip）"""
+    if shutil.which("zstd"):
+        return "zstd"
+    if shutil.which("pigz"):
+        return "pigz"
+    return "gzip" if shutil.which("gzip") else None
+
+
+class ToolchainCache:
+    """按编译目标和源码提交缓存的工具链"""
+
+    def __init__(self, cache_dir: Path, max_size: int, logger=None):
+        """
+        初始化工具链缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_size: 大小上限（字节），超过后淘汰最久未使用的工具链
+            logger: 日志记录器
+        """
+        self.cache = ArtifactCache(cache_dir, max_size, logger, name="工具链缓存")
+        self.logger = logger
+
+    def _log(self, level: str, message: str):
+        """记录日志"""
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    def setup(self):
+        """创建缓存目录和索引"""
+        self.cache.setup()
+
+    @staticmethod
+    def toolchain_key(work_dir: Path, commit: str) -> Optional[str]:
+        """
+        计算工作区工具链的缓存键：工作区路径 + 编译目标 + LEDE 提交 + 工具链相关配置的摘要
+
+        Args:
+            work_dir: 源码目录
+            commit: 源码提交哈希
+
+        Returns:
+            str: 例如 "/path/to/lede:ramips/mt7621@<提交>#<配置摘要>"，无法确定编译目标时返回None
+        """
+        target = load_build_target(work_dir)
+        if not target or not commit:
+            return None
+
+        lines = (Path(work_dir) / ".config").read_text(encoding='utf-8', errors='replace').splitlines()
+        options = sorted(line for line in lines if TOOLCHAIN_CONFIG_PATTERN.match(line))
+        digest = hashlib.sha256("\n".join(options).encode('utf-8')).hexdigest()[:12]
+        return f"{Path(work_dir).resolve()}:{target}@{commit}#{digest}"
+
+    @staticmethod
+    def toolchain_paths(work_dir: Path) -> List[str]:
+        """
+        工作区中需要缓存的目录（相对路径）
+
+        除工具链本身外还包括主机工具：工具链的完成标记依赖主机工具的标记，只恢复工具链时 make 仍会重新编译它。
+        """
+        work_dir = Path(work_dir)
+        pattern = _toolchain_pattern(work_dir)
+
+        paths = []
+        for base in ("staging_dir", "build_dir"):
+            if (work_dir / base / "host").is_dir():
+                paths.append(f"{base}/host")
+            paths += sorted(str(path.relative_to(work_dir)) for path in (work_dir / base).glob(pattern)
+                            if path.is_dir())
+        return paths
+
+    @staticmethod
+    def is_built(work_dir: Path) -> bool:
+        """工作区中的工具链是否已编译完成（存在 .toolchain_compile 标记）"""
+        pattern = _toolchain_pattern(work_dir)
+        return any((Path(work_dir) / "staging_dir").glob(f"{pattern}/stamp/.toolchain_compile*"))
+
+    def restore(self, work_dir: Path, commit: str) -> Optional[str]:
+        """
+        工作区没有编译好的工具链时从缓存恢复
+
+        Args:
+            work_dir: 源码目录
+            commit: 源码提交哈希
+
+        Returns:
+            str: 恢复的缓存键，没有恢复时返回None
+        """
+        work_dir = Path(work_dir)
+        if self.is_built(work_dir):
+            return None
+
+        key = self.toolchain_key(work_dir, commit)
+        if not key:
+            return None
+
+        entry = self.cache.lookup(key)
+        if not entry:
+            self._log("info", f"工具链缓存未命中: {key}")
+            return None
+
+        archive = next(entry["path"].glob(f"{ARCHIVE_NAME}*"), None)
+        if archive is None:
+            self.cache.remove(key)
+            return None
+
+        # 先删除工作区中不完整的工具链和主机工具，避免新旧文件混在一起
+        for relative in entry["meta"].get("paths", []):
+            shutil.rmtree(work_dir / relative, ignore_errors=True)
+
+        command = ["tar", "-xf", str(archive), "-C", str(work_dir)]
+        compressor = entry["meta"].get("compressor")
+        if compressor:
+            command[1:1] = [f"--use-compress-program={compressor}"]
+        try:
+            subprocess.run(command, check=True, capture_output=True, timeout=3600)
+        except (OSError, subprocess.SubprocessError) as e:
+            self._log("error", f"恢复工具链失败 {key}: {e}")
+            for relative in entry["meta"].get("paths", []):
+                shutil.rmtree(work_dir / relative, ignore_errors=True)
+            return None
+
+        self._log("info", f"已从缓存恢复工具链: {key}")
+        return key
+
+    def save(self, work_dir: Path, commit: str) -> Optional[str]:
+        """
+        编译成功后保存工作区的工具链（已缓存时跳过）
+
+        Args:
+            work_dir: 源码目录
+            commit: 源码提交哈希
+
+        Returns:
+            str: 保存的缓存键，没有保存时返回None
+        """
+        work_dir = Path(work_dir)
+        if not self.is_built(work_dir):
+            return None
+
+        key = self.toolchain_key(work_dir, commit)
+        if not key or self.cache.contains(key):
+            return None
+
+        paths = self.toolchain_paths(work_dir)
+        compressor = _compressor()
+
+        def populate(entry_dir: Path):
+            archive = entry_dir / (ARCHIVE_NAME + ARCHIVE_SUFFIXES.get(compressor, ""))
+            command = ["tar", "-cf", str(archive), "-C", str(work_dir)] + paths
+            if compressor:
+                command[1:1] = [f"--use-compress-program={compressor}"]
+            subprocess.run(command, check=True, capture_output=True, timeout=3600)
+
+        if not self.cache.store(key, populate, {"paths": paths, "compressor": compressor}):
+            return None
+        return key
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计
+
+        Returns:
+            dict: entries、size_bytes、max_size_bytes、hits、misses、hit_rate 等
+        """
+        return self.cache.get_stats()
@@ -365,6 +365,33 @@ class UserManager:
         self.logger.info(f"用户 {username} 编译会话结束: {session_id}, 成功: {success}")
         return True
 
+    def close_orphaned_compile_sessions(self, active_task_ids: set, reason: str) -> int:
+        """
+        结束没有对应活动任务的"running"编译会话（后端重启后调用）
+
+        Args:
+            active_task_ids: 仍在队列或执行中的任务ID集合
+            reason: 记录到会话结果中的原因
+
+        Returns:
+            int: 被结束的会话数量
+        """
+        config = self._load_users_config()
+        closed = []
+
+        for username, user_data in config["users"].items():
+            for session in user_data.get("compile_sessions", []):
+                if session.get("status") == "running" and session.get("task_id") not in active_task_ids:
+                    closed.append((username, session["session_id"]))
+
+        for username, session_id in closed:
+            self.end_compile_session(username, session_id, False, {"error_message": reason})
+
+        if closed:
+            self.logger.warning(f"已结束 {len(closed)} 个遗留的编译会话")
+
+        return len(closed)
+
     def get_user_statistics(self, username: str) -> Optional[Dict[str, Any]]:
         """获取用户统计信息"""
         config = self._load_users_config()
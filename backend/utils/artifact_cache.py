@@ -0,0 +1,234 @@
+"""
+编译产物缓存
+按键保存一组文件（例如预编译工具链、固件），记录大小和最近使用时间，超过大小上限时淘汰最久未使用的条目，
+并统计查询的命中次数
+"""
+
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, Callable, List
+
+
+class ArtifactCache:
+    """
+    编译产物缓存
+
+    目录结构:
+
+        <缓存目录>/
+            entries/<键的sha256>/   条目文件
+            index.db                条目的键、大小、元数据、最近使用时间和命中次数
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            dirname TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            meta TEXT,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used);
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, cache_dir: Path, max_size: int, logger=None, name: str = "编译产物缓存"):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_size: 大小上限（字节），超过后淘汰最久未使用的条目
+            logger: 日志记录器
+            name: 日志中显示的缓存名称
+        """
+        self.cache_dir = Path(cache_dir)
+        self.entries_dir = self.cache_dir / "entries"
+        self.max_size = int(max_size)
+        self.logger = logger
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _log(self, level: str, message: str):
+        """记录日志"""
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    def setup(self):
+        """创建缓存目录和索引，清理上次未完成写入的临时目录"""
+        self.entries_dir.mkdir(parents=True, exist_ok=True)
+        for tmp in self.entries_dir.glob("*.tmp"):
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self._conn = sqlite3.connect(str(self.cache_dir / "index.db"), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(self.SCHEMA)
+            self._conn.commit()
+
+    @staticmethod
+    def _dirname(key: str) -> str:
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _count(self, name: str):
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,))
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        查询条目并计入命中统计
+
+        Args:
+            key: 键
+
+        Returns:
+            dict: path（条目目录）、meta、size、created_at，未命中时返回None
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM entries WHERE key = ?", (key,)).fetchone()
+            path = self.entries_dir / row["dirname"] if row else None
+            if row and not path.is_dir():
+                # 条目目录被外部删除
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                row = None
+
+            if row:
+                self._conn.execute("UPDATE entries SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                                   (time.time(), key))
+                self._count("hits")
+            else:
+                self._count("misses")
+            self._conn.commit()
+
+        if not row:
+            return None
+        return {
+            "path": path,
+            "meta": json.loads(row["meta"] or "{}"),
+            "size": row["size"],
+            "created_at": row["created_at"]
+        }
+
+    def contains(self, key: str) -> bool:
+        """条目是否存在（不计入命中统计）"""
+        with self._lock:
+            row = self._conn.execute("SELECT dirname FROM entries WHERE key = ?", (key,)).fetchone()
+        return bool(row) and (self.entries_dir / row["dirname"]).is_dir()
+
+    def store(self, key: str, populate: Callable[[Path], None],
+              meta: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        写入条目（已存在时覆盖）
+
+        populate 在临时目录中写入文件，完成后整体改名，写入中途失败不会留下不完整的条目。
+
+        Args:
+            key: 键
+            populate: 向目录写入条目文件的函数
+            meta: 随条目保存的元数据
+
+        Returns:
+            bool: 是否写入成功
+        """
+        dirname = self._dirname(key)
+        tmp = self.entries_dir / f"{dirname}.tmp"
+        target = self.entries_dir / dirname
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+
+        try:
+            populate(tmp)
+        except Exception as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            self._log("error", f"写入{self.name}失败 {key}: {e}")
+            return False
+
+        size = sum(path.stat().st_size for path in tmp.rglob("*") if path.is_file() and not path.is_symlink())
+        now = time.time()
+        with self._lock:
+            if target.exists():
+                shutil.rmtree(target, ignore_errors=True)
+            os.replace(tmp, target)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, dirname, size, meta, created_at, last_used, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (key, dirname, size, json.dumps(meta or {}, ensure_ascii=False), now, now))
+            self._conn.commit()
+
+        self._log("info", f"{self.name}已保存 {key} ({size / 1024 ** 2:.0f}M)")
+        self.evict()
+        return True
+
+    def remove(self, key: str):
+        """
+        删除条目
+
+        Args:
+            key: 键
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+        shutil.rmtree(self.entries_dir / self._dirname(key), ignore_errors=True)
+
+    def evict(self) -> int:
+        """
+        超过大小上限时按最近使用时间淘汰条目
+
+        Returns:
+            int: 淘汰的条目数
+        """
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_size:
+                return 0
+            rows = self._conn.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall()
+
+        evicted: List[str] = []
+        for row in rows:
+            if total <= self.max_size:
+                break
+            self.remove(row["key"])
+            evicted.append(row["key"])
+            total -= row["size"]
+
+        self._log("info", f"{self.name}淘汰 {len(evicted)} 个最久未使用的条目")
+        return len(evicted)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计
+
+        Returns:
+            dict: cache_dir、entries、size_bytes、max_size_bytes、hits、misses、hit_rate
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            counters = {name: value for name, value in self._conn.execute("SELECT name, value FROM counters")}
+
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        return {
+            "cache_dir": str(self.cache_dir),
+            "entries": row[0],
+            "size_bytes": row[1],
+            "max_size_bytes": self.max_size,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None
+        }
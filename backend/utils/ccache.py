@@ -0,0 +1,239 @@
+"""
+共享 ccache
+所有用户工作区的编译使用同一个限制大小的 ccache 目录，工具链、内核等相同的源码只需编译一次；
+每个任务单独记录 ccache 统计日志，用于统计单个任务的命中率
+"""
+
+import os
+import re
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterable
+
+
+# ccache 统计项中表示命中和未命中的项
+HIT_COUNTERS = ("direct_cache_hit", "preprocessed_cache_hit")
+MISS_COUNTERS = ("cache_miss",)
+
+# --print-stats 中与单次调用结果无关的项（存储层读写次数、清理次数等）
+STORAGE_COUNTER_PREFIXES = ("local_storage_", "remote_storage_", "cleanups_", "stats_")
+
+CONFIG_LINE_PATTERN = re.compile(r"^(?:# )?(CONFIG_CCACHE(?:_DIR)?)[= ]")
+
+
+def summarize_counters(counters: Dict[str, int]) -> Dict[str, Any]:
+    """
+    根据 ccache 统计项计算命中率
+
+    Args:
+        counters: 统计项名称及次数
+
+    Returns:
+        dict: hits、misses、uncacheable（无法缓存的调用，例如链接和配置检测）、hit_rate 及各统计项
+    """
+    hits = sum(counters.get(name, 0) for name in HIT_COUNTERS)
+    misses = sum(counters.get(name, 0) for name in MISS_COUNTERS)
+    uncacheable = sum(count for name, count in counters.items()
+                      if name not in HIT_COUNTERS and name not in MISS_COUNTERS)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "uncacheable": uncacheable,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        "counters": counters
+    }
+
+
+def parse_stats_log(log_file: Path) -> Optional[Dict[str, int]]:
+    """
+    解析 ccache 统计日志（stats_log）
+
+    每次调用写入 "# 源文件" 一行，随后每行一个统计项名称。
+
+    Args:
+        log_file: 统计日志文件
+
+    Returns:
+        dict: 统计项名称及次数，文件不存在时返回None
+    """
+    log_file = Path(log_file)
+    if not log_file.exists():
+        return None
+
+    counters: Dict[str, int] = {}
+    with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            name = line.strip()
+            if name and not name.startswith("#"):
+                counters[name] = counters.get(name, 0) + 1
+    return counters
+
+
+class SharedCcache:
+    """
+    共享 ccache 目录
+
+    OpenWrt 在启用 CONFIG_CCACHE 后会以 CONFIG_CCACHE_DIR（为空时为源码目录下的 .ccache）覆盖环境变量 CCACHE_DIR，
+    并设置 CCACHE_BASEDIR 为源码目录，所以共享目录写入每个工作区的 .config；
+    缓存配置写在缓存目录的 ccache.conf 中，对所有编译生效。
+    """
+
+    def __init__(self, cache_dir: Path, max_size: str = "50G", stats_dir: Optional[Path] = None,
+                 logger=None):
+        """
+        初始化共享 ccache
+
+        Args:
+            cache_dir: 缓存目录
+            max_size: 缓存大小上限（ccache 格式，例如 "50G"），超过后 ccache 自动清理最久未用的条目
+            stats_dir: 各任务统计日志目录
+            logger: 日志记录器
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_size = str(max_size)
+        self.stats_dir = Path(stats_dir) if stats_dir else self.cache_dir.parent / "ccache_stats"
+        self.logger = logger
+
+    def _log(self, level: str, message: str):
+        """记录日志"""
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    def setup(self):
+        """
+        创建缓存目录并写入 ccache.conf
+
+        目录设置 setgid 并使用 002 umask，同组的其他编译用户也能读写缓存；
+        不把工作目录计入哈希（hash_dir），不同用户工作区中相同的源码可以互相命中。
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.stats_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            os.chmod(self.cache_dir, 0o2775)
+        except OSError as e:
+            self._log("warning", f"设置 ccache 目录权限失败: {e}")
+
+        settings = {
+            "max_size": self.max_size,
+            "umask": "002",
+            "hash_dir": "false",
+            "compression": "true"
+        }
+        conf = self.cache_dir / "ccache.conf"
+        content = "".join(f"{key} = {value}\n" for key, value in settings.items())
+        if not conf.exists() or conf.read_text(encoding='utf-8') != content:
+            conf.write_text(content, encoding='utf-8')
+            os.chmod(conf, 0o664)
+
+        self._log("info", f"共享 ccache 已就绪: {self.cache_dir} (上限 {self.max_size})")
+
+    def apply_config(self, work_dir: Path, enabled: bool = True):
+        """
+        在工作区的 .config 中启用（或关闭）ccache 并指向共享目录，之后的 make defconfig 会保留这两项
+
+        Args:
+            work_dir: 源码目录
+            enabled: 是否启用
+        """
+        config_file = Path(work_dir) / ".config"
+        lines = []
+        if config_file.exists():
+            lines = [line for line in config_file.read_text(encoding='utf-8').splitlines()
+                     if not CONFIG_LINE_PATTERN.match(line)]
+
+        if enabled:
+            lines += ["CONFIG_CCACHE=y", f'CONFIG_CCACHE_DIR="{self.cache_dir}"']
+        else:
+            lines.append("# CONFIG_CCACHE is not set")
+
+        tmp = config_file.with_suffix(".ccache.tmp")
+        tmp.write_text("\n".join(lines) + "\n", encoding='utf-8')
+        os.replace(tmp, config_file)
+
+    def stats_log(self, key: str) -> Path:
+        """任务的统计日志文件"""
+        return self.stats_dir / f"{key}.log"
+
+    def env(self, key: str) -> Dict[str, str]:
+        """
+        编译进程需要的环境变量（OpenWrt 之外直接调用 ccache 的编译也使用共享目录）
+
+        Args:
+            key: 标识（任务ID），用于单独记录统计日志
+
+        Returns:
+            dict: 环境变量
+        """
+        return {
+            "CCACHE_DIR": str(self.cache_dir),
+            "CCACHE_UMASK": "002",
+            "CCACHE_STATSLOG": str(self.stats_log(key))
+        }
+
+    def get_task_stats(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        获取单个任务的命中统计
+
+        Args:
+            key: 标识（任务ID）
+
+        Returns:
+            dict: 命中统计，没有统计日志时返回None
+        """
+        counters = parse_stats_log(self.stats_log(key))
+        if counters is None:
+            return None
+        return summarize_counters(counters)
+
+    def find_binary(self, search_dirs: Iterable[Path] = ()) -> Optional[str]:
+        """查找 ccache 程序（系统安装的，或 OpenWrt 在 staging_dir/host/bin 中编译的）"""
+        for directory in search_dirs:
+            candidate = Path(directory) / "ccache"
+            if candidate.is_file() and os.access(candidate, os.X_OK):
+                return str(candidate)
+        return shutil.which("ccache")
+
+    def get_stats(self, search_dirs: Iterable[Path] = ()) -> Dict[str, Any]:
+        """
+        获取共享缓存的总体统计
+
+        Args:
+            search_dirs: 查找 ccache 程序的额外目录
+
+        Returns:
+            dict: cache_dir、max_size，以及 ccache --print-stats 的命中统计和缓存大小（找不到 ccache 时省略）
+        """
+        result: Dict[str, Any] = {"cache_dir": str(self.cache_dir), "max_size": self.max_size}
+
+        binary = self.find_binary(search_dirs)
+        if not binary:
+            return result
+
+        try:
+            output = subprocess.run(
+                [binary, "--print-stats"], capture_output=True, text=True, timeout=30,
+                env={**os.environ, "CCACHE_DIR": str(self.cache_dir)}
+            ).stdout
+        except (OSError, subprocess.SubprocessError) as e:
+            self._log("warning", f"读取 ccache 统计失败: {e}")
+            return result
+
+        counters: Dict[str, int] = {}
+        for line in output.splitlines():
+            name, _, value = line.partition("\t")
+            if value.strip().isdigit():
+                counters[name] = int(value)
+
+        size_kib = counters.pop("cache_size_kibibyte", None)
+        files = counters.pop("files_in_cache", None)
+        counters = {name: count for name, count in counters.items()
+                    if count and not name.startswith(STORAGE_COUNTER_PREFIXES)}
+
+        result.update(summarize_counters(counters))
+        if size_kib is not None:
+            result["cache_size_bytes"] = size_kib * 1024
+        if files is not None:
+            result["files_in_cache"] = files
+        return result
+
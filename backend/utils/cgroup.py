@@ -0,0 +1,272 @@
+"""
+cgroup v2 资源隔离
+每个编译进程树放入独立的 cgroup，限制 CPU/IO 权重和内存上限，后端进程保留一定的 CPU/IO 份额
+"""
+
+import os
+import time
+import shlex
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+
+CGROUP_MOUNT = Path("/sys/fs/cgroup")
+
+# 需要在子树中启用的控制器
+CONTROLLERS = ("cpu", "memory", "io")
+
+
+class CgroupError(Exception):
+    """cgroup 操作失败"""
+    pass
+
+
+class CgroupManager:
+    """
+    cgroup v2 管理器
+
+    在后端所在的 cgroup 下建立如下结构（cgroup v2 要求启用了子树控制器的非根 cgroup 中不能有进程，
+    所以后端自身移入 backend 子组）:
+
+        <后端cgroup>/
+            backend/          后端进程，cpu.weight/io.weight 按保留份额设置
+            builds/           所有编译进程，cpu.weight/io.weight 为 100
+                <进程ID>/     单个编译进程树，cpu.weight/io.weight/memory.max
+    """
+
+    BUILDS_WEIGHT = 100
+
+    def __init__(self, logger=None, backend_reserved_share: float = 20,
+                 mount: Path = CGROUP_MOUNT):
+        """
+        初始化 cgroup 管理器
+
+        Args:
+            logger: 日志记录器
+            backend_reserved_share: 资源争用时后端保留的 CPU/IO 份额（百分比）
+            mount: cgroup v2 挂载点
+        """
+        self.logger = logger
+        self.mount = Path(mount)
+        self.backend_reserved_share = min(max(float(backend_reserved_share), 1.0), 90.0)
+
+        self.base: Optional[Path] = None
+        self.builds: Optional[Path] = None
+        self.controllers: List[str] = []
+        self.available = False
+
+    def _log(self, level: str, message: str):
+        """记录日志"""
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    @staticmethod
+    def _write(path: Path, value: Any):
+        with open(path, 'w') as f:
+            f.write(str(value))
+
+    def _current_cgroup(self) -> Path:
+        """当前进程所在的 cgroup v2 目录"""
+        with open("/proc/self/cgroup", 'r') as f:
+            for line in f:
+                hierarchy, _, relative = line.rstrip("\n").split(":", 2)
+                if hierarchy == "0":
+                    return self.mount / relative.lstrip("/")
+        raise CgroupError("当前进程不在 cgroup v2 层级中")
+
+    def setup(self) -> bool:
+        """
+        建立 backend/builds 子组并启用控制器（可重复调用，后端重启后沿用已有结构）
+
+        Returns:
+            bool: cgroup 隔离是否可用
+        """
+        try:
+            if not (self.mount / "cgroup.controllers").exists():
+                raise CgroupError(f"{self.mount} 不是 cgroup v2 挂载点")
+
+            current = self._current_cgroup()
+            # 后端重启后可能已经位于上次建立的 backend 子组中
+            self.base = current.parent if current.name == "backend" and \
+                (current.parent / "builds").is_dir() else current
+            backend = self.base / "backend"
+            self.builds = self.base / "builds"
+
+            available = (self.base / "cgroup.controllers").read_text().split()
+            self.controllers = [name for name in CONTROLLERS if name in available]
+            if "cpu" not in self.controllers:
+                raise CgroupError("cpu 控制器不可用（未委派给当前 cgroup）")
+
+            backend.mkdir(exist_ok=True)
+            self.builds.mkdir(exist_ok=True)
+
+            # 非根 cgroup 需要先把其中的进程移走才能启用子树控制器
+            is_root = self.base == self.mount
+            pids = [str(os.getpid())] if is_root else \
+                (self.base / "cgroup.procs").read_text().split()
+            for pid in pids:
+                try:
+                    self._write(backend / "cgroup.procs", pid)
+                except OSError:
+                    # 进程已退出，或是无法移动的内核线程
+                    pass
+
+            enable = " ".join(f"+{name}" for name in self.controllers)
+            self._write(self.base / "cgroup.subtree_control", enable)
+            self._write(self.builds / "cgroup.subtree_control", enable)
+
+            backend_weight = self._backend_weight()
+            self._set(backend, "cpu.weight", backend_weight)
+            self._set(self.builds, "cpu.weight", self.BUILDS_WEIGHT)
+            if "io" in self.controllers:
+                self._set(backend, "io.weight", backend_weight)
+                self._set(self.builds, "io.weight", self.BUILDS_WEIGHT)
+
+            self.available = True
+            self._log("info", f"cgroup 隔离已启用: {self.base} (控制器: {', '.join(self.controllers)}, "
+                              f"后端保留份额 {self.backend_reserved_share:.0f}%)")
+
+        except (OSError, CgroupError) as e:
+            self.available = False
+            self._log("warning", f"cgroup 隔离不可用，编译进程将与后端共享资源: {e}")
+
+        return self.available
+
+    def _backend_weight(self) -> int:
+        """按保留份额计算后端 cgroup 的权重（相对 builds 的 100）"""
+        share = self.backend_reserved_share / 100
+        return max(1, min(10000, round(self.BUILDS_WEIGHT * share / (1 - share))))
+
+    def _set(self, cgroup: Path, name: str, value: Any) -> bool:
+        """写入 cgroup 接口文件，控制器未启用或内核不支持时只记录警告"""
+        try:
+            self._write(cgroup / name, value)
+            return True
+        except OSError as e:
+            self._log("warning", f"设置 {cgroup.name}/{name}={value} 失败: {e}")
+            return False
+
+    def create(self, name: str, cpu_weight: Optional[int] = None,
+               memory_max: Optional[Any] = None, io_weight: Optional[int] = None) -> Optional[Path]:
+        """
+        为一个编译进程树创建 cgroup
+
+        Args:
+            name: cgroup 名称（进程ID）
+            cpu_weight: CPU权重（1-10000，默认100）
+            memory_max: 内存上限（字节数或 "8G" 这样的字符串，None 表示不限制）
+            io_weight: IO权重（1-10000，默认100）
+
+        Returns:
+            Path: cgroup 目录，不可用时返回None
+        """
+        if not self.available:
+            return None
+
+        cgroup = self.builds / name
+        try:
+            if cgroup.exists():
+                self.remove(cgroup)
+            cgroup.mkdir()
+        except OSError as e:
+            self._log("warning", f"创建 cgroup 失败 {name}: {e}")
+            return None
+
+        if cpu_weight:
+            self._set(cgroup, "cpu.weight", int(cpu_weight))
+        if "memory" in self.controllers:
+            if memory_max:
+                self._set(cgroup, "memory.max", memory_max)
+            # 内存超限时整个编译一起被终止，而不是随机杀掉其中一个进程留下半成品
+            self._set(cgroup, "memory.oom.group", 1)
+        if io_weight and "io" in self.controllers:
+            self._set(cgroup, "io.weight", int(io_weight))
+
+        return cgroup
+
+    @staticmethod
+    def enter_command(cgroup: Path) -> str:
+        """
+        将执行命令的 shell 自身移入 cgroup 的命令前缀
+
+        写入 "0" 表示移动写入者自己，之后启动的所有子进程都在该 cgroup 中，不存在先 fork 后移动的竞争。
+        """
+        return f"echo 0 > {shlex.quote(str(cgroup / 'cgroup.procs'))}"
+
+    def stats(self, cgroup: Path) -> Dict[str, Any]:
+        """
+        读取 cgroup 的资源统计
+
+        Args:
+            cgroup: cgroup 目录
+
+        Returns:
+            dict: cpu_usage_seconds、memory_peak_bytes、memory_oom_kills（内核不支持的项省略）
+        """
+        result: Dict[str, Any] = {}
+        try:
+            for line in (cgroup / "cpu.stat").read_text().splitlines():
+                key, _, value = line.partition(" ")
+                if key == "usage_usec":
+                    result["cpu_usage_seconds"] = round(int(value) / 1e6, 1)
+        except (OSError, ValueError):
+            pass
+        try:
+            result["memory_peak_bytes"] = int((cgroup / "memory.peak").read_text())
+        except (OSError, ValueError):
+            pass
+        try:
+            for line in (cgroup / "memory.events").read_text().splitlines():
+                key, _, value = line.partition(" ")
+                if key == "oom_kill":
+                    result["memory_oom_kills"] = int(value)
+        except (OSError, ValueError):
+            pass
+        return result
+
+    def kill(self, cgroup: Path) -> bool:
+        """
+        终止 cgroup 中的所有进程（包括脱离了进程组的后台进程）
+
+        Args:
+            cgroup: cgroup 目录
+
+        Returns:
+            bool: 是否支持 cgroup.kill（内核 5.14+）
+        """
+        try:
+            self._write(cgroup / "cgroup.kill", 1)
+            return True
+        except OSError:
+            return False
+
+    def remove(self, cgroup: Path, timeout: float = 2.0):
+        """
+        删除 cgroup，仍有残留进程时先全部终止
+
+        Args:
+            cgroup: cgroup 目录
+            timeout: 等待残留进程退出的时间（秒）
+        """
+        cgroup = Path(cgroup)
+        if not cgroup.exists():
+            return
+
+        try:
+            if (cgroup / "cgroup.procs").read_text().strip():
+                self.kill(cgroup)
+        except OSError:
+            pass
+
+        deadline = time.time() + timeout
+        while True:
+            try:
+                cgroup.rmdir()
+                return
+            except FileNotFoundError:
+                return
+            except OSError as e:
+                if time.time() >= deadline:
+                    self._log("warning", f"删除 cgroup 失败 {cgroup}: {e}")
+                    return
+                time.sleep(0.05)
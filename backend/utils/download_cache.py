@@ -0,0 +1,300 @@
+"""
+共享下载缓存
+所有用户工作区 dl/ 目录中的源码包按内容（sha256）保存一份，通过硬链接（跨文件系统时用符号链接）放回各工作区；
+OpenWrt 的 download.pl 从本地镜像取文件时会按 PKG_HASH 校验，内容不符时继续从网络下载
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+
+class DownloadCache:
+    """
+    按内容寻址的共享下载缓存
+
+    目录结构:
+
+        <缓存目录>/
+            objects/ab/<sha256>    源码包内容
+            by-name/<文件名>       指向 objects 的符号链接，作为 download.pl 的 file:// 本地镜像
+            index.db               各对象的文件名、大小和最近使用时间（LRU 淘汰）
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS objects (
+            sha256 TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_objects_last_used ON objects (last_used);
+        CREATE INDEX IF NOT EXISTS idx_objects_name ON objects (name);
+    """
+
+    # dl/ 中不入库的文件（下载中的临时文件、锁文件）
+    SKIP_SUFFIXES = (".dl", ".tmp", ".lock", ".flock")
+
+    def __init__(self, cache_dir: Path, max_size: int, logger=None):
+        """
+        初始化下载缓存
+
+        Args:
+            cache_dir: 缓存目录（与工作区位于同一文件系统时使用硬链接，不占用额外空间）
+            max_size: 缓存大小上限（字节），超过后淘汰最久未使用的源码包
+            logger: 日志记录器
+        """
+        self.cache_dir = Path(cache_dir)
+        self.objects_dir = self.cache_dir / "objects"
+        self.names_dir = self.cache_dir / "by-name"
+        self.max_size = int(max_size)
+        self.logger = logger
+
+        self._lock = threading.Lock()
+        # 多个任务同时下载完成时逐个收入，避免同一文件被重复写入
+        self._ingest_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _log(self, level: str, message: str):
+        """记录日志"""
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    def setup(self):
+        """创建缓存目录和索引"""
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.names_dir.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(str(self.cache_dir / "index.db"), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(self.SCHEMA)
+            self._conn.commit()
+
+        self._log("info", f"共享下载缓存已就绪: {self.cache_dir} (上限 {self.max_size / 1024 ** 3:.0f}G)")
+
+    def _object_path(self, sha256: str) -> Path:
+        return self.objects_dir / sha256[:2] / sha256
+
+    @staticmethod
+    def _hash_file(path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def mirror_url(self) -> str:
+        """download.pl 使用的本地镜像地址"""
+        return f"file://{self.names_dir}"
+
+    def prepare(self, work_dir: Path):
+        """
+        下载前把共享缓存登记为工作区的本地镜像
+
+        download.pl 会先在 scripts/localmirrors 列出的镜像中查找文件，复制后按 PKG_HASH（git 源码为 PKG_MIRROR_HASH）校验，
+        校验失败时继续尝试原下载地址，缓存中同名但内容不同的文件不会被误用。
+
+        Args:
+            work_dir: 源码目录
+        """
+        scripts_dir = Path(work_dir) / "scripts"
+        if not scripts_dir.is_dir():
+            return
+
+        mirrors_file = scripts_dir / "localmirrors"
+        mirrors = []
+        if mirrors_file.exists():
+            mirrors = [line.strip() for line in mirrors_file.read_text(encoding='utf-8').splitlines()
+                       if line.strip() and line.strip() != self.mirror_url()]
+        mirrors_file.write_text("\n".join([self.mirror_url()] + mirrors) + "\n", encoding='utf-8')
+
+    def ingest(self, work_dir: Path) -> Dict[str, Any]:
+        """
+        下载完成后把工作区 dl/ 中的源码包收入缓存，并把工作区中的文件换成指向缓存的链接
+
+        Args:
+            work_dir: 源码目录
+
+        Returns:
+            dict: files（检查的文件数）、added（新收入的）、linked（换成链接的）、saved_bytes（节省的空间）
+        """
+        dl_dir = Path(work_dir) / "dl"
+        result = {"files": 0, "added": 0, "linked": 0, "saved_bytes": 0}
+        if not dl_dir.is_dir():
+            return result
+
+        now = time.time()
+        used: List[str] = []
+        with self._ingest_lock:
+            for path in sorted(dl_dir.iterdir()):
+                if path.name.startswith(".") or path.name.endswith(self.SKIP_SUFFIXES):
+                    continue
+                if path.is_symlink():
+                    # 之前换成的符号链接只记录使用时间
+                    target = path.resolve()
+                    if target.parent.parent == self.objects_dir and target.exists():
+                        used.append(target.name)
+                    continue
+                if not path.is_file():
+                    continue
+
+                result["files"] += 1
+                try:
+                    sha256, added, linked, saved = self._ingest_file(path, now)
+                except OSError as e:
+                    self._log("warning", f"下载缓存收入失败 {path.name}: {e}")
+                    continue
+
+                used.append(sha256)
+                result["added"] += added
+                result["linked"] += linked
+                result["saved_bytes"] += saved
+
+        self._touch(used, now)
+        self.evict()
+        return result
+
+    def _ingest_file(self, path: Path, now: float):
+        """收入单个文件，返回 (sha256, 是否新收入, 是否换成链接, 节省的字节数)"""
+        stat = path.stat()
+
+        # 已经是缓存对象的硬链接时不需要重新计算哈希
+        name_link = self.names_dir / path.name
+        try:
+            target = name_link.resolve(strict=True)
+            if os.path.samestat(target.stat(), stat):
+                return target.name, 0, 0, 0
+        except OSError:
+            pass
+
+        sha256 = self._hash_file(path)
+        obj = self._object_path(sha256)
+
+        added = 0
+        if not obj.exists():
+            obj.parent.mkdir(exist_ok=True)
+            tmp = obj.with_suffix(".tmp")
+            try:
+                os.link(path, tmp)
+            except OSError:
+                # 跨文件系统时复制一份
+                with open(path, 'rb') as src, open(tmp, 'wb') as dst:
+                    for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                        dst.write(chunk)
+            os.replace(tmp, obj)
+            os.chmod(obj, 0o444)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO objects (sha256, name, size, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)", (sha256, path.name, stat.st_size, now, now))
+                self._conn.commit()
+            added = 1
+
+        self._link_name(path.name, obj)
+
+        # 工作区中的文件换成缓存对象的链接
+        linked, saved = 0, 0
+        if not os.path.samestat(obj.stat(), stat):
+            tmp = path.with_name(f".{path.name}.cache")
+            if tmp.is_symlink() or tmp.exists():
+                tmp.unlink()
+            try:
+                os.link(obj, tmp)
+            except OSError:
+                os.symlink(obj, tmp)
+            os.replace(tmp, path)
+            linked, saved = 1, stat.st_size
+
+        return sha256, added, linked, saved
+
+    def _link_name(self, name: str, obj: Path):
+        """更新 by-name 中的符号链接（同名文件以最近收入的内容为准）"""
+        link = self.names_dir / name
+        relative = os.path.relpath(obj, self.names_dir)
+        try:
+            if os.readlink(link) == relative:
+                return
+        except OSError:
+            pass
+        tmp = self.names_dir / f".{name}.tmp"
+        if tmp.is_symlink():
+            tmp.unlink()
+        os.symlink(relative, tmp)
+        os.replace(tmp, link)
+
+    def _touch(self, sha256s: List[str], now: float):
+        """记录源码包的使用时间"""
+        if not sha256s:
+            return
+        with self._lock:
+            self._conn.executemany("UPDATE objects SET last_used = ? WHERE sha256 = ?",
+                                   [(now, sha256) for sha256 in sha256s])
+            self._conn.commit()
+
+    def evict(self) -> int:
+        """
+        超过大小上限时按最近使用时间淘汰源码包
+
+        工作区中的硬链接不受影响，被淘汰的文件在所有工作区都删除后才真正释放空间。
+
+        Returns:
+            int: 淘汰的源码包数
+        """
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+            if total <= self.max_size:
+                return 0
+            rows = self._conn.execute(
+                "SELECT sha256, name, size FROM objects ORDER BY last_used").fetchall()
+
+        evicted = []
+        for row in rows:
+            if total <= self.max_size:
+                break
+            obj = self._object_path(row["sha256"])
+            link = self.names_dir / row["name"]
+            try:
+                if os.readlink(link) == os.path.relpath(obj, self.names_dir):
+                    link.unlink()
+            except OSError:
+                pass
+            try:
+                obj.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self._log("warning", f"淘汰下载缓存失败 {row['name']}: {e}")
+                continue
+            evicted.append(row["sha256"])
+            total -= row["size"]
+
+        with self._lock:
+            self._conn.executemany("DELETE FROM objects WHERE sha256 = ?", [(sha256,) for sha256 in evicted])
+            self._conn.commit()
+
+        if evicted:
+            self._log("info", f"下载缓存淘汰 {len(evicted)} 个最久未使用的源码包")
+        return len(evicted)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计
+
+        Returns:
+            dict: cache_dir、objects、size_bytes、max_size_bytes
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects").fetchone()
+        return {
+            "cache_dir": str(self.cache_dir),
+            "objects": row[0],
+            "size_bytes": row[1],
+            "max_size_bytes": self.max_size
+        }
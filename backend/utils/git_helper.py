@@ -5,7 +5,7 @@ Git操作辅助工具
 import os
 import subprocess
 from pathlib import Path
-from typing import Optional, Tuple, Callable
+from typing import Optional, Tuple, Callable, List
 import git
 from git import Repo, GitCommandError
 
@@ -33,7 +33,8 @@ class GitHelper:
                         repo_url: str,
                         target_dir,
                         branch: str = None,
-                        progress_callback: Optional[Callable] = None) -> Tuple[bool, str]:
+                        progress_callback: Optional[Callable] = None,
+                        shared: bool = False) -> Tuple[bool, str]:
         """
         克隆Git仓库
         
@@ -42,6 +43,7 @@ class GitHelper:
             target_dir: 目标目录
             branch: 分支名称（可选）
             progress_callback: 进度回调函数
+            shared: repo_url 为本地仓库时通过 alternates 共享其对象库（git clone --shared）
         
         Returns:
             Tuple[bool, str]: (是否成功, 消息)
@@ -72,6 +74,9 @@ class GitHelper:
             if branch:
                 clone_kwargs['branch'] = branch
                 self._log("info", f"指定分支: {branch}")
+
+            if shared:
+                clone_kwargs['shared'] = True
             
             repo = Repo.clone_from(repo_url, target_dir, **clone_kwargs)
             
@@ -177,6 +182,56 @@ class GitHelper:
             self._log("error", f"获取仓库信息失败: {e}")
             return None
     
+    def get_head_commit(self, repo_dir: Path) -> Optional[str]:
+        """
+        获取仓库当前提交的完整哈希
+        
+        Args:
+            repo_dir: 仓库目录
+        
+        Returns:
+            str: 提交哈希，不是有效仓库时返回None
+        """
+        try:
+            return Repo(repo_dir).head.commit.hexsha
+        except Exception as e:
+            self._log("warning", f"获取仓库提交失败 {repo_dir}: {e}")
+            return None
+    
+    def is_dirty(self, repo_dir: Path) -> bool:
+        """
+        检查仓库中已跟踪的文件是否有未提交的修改（未跟踪的文件不计入）
+        
+        Args:
+            repo_dir: 仓库目录
+        
+        Returns:
+            bool: 是否有修改，无法判断时返回True
+        """
+        try:
+            return Repo(repo_dir).is_dirty(untracked_files=False)
+        except Exception as e:
+            self._log("warning", f"检查仓库状态失败 {repo_dir}: {e}")
+            return True
+    
+    def list_untracked_files(self, repo_dir: Path, paths=()) -> Optional[List[str]]:
+        """
+        列出仓库中未跟踪的文件（包括 .gitignore 忽略的文件）
+        
+        Args:
+            repo_dir: 仓库目录
+            paths: 只列出这些路径下的文件，为空时列出整个仓库
+        
+        Returns:
+            list: 相对仓库目录的文件路径，无法判断时返回None
+        """
+        try:
+            output = Repo(repo_dir).git.ls_files("--others", "-z", "--", *paths)
+            return [path for path in output.split("\0") if path]
+        except Exception as e:
+            self._log("warning", f"列出未跟踪文件失败 {repo_dir}: {e}")
+            return None
+    
     def check_repository_exists(self, repo_dir: Path) -> bool:
         """
         检查仓库是否存在
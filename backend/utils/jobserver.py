@@ -0,0 +1,348 @@
+"""
+全局 GNU make jobserver
+后端持有一个按机器核数填充令牌的命名管道，通过 MAKEFLAGS 传给启动的每个 make，
+所有并发编译共享同一组令牌，总编译进程数不超过核数，单个编译也能用满空闲的核
+"""
+
+import os
+import re
+import json
+import stat
+import fcntl
+import select
+import termios
+import struct
+import threading
+import subprocess
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, Tuple
+
+
+def detect_jobserver_style() -> str:
+    """
+    根据 make 版本选择 jobserver 传递方式
+
+    GNU make 4.4 起支持 --jobserver-auth=fifo:PATH，子进程不需要继承文件描述符；
+    更早的版本只支持继承的读写描述符 --jobserver-auth=R,W。
+
+    Returns:
+        str: "fifo" 或 "fds"
+    """
+    try:
+        output = subprocess.run(["make", "--version"], capture_output=True, text=True,
+                                timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return "fds"
+
+    match = re.search(r"GNU Make (\d+)\.(\d+)", output)
+    if match and (int(match.group(1)), int(match.group(2))) >= (4, 4):
+        return "fifo"
+    return "fds"
+
+
+class MakeJobserver:
+    """
+    make jobserver 令牌池
+
+    每个 make 自带一个不需要令牌的隐含任务槽，所以后端在每个编译开始时先替它取走一个令牌并持有到编译结束，
+    管道中初始放入 jobs 个令牌，任何时刻所有编译的并发任务总数不超过 jobs。
+
+    后端持有的令牌按持有者计数并保存到状态文件，后端重启后仍在运行的编译不会让令牌凭空消失。
+    被强制终止的 make 来不及归还已取走的令牌，没有 make 使用令牌池时由 reconcile 补回。
+    """
+
+    TOKEN = b"+"
+
+    def __init__(self, fifo_path: Path, jobs: int, logger=None, style: Optional[str] = None):
+        """
+        初始化 jobserver
+
+        Args:
+            fifo_path: 命名管道路径（后端重启后仍在运行的 make 继续使用同一个管道）
+            jobs: 令牌总数（所有编译共享的并发上限）
+            logger: 日志记录器
+            style: 传递方式（fifo/fds），为空时根据 make 版本自动选择
+        """
+        self.fifo_path = Path(fifo_path)
+        self.state_file = self.fifo_path.with_suffix(".state")
+        self.jobs = max(1, int(jobs))
+        self.logger = logger
+        self.style = style or detect_jobserver_style()
+
+        self._lock = threading.Lock()
+        self._held: Dict[str, int] = {}
+        # 后端读写管道和更新持有数时加锁，reconcile 时管道中的令牌与持有数一致
+        self._pipe_lock = threading.Lock()
+
+        # 后端自己取放令牌用的描述符（非阻塞）
+        self._read_fd: Optional[int] = None
+        self._write_fd: Optional[int] = None
+        # 传给子进程的描述符（单独打开，阻塞模式，与上面的描述符互不影响）
+        self._child_fds: Tuple[int, ...] = ()
+
+    def _log(self, level: str, message: str):
+        """记录日志"""
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    def open(self, reset: bool = True):
+        """
+        创建（或打开已有的）命名管道
+
+        Args:
+            reset: 重新填充令牌；后端重启时仍有编译进程在运行则应为False，
+                   此时管道中的令牌由这些 make 持有或归还，不能清空
+        """
+        self.fifo_path.parent.mkdir(parents=True, exist_ok=True)
+        exists = self.fifo_path.exists() and stat.S_ISFIFO(self.fifo_path.stat().st_mode)
+        if reset or not exists:
+            if self.fifo_path.exists():
+                self.fifo_path.unlink()
+            os.mkfifo(self.fifo_path, 0o600)
+            reset = True
+
+        # 先以非阻塞方式打开读端，再打开写端不会阻塞
+        self._read_fd = os.open(self.fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+        self._write_fd = os.open(self.fifo_path, os.O_WRONLY)
+
+        if self.style == "fds":
+            child_read = os.open(self.fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+            os.set_blocking(child_read, True)
+            child_write = os.open(self.fifo_path, os.O_WRONLY)
+            self._child_fds = (child_read, child_write)
+
+        if reset:
+            self._drain()
+            os.write(self._write_fd, self.TOKEN * self.jobs)
+            self._save_state()
+        else:
+            self._load_state()
+
+        self._log("info", f"make jobserver 已就绪: {self.jobs} 个令牌 ({self.style}: {self.fifo_path})")
+
+    def _load_state(self):
+        """加载上一个后端进程持有令牌的记录（这些令牌已随进程退出丢失，归还时补回）"""
+        try:
+            held = json.loads(self.state_file.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            self._held = {owner: int(count) for owner, count in held.items() if int(count) > 0}
+
+    def _save_state(self):
+        """保存各持有者持有的令牌数"""
+        with self._lock:
+            held = dict(self._held)
+        try:
+            tmp = self.state_file.with_suffix(".tmp")
+            tmp.write_text(json.dumps(held), encoding='utf-8')
+            os.replace(tmp, self.state_file)
+        except OSError as e:
+            self._log("warning", f"保存 jobserver 状态失败: {e}")
+
+    def _drain(self) -> int:
+        """清空管道中残留的令牌，返回清出的令牌数"""
+        drained = 0
+        while True:
+            try:
+                data = os.read(self._read_fd, 4096)
+            except BlockingIOError:
+                return drained
+            if not data:
+                return drained
+            drained += len(data)
+
+    def makeflags(self) -> str:
+        """
+        传给 make 的 MAKEFLAGS
+
+        命令行上不能再带 -jN，否则 make 会忽略 jobserver 自建令牌池。
+
+        Returns:
+            str: MAKEFLAGS 值
+        """
+        if self.style == "fifo":
+            auth = f"fifo:{self.fifo_path}"
+        else:
+            auth = f"{self._child_fds[0]},{self._child_fds[1]}"
+        return f"-j{self.jobs} --jobserver-auth={auth}"
+
+    def env(self) -> Dict[str, str]:
+        """启动 make 时需要的环境变量"""
+        return {"MAKEFLAGS": self.makeflags()}
+
+    def pass_fds(self) -> Tuple[int, ...]:
+        """需要子进程继承的文件描述符（fifo 方式为空）"""
+        return self._child_fds
+
+    def _read_tokens(self, count: int) -> int:
+        """非阻塞地从管道取走最多 count 个令牌"""
+        try:
+            return len(os.read(self._read_fd, count))
+        except BlockingIOError:
+            return 0
+
+    def _add_held(self, owner: str, count: int):
+        if count <= 0:
+            return
+        with self._lock:
+            self._held[owner] = self._held.get(owner, 0) + count
+        self._save_state()
+
+    def _take(self, owner: str, count: int) -> int:
+        """非阻塞地取走最多 count 个令牌并记到持有者名下"""
+        if count <= 0:
+            return 0
+        with self._pipe_lock:
+            got = self._read_tokens(count)
+            self._add_held(owner, got)
+        return got
+
+    def acquire(self, owner: str, count: int = 1, timeout: float = 30) -> int:
+        """
+        为即将启动的 make 取走令牌
+
+        加入共享令牌池的 make 只需取一个（抵消其隐含任务槽）；使用独立 -jN 的 make 取 N 个，
+        从共享池中划出固定份额。第一个令牌最多等待 timeout 秒，其余令牌只取当前可用的。
+
+        Args:
+            owner: 持有者（任务ID）
+            count: 需要的令牌数
+            timeout: 等待第一个令牌的最长时间（秒）
+
+        Returns:
+            int: 实际取得的令牌数（超时为0，本次编译暂时多占一个槽位）
+        """
+        with self._lock:
+            held = self._held.get(owner, 0)
+        if held >= count:
+            return held
+
+        deadline = time.time() + timeout
+        got = self._take(owner, count - held)
+        while not got and not held:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self._log("warning", f"等待 jobserver 令牌超时: {owner}，本次编译不占用令牌启动")
+                return 0
+            select.select([self._read_fd], [], [], min(remaining, 1.0))
+            got = self._take(owner, count)
+
+        return held + got
+
+    def try_acquire(self, owner: str, count: int = 1) -> int:
+        """
+        不等待地取走最多 count 个令牌
+
+        Args:
+            owner: 持有者
+            count: 需要的令牌数
+
+        Returns:
+            int: 实际取得的令牌数
+        """
+        return self._take(owner, count)
+
+    def adopt(self, owner: str, count: int = 1):
+        """
+        登记后端重启前已取走令牌的编译任务（状态文件中已有记录时不变）
+
+        上一个后端进程持有的令牌随进程退出丢失，任务结束时 release 补回，令牌总数保持不变。
+
+        Args:
+            owner: 持有者（任务ID）
+            count: 持有的令牌数
+        """
+        with self._lock:
+            if owner in self._held:
+                return
+            self._held[owner] = count
+        self._save_state()
+
+    def held(self, owner: str) -> int:
+        """持有者当前持有的令牌数"""
+        with self._lock:
+            return self._held.get(owner, 0)
+
+    def owners(self) -> Dict[str, int]:
+        """所有持有者及其令牌数"""
+        with self._lock:
+            return dict(self._held)
+
+    def release(self, owner: str, count: Optional[int] = None):
+        """
+        归还令牌（可重复调用）
+
+        Args:
+            owner: 持有者（任务ID）
+            count: 归还的令牌数（None表示全部）
+        """
+        with self._pipe_lock:
+            with self._lock:
+                held = self._held.get(owner, 0)
+                count = held if count is None else min(count, held)
+                if count <= 0:
+                    return
+                if held - count > 0:
+                    self._held[owner] = held - count
+                else:
+                    del self._held[owner]
+            os.write(self._write_fd, self.TOKEN * count)
+        self._save_state()
+
+    def reconcile(self) -> int:
+        """
+        重新填充令牌池：清空管道后放入 jobs - 后端持有数 个令牌
+
+        make 被 SIGKILL 等方式终止时，它从管道中取走的令牌不会归还，令牌池会越来越小。
+        只能在没有 make 使用令牌池（没有运行中的共享令牌编译）时调用，否则会清走 make 正在归还的令牌。
+
+        Returns:
+            int: 补回的令牌数（负数表示管道中多出的令牌被清除）
+        """
+        with self._pipe_lock:
+            available = self._drain()
+            with self._lock:
+                expected = max(0, self.jobs - sum(self._held.values()))
+            if expected:
+                os.write(self._write_fd, self.TOKEN * expected)
+        restored = expected - available
+        if restored:
+            self._log("warning" if restored > 0 else "info",
+                      f"jobserver 令牌池已重新填充: 管道中 {available} 个，应有 {expected} 个")
+        return restored
+
+    def available(self) -> int:
+        """管道中当前可用的令牌数"""
+        try:
+            data = fcntl.ioctl(self._read_fd, termios.FIONREAD, struct.pack("i", 0))
+            return struct.unpack("i", data)[0]
+        except OSError:
+            return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取令牌使用情况
+
+        Returns:
+            dict: jobs、available、busy（已被取走的令牌数，含后端替各 make 持有的）、holders、style
+        """
+        return {
+            "jobs": self.jobs,
+            "available": self.available(),
+            "busy": max(0, self.jobs - self.available()),
+            "holders": self.owners(),
+            "style": self.style
+        }
+
+    def close(self):
+        """关闭描述符（命名管道保留，仍在运行的 make 不受影响）"""
+        for fd in (self._read_fd, self._write_fd) + self._child_fds:
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._read_fd = self._write_fd = None
+        self._child_fds = ()
@@ -3,15 +3,24 @@
 """
 
 import os
+import json
+import shlex
+import selectors
 import subprocess
 import threading
 import time
 import signal
 import psutil
-from typing import Optional, Callable, Dict, Any
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional, Callable, Dict, Any, List
 from pathlib import Path
 from queue import Queue, Empty
 from enum import Enum
+from collections import deque
+
+
+# 每次从管道或日志文件读取的字节数
+READ_CHUNK_SIZE = 65536
 
 
 class ProcessStatus(Enum):
@@ -24,245 +33,1304 @@ class ProcessStatus(Enum):
     TIMEOUT = "timeout"
 
 
+def split_lines(buffer: bytes, chunk: bytes):
+    """
+    将新读取的数据块拼接到未完成的行后按行拆分
+
+    Args:
+        buffer: 上次剩余的不完整行
+        chunk: 新读取的数据
+
+    Returns:
+        tuple: (完整行列表, 剩余的不完整行)
+    """
+    *lines, rest = (buffer + chunk).split(b"\n")
+    return lines, rest
+
+
+def decode_lines(lines: List[bytes]) -> List[str]:
+    """
+    批量解码输出行，无效的UTF-8字节替换为占位符
+
+    整批拼接后只解码一次；换行符不会出现在UTF-8多字节序列中，因此可以安全地再次拆分。
+
+    Args:
+        lines: 未解码的输出行
+
+    Returns:
+        list: 解码后的行
+    """
+    text = b"\n".join(lines).decode('utf-8', errors='replace')
+    decoded = text.split("\n")
+    if "\r" in text:
+        decoded = [line.rstrip("\r") for line in decoded]
+    return decoded
+
+
+class OutputReactor:
+    """
+    输出反应器：单个线程通过selectors复用所有子进程的输出管道和可重连进程的日志文件
+
+    每次可读时读取一整块数据并按行拆分，整批交给处理函数，
+    避免每个进程一个读取线程、每行一次加锁。普通文件无法用selectors等待，
+    日志文件在每轮循环中轮询。处理函数返回False时暂停读取该进程（管道从selector中注销，
+    子进程写满管道后阻塞），直到调用 resume。
+    """
+
+    # 轮询可重连进程日志文件的间隔（秒）
+    FILE_POLL_INTERVAL = 0.2
+
+    # 每轮从单个日志文件读取的块数上限，积压很多的日志不会长期占用反应器
+    FILE_CHUNKS_PER_POLL = 16
+
+    def __init__(self, on_lines: Callable[[str, List[bytes], Optional[int]], bool],
+                 on_closed: Callable[[str], None], log: Callable[[str, str], None]):
+        """
+        初始化输出反应器
+
+        Args:
+            on_lines: 批量行处理函数，参数为 (process_id, 行列表, 日志偏移量)，管道的偏移量为None；
+                      返回False时暂停读取该进程
+            on_closed: 管道关闭或日志读完的处理函数，参数为 process_id
+            log: 日志函数
+        """
+        self._on_lines = on_lines
+        self._on_closed = on_closed
+        self._log = log
+
+        self._selector = selectors.DefaultSelector()
+        self._pending: Queue = Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+        # 以下状态只在反应器线程中访问
+        self._streams: Dict[str, Dict[str, Any]] = {}
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._files_backlog = False
+
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+
+    def register(self, process_id: str, pipe):
+        """
+        注册子进程输出管道（二进制模式）
+
+        Args:
+            process_id: 进程ID
+            pipe: 子进程stdout
+        """
+        os.set_blocking(pipe.fileno(), False)
+        self._call_soon(self._add_pipe, process_id, pipe)
+
+    def register_file(self, process_id: str, path: str, offset: int, exited: threading.Event):
+        """
+        注册可重连进程的日志文件，从偏移量开始跟踪新增内容，进程退出后读完剩余输出
+
+        Args:
+            process_id: 进程ID
+            path: 日志文件（可能尚未被shell创建）
+            offset: 开始读取的偏移量
+            exited: 进程退出事件
+        """
+        self._call_soon(self._add_file, process_id, path, offset, exited)
+
+    def resume(self, process_id: str):
+        """恢复读取被暂停的进程输出（可在任意线程调用）"""
+        self._call_soon(self._resume, process_id)
+
+    def _call_soon(self, func: Callable, *args):
+        """在反应器线程中执行（selector不是线程安全的），首次调用时启动反应器线程"""
+        self._pending.put((func, args))
+
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name="process-output-reactor", daemon=True
+                )
+                self._thread.start()
+
+        try:
+            os.write(self._wakeup_w, b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    def _run_pending(self):
+        """执行其他线程提交的注册和恢复请求"""
+        try:
+            os.read(self._wakeup_r, 4096)
+        except BlockingIOError:
+            pass
+
+        while True:
+            try:
+                func, args = self._pending.get_nowait()
+            except Empty:
+                break
+            func(*args)
+
+    def _add_pipe(self, process_id: str, pipe):
+        state = {"process_id": process_id, "pipe": pipe, "buffer": b"", "paused": False}
+        self._streams[process_id] = state
+        self._selector.register(pipe.fileno(), selectors.EVENT_READ, state)
+
+    def _add_file(self, process_id: str, path: str, offset: int, exited: threading.Event):
+        state = {"process_id": process_id, "path": path, "file": None, "offset": offset,
+                 "exited": exited, "buffer": b"", "paused": False}
+        self._streams[process_id] = state
+        self._files[process_id] = state
+
+    def _resume(self, process_id: str):
+        state = self._streams.get(process_id)
+        if not state or not state["paused"]:
+            return
+        state["paused"] = False
+        if "pipe" in state:
+            self._selector.register(state["pipe"].fileno(), selectors.EVENT_READ, state)
+        else:
+            self._files_backlog = True
+
+    def _pause(self, state: Dict[str, Any]):
+        state["paused"] = True
+        if "pipe" in state:
+            self._selector.unregister(state["pipe"].fileno())
+
+    def _loop(self):
+        """反应器主循环"""
+        while True:
+            try:
+                timeout = None
+                if self._files:
+                    timeout = 0 if self._files_backlog else self.FILE_POLL_INTERVAL
+                for key, _ in self._selector.select(timeout):
+                    if key.data is None:
+                        self._run_pending()
+                    else:
+                        self._read(key.fd, key.data)
+                self._files_backlog = False
+                for state in list(self._files.values()):
+                    if not state["paused"]:
+                        self._poll_file(state)
+            except Exception as e:
+                self._log("error", f"输出反应器错误: {e}")
+
+    def _read(self, fd: int, state: Dict[str, Any]):
+        """读取一块数据并分发完整的行"""
+        try:
+            chunk = os.read(fd, READ_CHUNK_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            chunk = b""
+
+        if chunk:
+            lines, state["buffer"] = split_lines(state["buffer"], chunk)
+            if lines and not self._on_lines(state["process_id"], lines, None):
+                self._pause(state)
+            return
+
+        # EOF：分发最后不完整的一行并注销
+        self._selector.unregister(fd)
+        state["pipe"].close()
+        del self._streams[state["process_id"]]
+        if state["buffer"]:
+            self._on_lines(state["process_id"], [state["buffer"]], None)
+        self._on_closed(state["process_id"])
+
+    def _poll_file(self, state: Dict[str, Any]):
+        """读取一个日志文件，读取失败时停止跟踪"""
+        try:
+            if self._read_file(state):
+                self._files_backlog = True
+        except OSError as e:
+            self._log("error", f"跟踪进程日志失败 {state['process_id']}: {e}")
+            self._close_file(state)
+
+    def _read_file(self, state: Dict[str, Any]) -> bool:
+        """
+        读取日志文件新增的内容并分发完整的行
+
+        Returns:
+            bool: 达到单轮读取上限、文件中可能还有未读的内容
+        """
+        if state["file"] is None:
+            try:
+                state["file"] = open(state["path"], 'rb')
+                state["file"].seek(state["offset"])
+            except FileNotFoundError:
+                # 日志文件尚未被shell创建；进程已退出仍没有日志则没有输出
+                if state["exited"].is_set():
+                    self._close_file(state)
+                return False
+
+        for _ in range(self.FILE_CHUNKS_PER_POLL):
+            # 先检查退出再读取：退出后读到文件末尾即为全部输出
+            exited = state["exited"].is_set()
+            chunk = state["file"].read(READ_CHUNK_SIZE)
+            if not chunk:
+                if exited:
+                    self._close_file(state)
+                return False
+
+            pending = len(state["buffer"]) + len(chunk)
+            lines, state["buffer"] = split_lines(state["buffer"], chunk)
+            state["offset"] += pending - len(state["buffer"])
+            if lines and not self._on_lines(state["process_id"], lines, state["offset"]):
+                self._pause(state)
+                return False
+        return True
+
+    def _close_file(self, state: Dict[str, Any]):
+        """日志读完：分发最后不完整的一行并停止跟踪"""
+        process_id = state["process_id"]
+        if state["file"] is not None:
+            state["file"].close()
+        del self._files[process_id]
+        del self._streams[process_id]
+        if state["buffer"]:
+            state["offset"] += len(state["buffer"])
+            self._on_lines(process_id, [state["buffer"]], state["offset"])
+        self._on_closed(process_id)
+
+
+class OutputDelivery:
+    """
+    输出投递：按进程排队，由线程池依次调用处理函数
+
+    反应器线程只负责读取；处理函数（写任务日志、推送事件、保存任务状态）较慢时
+    只会积压该进程的队列，不会阻塞其他进程的输出读取。同一进程的批次按顺序投递，
+    关闭通知排在最后一批之后。队列超过上限时 lines 返回False，由反应器暂停读取该进程，
+    队列消化到恢复线以下后调用 on_drained 恢复读取，积压的内存不会无限增长。
+    """
+
+    # 每次连续投递的批次数上限，之后重新排队，避免输出很多的进程长期占用线程
+    MAX_BATCHES_PER_TURN = 64
+
+    # 单个进程排队的批次数上限（每批最多 READ_CHUNK_SIZE 字节）和恢复读取的阈值
+    MAX_QUEUED_BATCHES = 256
+    RESUME_QUEUED_BATCHES = 64
+
+    def __init__(self, on_lines: Callable[[str, List[bytes], Optional[int]], None],
+                 on_closed: Callable[[str], None], log: Callable[[str, str], None], workers: int = 4,
+                 on_drained: Optional[Callable[[str], None]] = None):
+        """
+        初始化输出投递
+
+        Args:
+            on_lines: 批量行处理函数，参数为 (process_id, 行列表, 日志偏移量)
+            on_closed: 关闭处理函数，参数为 process_id
+            log: 日志函数
+            workers: 投递线程数
+            on_drained: 暂停读取的进程队列消化后调用，参数为 process_id
+        """
+        self._on_lines = on_lines
+        self._on_closed = on_closed
+        self._on_drained = on_drained
+        self._log = log
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="process-output")
+        self._queues: Dict[str, deque] = {}
+        self._paused = set()
+        self._lock = threading.Lock()
+
+    def lines(self, process_id: str, lines: List[bytes], offset: Optional[int] = None) -> bool:
+        """
+        排队一批输出行
+
+        Returns:
+            bool: 是否可以继续读取该进程的输出（队列超过上限时返回False）
+        """
+        return self._put(process_id, (lines, offset))
+
+    def closed(self, process_id: str):
+        """排队关闭通知"""
+        self._put(process_id, None)
+
+    def busy(self, process_id: str) -> bool:
+        """该进程是否还有未投递的输出"""
+        with self._lock:
+            return process_id in self._queues
+
+    def _put(self, process_id: str, item) -> bool:
+        with self._lock:
+            queue = self._queues.get(process_id)
+            # 已有投递任务在处理该进程时只需排队
+            submit = queue is None
+            if submit:
+                queue = self._queues[process_id] = deque()
+            queue.append(item)
+            accept = len(queue) < self.MAX_QUEUED_BATCHES
+            if not accept:
+                self._paused.add(process_id)
+        if submit:
+            self._executor.submit(self._drain, process_id)
+        return accept
+
+    def _drain(self, process_id: str):
+        """按顺序投递一个进程排队的批次"""
+        for _ in range(self.MAX_BATCHES_PER_TURN):
+            resume = False
+            with self._lock:
+                queue = self._queues[process_id]
+                if not queue:
+                    del self._queues[process_id]
+                    return
+                item = queue.popleft()
+                if process_id in self._paused and len(queue) <= self.RESUME_QUEUED_BATCHES:
+                    self._paused.discard(process_id)
+                    resume = True
+            if resume and self._on_drained:
+                self._on_drained(process_id)
+            try:
+                if item is None:
+                    self._on_closed(process_id)
+                else:
+                    self._on_lines(process_id, *item)
+            except Exception as e:
+                self._log("error", f"投递进程输出失败 {process_id}: {e}")
+        self._executor.submit(self._drain, process_id)
+
+
 class ProcessManager:
     """进程管理器"""
-    
-    def __init__(self, logger=None):
+
+    # reactor 方式下调用输出回调的线程数
+    OUTPUT_DELIVERY_WORKERS = 4
+
+    # 不支持pidfd时回收线程的轮询间隔（秒）
+    REAPER_POLL_INTERVAL = 0.1
+
+    # 进程退出后等待输出读完的最长时间（后台子进程可能一直占用输出管道）
+    OUTPUT_DRAIN_TIMEOUT = 5
+
+    # 内部字段，不返回给调用方
+    PRIVATE_FIELDS = ("process", "output_callback", "batch_output_callback", "future",
+                      "exited", "output_closed", "finished")
+
+    # 输出读取方式：reactor 单线程复用所有管道，threads 每个进程一个读取线程
+    IO_BACKENDS = ("reactor", "threads")
+
+    def __init__(self, logger=None, state_dir: Optional[Path] = None,
+                 io_backend: str = "reactor", output_buffer_lines: int = 1000,
+                 cgroup_manager=None):
         """
         初始化进程管理器
-        
+
         Args:
             logger: 日志记录器
+            state_dir: 可重连进程的状态目录（PID、进程组、日志及偏移量），为空时不支持重连
+            io_backend: 输出读取方式（reactor/threads）
+            output_buffer_lines: 每个进程在内存中保留的最近输出行数（完整日志由调用方通过回调保存）
+            cgroup_manager: cgroup v2 管理器（CgroupManager），为空时 start_process 的 cgroup 参数无效
         """
+        if io_backend not in self.IO_BACKENDS:
+            raise ValueError(f"不支持的输出读取方式: {io_backend}")
+
         self.logger = logger
+        self.io_backend = io_backend
+        self.output_buffer_lines = max(1, int(output_buffer_lines))
+        self.cgroup_manager = cgroup_manager
         self.processes: Dict[str, Dict[str, Any]] = {}
         self._lock = threading.Lock()
-    
+
+        self.state_dir = Path(state_dir) if state_dir else None
+        if self.state_dir:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+
+        # 统一的子进程回收线程（按需启动）
+        self._reaper_thread = None
+        self._reaper_watches: Dict[str, Dict[str, Any]] = {}
+        self._drain_deadlines: Dict[str, float] = {}
+        self._reaper_lock = threading.Lock()
+        self._reaper_wakeup_r, self._reaper_wakeup_w = os.pipe()
+        os.set_blocking(self._reaper_wakeup_w, False)
+
+        self._reactor = None
+        self._delivery = None
+        if io_backend == "reactor":
+            # 反应器线程只读取管道和日志文件，回调在投递线程中执行
+            self._delivery = OutputDelivery(self._deliver_lines, self._deliver_closed, self._log,
+                                            self.OUTPUT_DELIVERY_WORKERS,
+                                            on_drained=lambda process_id: self._reactor.resume(process_id))
+            self._reactor = OutputReactor(self._delivery.lines, self._delivery.closed, self._log)
+
     def _log(self, level: str, message: str):
         """记录日志"""
         if self.logger:
             getattr(self.logger, level.lower())(message)
         else:
             print(f"[{level.upper()}] {message}")
-    
-    def start_process(self, 
+
+    def _new_process_info(self, process, command: str, cwd: Optional[str],
+                          output_callback: Optional[Callable],
+                          batch_output_callback: Optional[Callable],
+                          timeout: Optional[int], start_time: float) -> Dict[str, Any]:
+        """创建进程信息记录"""
+        return {
+            "process": process,
+            "status": ProcessStatus.RUNNING,
+            "command": command,
+            "cwd": cwd,
+            "start_time": start_time,
+            "end_time": None,
+            "output_callback": output_callback,
+            "batch_output_callback": batch_output_callback,
+            "timeout": timeout,
+            "output_lines": deque(maxlen=self.output_buffer_lines),
+            "return_code": None,
+            "future": Future(),
+            "exited": threading.Event(),
+            "output_closed": False,
+            "finished": False
+        }
+
+    def start_process(self,
                      process_id: str,
                      command: str,
                      cwd: Optional[Path] = None,
                      env: Optional[Dict[str, str]] = None,
                      output_callback: Optional[Callable] = None,
-                     timeout: Optional[int] = None) -> bool:
+                     timeout: Optional[int] = None,
+                     persistent: bool = False,
+                     batch_output_callback: Optional[Callable] = None,
+                     cgroup: Optional[Dict[str, Any]] = None,
+                     pass_fds: tuple = ()) -> bool:
         """
         启动进程
-        
+
         Args:
             process_id: 进程ID
             command: 命令
             cwd: 工作目录
             env: 环境变量
-            output_callback: 输出回调函数
+            output_callback: 输出回调函数，每行调用一次，参数为 (process_id, 行)
             timeout: 超时时间（秒）
-        
+            persistent: 是否可在后端重启后重连（输出写入日志文件，进程独立于后端运行）
+            batch_output_callback: 批量输出回调函数，每批调用一次，参数为 (process_id, 行列表)；
+                                   输出量大时应优先使用
+            cgroup: 在独立的 cgroup v2 子组中运行整个进程树，可包含 cpu_weight、memory_max、io_weight；
+                    cgroup 不可用时照常启动
+            pass_fds: 子进程需要继承的文件描述符（例如 make jobserver 管道）
+
         Returns:
             bool: 是否启动成功
         """
+        if persistent and self.state_dir:
+            return self._start_persistent_process(
+                process_id, command, cwd, env, output_callback, batch_output_callback, timeout,
+                cgroup, pass_fds
+            )
+
         try:
             with self._lock:
                 if process_id in self.processes:
                     self._log("warning", f"进程 {process_id} 已存在")
                     return False
-            
+
             self._log("info", f"启动进程: {process_id}")
             self._log("info", f"命令: {command}")
             self._log("info", f"工作目录: {cwd}")
-            
+
             # 准备环境变量
             process_env = os.environ.copy()
             if env:
                 process_env.update(env)
-            
-            # 启动进程
+
+            cgroup_path = self._create_cgroup(process_id, cgroup)
+            wrapped = f"{self.cgroup_manager.enter_command(cgroup_path)}; {command}" if cgroup_path else command
+
+            # 启动进程（以二进制读取，按块拆分和解码）
             process = subprocess.Popen(
-                command,
+                wrapped,
                 shell=True,
                 cwd=str(cwd) if cwd else None,
                 env=process_env,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
-                universal_newlines=True,
-                bufsize=1
+                bufsize=0,
+                pass_fds=pass_fds
             )
-            
-            # 创建输出队列
-            output_queue = Queue()
-            
+
             # 存储进程信息
-            process_info = {
-                "process": process,
-                "status": ProcessStatus.RUNNING,
-                "command": command,
-                "cwd": str(cwd) if cwd else None,
-                "start_time": time.time(),
-                "end_time": None,
-                "output_queue": output_queue,
-                "output_callback": output_callback,
-                "timeout": timeout,
-                "output_lines": []
-            }
-            
+            process_info = self._new_process_info(
+                process, command, str(cwd) if cwd else None,
+                output_callback, batch_output_callback, timeout, time.time()
+            )
+            process_info["cgroup"] = str(cgroup_path) if cgroup_path else None
+
             with self._lock:
                 self.processes[process_id] = process_info
-            
-            # 启动输出读取线程
-            output_thread = threading.Thread(
-                target=self._read_output,
-                args=(process_id, process, output_queue, output_callback),
-                daemon=True
+
+            if self._reactor:
+                self._reactor.register(process_id, process.stdout)
+            else:
+                # 启动输出读取线程
+                output_thread = threading.Thread(
+                    target=self._read_output,
+                    args=(process_id, process),
+                    daemon=True
+                )
+                output_thread.start()
+
+            # 交给回收线程监控进程退出和超时
+            self._watch_process(process_id, process.pid, process, timeout, process_info["start_time"])
+
+            return True
+
+        except Exception as e:
+            self._log("error", f"启动进程失败: {e}")
+            return False
+
+    def _state_files(self, process_id: str) -> Dict[str, Path]:
+        """可重连进程的状态、日志和退出码文件路径"""
+        return {
+            "state": self.state_dir / f"{process_id}.json",
+            "log": self.state_dir / f"{process_id}.log",
+            "exit": self.state_dir / f"{process_id}.exit"
+        }
+
+    def _save_state(self, process_id: str):
+        """保存可重连进程的状态（PID、进程组、日志偏移量）"""
+        with self._lock:
+            info = self.processes.get(process_id)
+            if not info or not info.get("persistent"):
+                return
+            state = {
+                "process_id": process_id,
+                "pid": info["pid"],
+                "pgid": info["pgid"],
+                "command": info["command"],
+                "cwd": info["cwd"],
+                "start_time": info["start_time"],
+                "timeout": info["timeout"],
+                "log_file": info["log_file"],
+                "log_offset": info["log_offset"],
+                "cgroup": info.get("cgroup")
+            }
+
+        state_file = self._state_files(process_id)["state"]
+        try:
+            tmp_file = state_file.with_suffix(".tmp")
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_file, state_file)
+        except OSError as e:
+            self._log("error", f"保存进程状态失败 {process_id}: {e}")
+
+    def _start_persistent_process(self, process_id: str, command: str,
+                                  cwd: Optional[Path], env: Optional[Dict[str, str]],
+                                  output_callback: Optional[Callable],
+                                  batch_output_callback: Optional[Callable],
+                                  timeout: Optional[int],
+                                  cgroup: Optional[Dict[str, Any]] = None,
+                                  pass_fds: tuple = ()) -> bool:
+        """
+        启动可重连进程
+
+        进程在独立会话（进程组）中运行，输出重定向到日志文件，退出码写入 .exit 文件，
+        后端重启不会中断进程，重启后可通过 reattach_process 继续跟踪。
+        """
+        try:
+            with self._lock:
+                if process_id in self.processes:
+                    self._log("warning", f"进程 {process_id} 已存在")
+                    return False
+
+            files = self._state_files(process_id)
+            for key in ("log", "exit"):
+                if files[key].exists():
+                    files[key].unlink()
+
+            self._log("info", f"启动可重连进程: {process_id}")
+            self._log("info", f"命令: {command}")
+            self._log("info", f"工作目录: {cwd}")
+
+            process_env = os.environ.copy()
+            if env:
+                process_env.update(env)
+
+            wrapped = (f"( {command} ) > {shlex.quote(str(files['log']))} 2>&1; "
+                       f"echo $? > {shlex.quote(str(files['exit']))}")
+
+            cgroup_path = self._create_cgroup(process_id, cgroup)
+            if cgroup_path:
+                wrapped = f"{self.cgroup_manager.enter_command(cgroup_path)}; {wrapped}"
+
+            process = subprocess.Popen(
+                wrapped,
+                shell=True,
+                cwd=str(cwd) if cwd else None,
+                env=process_env,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+                pass_fds=pass_fds
             )
-            output_thread.start()
-            
-            # 启动进程监控线程
-            monitor_thread = threading.Thread(
-                target=self._monitor_process,
-                args=(process_id,),
-                daemon=True
+
+            process_info = self._new_process_info(
+                process, command, str(cwd) if cwd else None,
+                output_callback, batch_output_callback, timeout, time.time()
             )
-            monitor_thread.start()
-            
+            process_info.update({
+                "persistent": True,
+                "pid": process.pid,
+                "pgid": os.getpgid(process.pid),
+                "log_file": str(files["log"]),
+                "log_offset": 0,
+                "cgroup": str(cgroup_path) if cgroup_path else None
+            })
+
+            with self._lock:
+                self.processes[process_id] = process_info
+
+            self._save_state(process_id)
+            self._follow_log(process_id)
+
+            self._watch_process(process_id, process.pid, process, timeout, process_info["start_time"])
+
             return True
-            
+
         except Exception as e:
             self._log("error", f"启动进程失败: {e}")
             return False
-    
-    def _read_output(self, process_id: str, process: subprocess.Popen, 
-                    output_queue: Queue, callback: Optional[Callable]):
-        """读取进程输出"""
+
+    def _create_cgroup(self, process_id: str, limits: Optional[Dict[str, Any]]) -> Optional[Path]:
+        """按需为进程树创建 cgroup，不可用时返回None"""
+        if limits is None or not self.cgroup_manager or not self.cgroup_manager.available:
+            return None
+        return self.cgroup_manager.create(process_id, **limits)
+
+    def _release_cgroup(self, process_id: str):
+        """进程结束后记录 cgroup 的资源统计，终止残留进程并删除 cgroup"""
+        with self._lock:
+            info = self.processes.get(process_id)
+            cgroup = info.get("cgroup") if info else None
+        if not cgroup or not self.cgroup_manager:
+            return
+
+        stats = self.cgroup_manager.stats(Path(cgroup))
+        self.cgroup_manager.remove(Path(cgroup))
+        with self._lock:
+            if process_id in self.processes:
+                self.processes[process_id]["cgroup_stats"] = stats
+
+    def _kill_cgroup(self, process_info: Dict[str, Any]):
+        """强制终止进程所在 cgroup 中的所有进程"""
+        if process_info.get("cgroup") and self.cgroup_manager:
+            self.cgroup_manager.kill(Path(process_info["cgroup"]))
+
+    def list_detached_processes(self) -> List[str]:
+        """
+        列出状态目录中记录的可重连进程（通常在后端重启后调用）
+
+        Returns:
+            list: 进程ID列表
+        """
+        if not self.state_dir:
+            return []
+
+        with self._lock:
+            known = set(self.processes.keys())
+
+        return [
+            state_file.stem for state_file in sorted(self.state_dir.glob("*.json"))
+            if state_file.stem not in known
+        ]
+
+    def _is_group_alive(self, pid: int, pgid: int) -> bool:
+        """检查记录的进程是否仍然存活且属于原进程组（防止PID复用）"""
         try:
-            for line in iter(process.stdout.readline, ''):
-                if line:
-                    line = line.rstrip('\n\r')
-                    output_queue.put(line)
-                    
-                    # 存储输出行
-                    with self._lock:
-                        if process_id in self.processes:
-                            self.processes[process_id]["output_lines"].append(line)
-                    
-                    # 调用回调函数
-                    if callback:
-                        try:
-                            callback(process_id, line)
-                        except Exception as e:
-                            self._log("error", f"输出回调函数执行失败: {e}")
-            
+            return os.getpgid(pid) == pgid
+        except (ProcessLookupError, PermissionError, OSError):
+            return False
+
+    def reattach_process(self, process_id: str,
+                         output_callback: Optional[Callable] = None,
+                         batch_output_callback: Optional[Callable] = None) -> bool:
+        """
+        重连后端重启前启动的可重连进程，从记录的偏移量继续读取日志
+
+        进程已结束时同样会注册，状态由退出码文件决定。
+
+        Args:
+            process_id: 进程ID
+            output_callback: 输出回调函数
+            batch_output_callback: 批量输出回调函数
+
+        Returns:
+            bool: 是否重连成功
+        """
+        if not self.state_dir:
+            return False
+
+        files = self._state_files(process_id)
+        try:
+            with open(files["state"], 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            self._log("error", f"读取进程状态失败 {process_id}: {e}")
+            return False
+
+        with self._lock:
+            if process_id in self.processes:
+                return False
+
+            process_info = self._new_process_info(
+                None, state["command"], state.get("cwd"),
+                output_callback, batch_output_callback, state.get("timeout"), state["start_time"]
+            )
+            process_info.update({
+                "persistent": True,
+                "pid": state["pid"],
+                "pgid": state["pgid"],
+                "log_file": state["log_file"],
+                "log_offset": state.get("log_offset", 0),
+                "cgroup": state.get("cgroup")
+            })
+            self.processes[process_id] = process_info
+
+        alive = self._is_group_alive(state["pid"], state["pgid"])
+        self._log("info", f"重连进程 {process_id} (PID {state['pid']}, "
+                          f"{'运行中' if alive else '已结束'}, 日志偏移 {state.get('log_offset', 0)})")
+
+        self._follow_log(process_id)
+
+        if alive:
+            self._watch_process(process_id, state["pid"], None,
+                                state.get("timeout"), state["start_time"])
+        else:
+            self._on_process_exit(process_id, self._read_exit_file(process_id))
+
+        return True
+
+    def _read_exit_file(self, process_id: str) -> int:
+        """读取可重连进程的退出码，没有退出码文件说明进程被外部终止"""
+        try:
+            return int(self._state_files(process_id)["exit"].read_text().strip())
+        except (OSError, ValueError):
+            return -1
+
+    def _follow_log(self, process_id: str):
+        """跟踪可重连进程的日志文件：reactor 方式由反应器线程轮询，threads 方式每个进程一个线程"""
+        if self._reactor:
+            with self._lock:
+                info = self.processes[process_id]
+                log_file, offset, exited = info["log_file"], info["log_offset"], info["exited"]
+            self._reactor.register_file(process_id, log_file, offset, exited)
+            return
+
+        tail_thread = threading.Thread(
+            target=self._tail_persistent_process,
+            args=(process_id,),
+            daemon=True
+        )
+        tail_thread.start()
+
+    def _tail_persistent_process(self, process_id: str):
+        """
+        跟踪可重连进程（threads 方式）：读取日志文件新增内容，进程退出后读完剩余输出
+
+        每批输出分发后立即保存日志偏移量，重连后不会重复分发已处理的行。
+        """
+        buffer = b""
+
+        try:
+            with self._lock:
+                info = self.processes.get(process_id)
+                if not info:
+                    return
+                log_file = info["log_file"]
+                offset = info["log_offset"]
+                exited = info["exited"]
+
+            # 日志文件可能尚未被shell创建
+            while not os.path.exists(log_file) and not exited.is_set():
+                exited.wait(0.2)
+
+            with open(log_file, 'ab+') as f:
+                f.seek(offset)
+                while True:
+                    chunk = f.read(READ_CHUNK_SIZE)
+                    if chunk:
+                        pending = len(buffer) + len(chunk)
+                        lines, buffer = split_lines(buffer, chunk)
+                        offset += pending - len(buffer)
+                        self._deliver_lines(process_id, lines, offset)
+                        continue
+
+                    if exited.is_set():
+                        # 读取剩余输出（与 split_lines 一致保留空行，行号才能与日志索引对应）
+                        rest = buffer + f.read()
+                        lines = rest.split(b"\n")
+                        if lines[-1] == b"":
+                            lines.pop()
+                        offset += len(rest)
+                        self._dispatch_lines(process_id, lines, offset)
+                        break
+
+                    # 进程退出时立即被唤醒
+                    exited.wait(0.2)
+
+        except Exception as e:
+            self._log("error", f"跟踪进程日志失败 {process_id}: {e}")
+        finally:
+            self._deliver_closed(process_id)
+
+    def _deliver_lines(self, process_id: str, lines: List[bytes], offset: Optional[int] = None):
+        """分发一批输出，可重连进程随后保存已分发的日志偏移量"""
+        self._dispatch_lines(process_id, lines, offset)
+        if offset is not None:
+            self._save_state(process_id)
+
+    def _deliver_closed(self, process_id: str):
+        """输出读取完毕（可重连进程先保存最终的日志偏移量）"""
+        self._save_state(process_id)
+        self._on_output_closed(process_id)
+
+    def _dispatch_lines(self, process_id: str, lines: List[bytes], offset: Optional[int] = None):
+        """
+        批量分发输出行到回调函数
+
+        Args:
+            process_id: 进程ID
+            lines: 未解码的输出行
+            offset: 可重连进程已读取的日志偏移量
+        """
+        if not lines:
+            return
+
+        decoded = decode_lines(lines)
+
+        with self._lock:
+            info = self.processes.get(process_id)
+            if not info:
+                return
+            info["output_lines"].extend(decoded)
+            if offset is not None:
+                info["log_offset"] = offset
+            callback = info["output_callback"]
+            batch_callback = info["batch_output_callback"]
+
+        if batch_callback:
+            try:
+                batch_callback(process_id, decoded)
+            except Exception as e:
+                self._log("error", f"输出回调函数执行失败: {e}")
+
+        if callback:
+            for line in decoded:
+                try:
+                    callback(process_id, line)
+                except Exception as e:
+                    self._log("error", f"输出回调函数执行失败: {e}")
+
+    def _read_output(self, process_id: str, process: subprocess.Popen):
+        """读取进程输出（每个进程一个线程），按块读取后批量分发"""
+        fd = process.stdout.fileno()
+        buffer = b""
+        try:
+            while True:
+                chunk = os.read(fd, READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                lines, buffer = split_lines(buffer, chunk)
+                self._dispatch_lines(process_id, lines)
+
+            if buffer:
+                self._dispatch_lines(process_id, [buffer])
+
         except Exception as e:
             self._log("error", f"读取进程输出失败: {e}")
         finally:
             if process.stdout:
                 process.stdout.close()
-    
-    def _monitor_process(self, process_id: str):
-        """监控进程状态"""
+            self._on_output_closed(process_id)
+
+    def _watch_process(self, process_id: str, pid: int, process: Optional[subprocess.Popen],
+                       timeout: Optional[int], start_time: float):
+        """
+        将进程交给回收线程监控
+
+        Linux上使用pidfd，进程退出时立即唤醒；其他平台退化为短间隔轮询。
+        """
+        watch = {
+            "pid": pid,
+            "process": process,
+            "deadline": start_time + timeout if timeout else None,
+            "pidfd": None
+        }
+
+        if hasattr(os, "pidfd_open"):
+            try:
+                watch["pidfd"] = os.pidfd_open(pid)
+            except OSError:
+                watch["pidfd"] = None
+
+        with self._reaper_lock:
+            self._reaper_watches[process_id] = watch
+
+        self._wakeup_reaper()
+
+    def _wakeup_reaper(self):
+        """唤醒回收线程重新加载监控列表（首次调用时启动回收线程）"""
+        with self._reaper_lock:
+            if self._reaper_thread is None:
+                self._reaper_thread = threading.Thread(
+                    target=self._reaper_loop, name="process-reaper", daemon=True
+                )
+                self._reaper_thread.start()
+
         try:
+            os.write(self._reaper_wakeup_w, b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    def _check_exited(self, process_id: str, watch: Dict[str, Any]) -> Optional[int]:
+        """检查被监控进程是否退出，返回退出码"""
+        process = watch["process"]
+        if process is not None:
+            return_code = process.poll()
+            if return_code is None:
+                return None
+        else:
+            # 重连的进程不是本进程的子进程：包装shell写入退出码文件即已结束，
+            # 否则检查PID是否仍属于原进程组（PID可能已被其他进程复用）
+            if self._state_files(process_id)["exit"].exists():
+                return self._read_exit_file(process_id)
             with self._lock:
-                if process_id not in self.processes:
-                    return
-                
-                process_info = self.processes[process_id]
-                process = process_info["process"]
-                timeout = process_info["timeout"]
-                start_time = process_info["start_time"]
-            
-            # 等待进程完成或超时
-            while True:
-                return_code = process.poll()
-                
-                if return_code is not None:
-                    # 进程已完成
-                    with self._lock:
-                        if process_id in self.processes:
-                            self.processes[process_id]["end_time"] = time.time()
-                            if return_code == 0:
-                                self.processes[process_id]["status"] = ProcessStatus.COMPLETED
-                                self._log("info", f"进程 {process_id} 完成")
-                            else:
-                                self.processes[process_id]["status"] = ProcessStatus.FAILED
-                                self._log("error", f"进程 {process_id} 失败，返回码: {return_code}")
-                    break
-                
-                # 检查超时
-                if timeout and (time.time() - start_time) > timeout:
-                    self._log("warning", f"进程 {process_id} 超时，正在终止")
-                    self.kill_process(process_id)
-                    with self._lock:
-                        if process_id in self.processes:
-                            self.processes[process_id]["status"] = ProcessStatus.TIMEOUT
-                    break
-                
-                time.sleep(1)
-                
-        except Exception as e:
-            self._log("error", f"监控进程失败: {e}")
-    
+                pgid = self.processes.get(process_id, {}).get("pgid")
+            if pgid is not None and self._is_group_alive(watch["pid"], pgid):
+                return None
+            return_code = -1
+
+        with self._lock:
+            persistent = self.processes.get(process_id, {}).get("persistent")
+
+        # 可重连进程的真实退出码由包装shell写入文件
+        if persistent:
+            return self._read_exit_file(process_id)
+        return return_code
+
+    def _reaper_loop(self):
+        """回收线程：统一等待所有子进程退出并处理超时"""
+        selector = selectors.DefaultSelector()
+        selector.register(self._reaper_wakeup_r, selectors.EVENT_READ, None)
+        registered: Dict[str, int] = {}
+
+        while True:
+            try:
+                with self._reaper_lock:
+                    watches = dict(self._reaper_watches)
+                    drains = dict(self._drain_deadlines)
+
+                # 同步pidfd注册
+                for process_id, watch in watches.items():
+                    if watch["pidfd"] is not None and process_id not in registered:
+                        selector.register(watch["pidfd"], selectors.EVENT_READ, process_id)
+                        registered[process_id] = watch["pidfd"]
+
+                now = time.time()
+                wait_timeout = None
+                for watch in watches.values():
+                    if watch["pidfd"] is None:
+                        wait_timeout = self.REAPER_POLL_INTERVAL
+                    if watch["deadline"]:
+                        remaining = max(0.0, watch["deadline"] - now)
+                        wait_timeout = remaining if wait_timeout is None else min(wait_timeout, remaining)
+                for deadline in drains.values():
+                    remaining = max(0.0, deadline - now)
+                    wait_timeout = remaining if wait_timeout is None else min(wait_timeout, remaining)
+
+                for key, _ in selector.select(wait_timeout):
+                    if key.data is None:
+                        try:
+                            os.read(self._reaper_wakeup_r, 4096)
+                        except BlockingIOError:
+                            pass
+
+                # 检查退出和超时
+                now = time.time()
+                for process_id, watch in watches.items():
+                    return_code = self._check_exited(process_id, watch)
+                    if return_code is not None:
+                        self._unwatch(process_id, selector, registered)
+                        self._on_process_exit(process_id, return_code)
+                    elif watch["deadline"] and now >= watch["deadline"]:
+                        watch["deadline"] = None
+                        self._log("warning", f"进程 {process_id} 超时，正在终止")
+                        threading.Thread(
+                            target=self._terminate,
+                            args=(process_id, ProcessStatus.TIMEOUT),
+                            daemon=True
+                        ).start()
+
+                # 退出后输出迟迟未关闭（后台子进程占用管道）的进程直接结束；
+                # 仍有输出排队投递（处理函数较慢、读取被暂停）时继续等待
+                for process_id, deadline in drains.items():
+                    if now < deadline:
+                        continue
+                    if self._delivery and self._delivery.busy(process_id):
+                        with self._reaper_lock:
+                            if process_id in self._drain_deadlines:
+                                self._drain_deadlines[process_id] = now + self.OUTPUT_DRAIN_TIMEOUT
+                    else:
+                        self._on_output_closed(process_id)
+
+            except Exception as e:
+                self._log("error", f"进程回收线程错误: {e}")
+                time.sleep(self.REAPER_POLL_INTERVAL)
+
+    def _unwatch(self, process_id: str, selector: selectors.BaseSelector,
+                 registered: Dict[str, int]):
+        """停止监控进程并关闭pidfd"""
+        with self._reaper_lock:
+            watch = self._reaper_watches.pop(process_id, None)
+
+        pidfd = registered.pop(process_id, None)
+        if pidfd is not None:
+            selector.unregister(pidfd)
+        if watch and watch["pidfd"] is not None:
+            os.close(watch["pidfd"])
+
+    def _on_process_exit(self, process_id: str, return_code: int):
+        """进程退出"""
+        with self._lock:
+            info = self.processes.get(process_id)
+            if not info:
+                return
+            info["return_code"] = return_code
+            info["exited"].set()
+            terminated = info["status"] != ProcessStatus.RUNNING
+            output_closed = info["output_closed"]
+            persistent = info.get("persistent")
+
+        # 被终止的进程不再等待残留输出；可重连进程的日志读到末尾即结束，不需要超时
+        if terminated:
+            self._on_output_closed(process_id)
+        elif output_closed or persistent:
+            self._maybe_finish(process_id)
+        else:
+            with self._reaper_lock:
+                self._drain_deadlines[process_id] = time.time() + self.OUTPUT_DRAIN_TIMEOUT
+            self._wakeup_reaper()
+
+    def _on_output_closed(self, process_id: str):
+        """进程输出读取完毕"""
+        with self._reaper_lock:
+            self._drain_deadlines.pop(process_id, None)
+
+        with self._lock:
+            info = self.processes.get(process_id)
+            if not info:
+                return
+            info["output_closed"] = True
+        self._maybe_finish(process_id)
+
+    def _maybe_finish(self, process_id: str):
+        """进程已退出且输出已读完时，确定最终状态并通知等待者"""
+        with self._lock:
+            info = self.processes.get(process_id)
+            if not info or info["finished"]:
+                return
+            if info["return_code"] is None or not info["output_closed"]:
+                return
+
+            info["finished"] = True
+            info["end_time"] = info["end_time"] or time.time()
+            return_code = info["return_code"]
+
+            # 已被终止（取消/超时）的进程保留原状态
+            if info["status"] == ProcessStatus.RUNNING:
+                info["status"] = ProcessStatus.COMPLETED if return_code == 0 else ProcessStatus.FAILED
+
+            status = info["status"]
+            future = info["future"]
+
+        if status == ProcessStatus.COMPLETED:
+            self._log("info", f"进程 {process_id} 完成")
+        elif status == ProcessStatus.FAILED:
+            self._log("error", f"进程 {process_id} 失败，返回码: {return_code}")
+
+        self._release_cgroup(process_id)
+
+        if not future.done():
+            future.set_result(status)
+
     def kill_process(self, process_id: str) -> bool:
         """
         终止进程
-        
+
         Args:
             process_id: 进程ID
-        
+
         Returns:
             bool: 是否成功终止
         """
+        return self._terminate(process_id, ProcessStatus.CANCELLED)
+
+    def _terminate(self, process_id: str, final_status: ProcessStatus) -> bool:
+        """
+        终止进程并记录最终状态（取消或超时）
+
+        状态在发送信号前写入，回收线程检测到退出时保留该状态。
+        """
         try:
             with self._lock:
                 if process_id not in self.processes:
                     return False
-                
+
                 process_info = self.processes[process_id]
                 process = process_info["process"]
-            
+
+                if not process_info["finished"]:
+                    process_info["status"] = final_status
+                    process_info["end_time"] = time.time()
+
+            if process_info.get("persistent"):
+                return self._kill_process_group(process_id, process_info)
+
             if process.poll() is None:  # 进程仍在运行
                 self._log("info", f"终止进程: {process_id}")
-                
+
                 # 尝试优雅终止
                 try:
                     if os.name == 'nt':  # Windows
                         process.terminate()
                     else:  # Unix/Linux
                         process.send_signal(signal.SIGTERM)
-                    
+
                     # 等待进程终止
                     try:
                         process.wait(timeout=5)
                     except subprocess.TimeoutExpired:
                         # 强制终止
                         process.kill()
+                        self._kill_cgroup(process_info)
                         process.wait()
-                        
+
                 except Exception as e:
                     self._log("error", f"终止进程失败: {e}")
                     return False
-            
-            with self._lock:
-                if process_id in self.processes:
-                    self.processes[process_id]["status"] = ProcessStatus.CANCELLED
-                    self.processes[process_id]["end_time"] = time.time()
-            
+
             return True
-            
+
         except Exception as e:
             self._log("error", f"终止进程失败: {e}")
             return False
-    
+
+    def _kill_process_group(self, process_id: str, process_info: Dict[str, Any]) -> bool:
+        """终止可重连进程的整个进程组"""
+        pgid = process_info["pgid"]
+        if self._is_group_alive(process_info["pid"], pgid):
+            self._log("info", f"终止进程组: {process_id} (PGID {pgid})")
+            try:
+                os.killpg(pgid, signal.SIGTERM)
+                if not process_info["exited"].wait(5):
+                    os.killpg(pgid, signal.SIGKILL)
+                    self._kill_cgroup(process_info)
+            except ProcessLookupError:
+                pass
+            except Exception as e:
+                self._log("error", f"终止进程失败: {e}")
+                return False
+
+        return True
+
+    def discard_detached_process(self, process_id: str):
+        """
+        丢弃不再需要的可重连进程：终止仍在运行的进程组并删除状态文件
+
+        Args:
+            process_id: 进程ID
+        """
+        if not self.state_dir:
+            return
+
+        files = self._state_files(process_id)
+        try:
+            with open(files["state"], 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if self._is_group_alive(state["pid"], state["pgid"]):
+                self._log("warning", f"终止无主的可重连进程: {process_id} (PGID {state['pgid']})")
+                os.killpg(state["pgid"], signal.SIGKILL)
+            if state.get("cgroup") and self.cgroup_manager:
+                self.cgroup_manager.remove(Path(state["cgroup"]))
+        except (OSError, ValueError, KeyError) as e:
+            self._log("warning", f"读取进程状态失败 {process_id}: {e}")
+
+        for path in files.values():
+            if path.exists():
+                path.unlink()
+
+    def get_process_future(self, process_id: str) -> Optional[Future]:
+        """
+        获取进程完成的Future，结果为最终的 ProcessStatus
+
+        Future 在进程退出且输出全部分发后才完成。
+
+        Args:
+            process_id: 进程ID
+
+        Returns:
+            Future: 进程不存在时返回None
+        """
+        with self._lock:
+            if process_id not in self.processes:
+                return None
+            return self.processes[process_id]["future"]
+
+    def wait_process(self, process_id: str, timeout: Optional[float] = None) -> Optional[ProcessStatus]:
+        """
+        等待进程结束
+
+        Args:
+            process_id: 进程ID
+            timeout: 最长等待时间（秒），为空时一直等待
+
+        Returns:
+            ProcessStatus: 最终状态；超时或进程不存在时返回None
+        """
+        future = self.get_process_future(process_id)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            return None
+
+    def add_completion_callback(self, process_id: str,
+                                callback: Callable[[str, ProcessStatus], None]) -> bool:
+        """
+        注册进程结束回调
+
+        Args:
+            process_id: 进程ID
+            callback: 回调函数，参数为 (process_id, 最终状态)
+
+        Returns:
+            bool: 进程是否存在
+        """
+        future = self.get_process_future(process_id)
+        if future is None:
+            return False
+
+        def on_done(done_future):
+            try:
+                callback(process_id, done_future.result())
+            except Exception as e:
+                self._log("error", f"进程结束回调执行失败: {e}")
+
+        future.add_done_callback(on_done)
+        return True
+
     def get_process_status(self, process_id: str) -> Optional[ProcessStatus]:
         """
         获取进程状态
-        
+
         Args:
             process_id: 进程ID
-        
+
         Returns:
             ProcessStatus: 进程状态
         """
@@ -270,71 +1338,79 @@ class ProcessManager:
             if process_id in self.processes:
                 return self.processes[process_id]["status"]
             return None
-    
+
     def get_process_info(self, process_id: str) -> Optional[Dict[str, Any]]:
         """
         获取进程信息
-        
+
         Args:
             process_id: 进程ID
-        
+
         Returns:
             dict: 进程信息
         """
         with self._lock:
             if process_id not in self.processes:
                 return None
-            
+
             process_info = self.processes[process_id].copy()
-            
+
             # 移除不可序列化的对象
-            process_info.pop("process", None)
-            process_info.pop("output_queue", None)
-            process_info.pop("output_callback", None)
-            
+            for field in self.PRIVATE_FIELDS:
+                process_info.pop(field, None)
+
             # 转换状态为字符串
             process_info["status"] = process_info["status"].value
-            
+            process_info["output_lines"] = list(process_info["output_lines"])
+
             return process_info
-    
+
     def get_process_output(self, process_id: str, last_n_lines: Optional[int] = None) -> list:
         """
         获取进程输出
-        
+
         Args:
             process_id: 进程ID
             last_n_lines: 获取最后N行（可选）
-        
+
         Returns:
             list: 输出行列表
         """
         with self._lock:
             if process_id not in self.processes:
                 return []
-            
-            output_lines = self.processes[process_id]["output_lines"]
-            
+
+            output_lines = list(self.processes[process_id]["output_lines"])
+
             if last_n_lines:
                 return output_lines[-last_n_lines:]
             else:
-                return output_lines.copy()
-    
+                return output_lines
+
     def cleanup_process(self, process_id: str):
         """
         清理进程信息
-        
+
         Args:
             process_id: 进程ID
         """
         with self._lock:
             if process_id in self.processes:
+                persistent = self.processes[process_id].get("persistent")
                 del self.processes[process_id]
                 self._log("info", f"清理进程信息: {process_id}")
-    
+            else:
+                persistent = False
+
+        if persistent:
+            for path in self._state_files(process_id).values():
+                if path.exists():
+                    path.unlink()
+
     def list_processes(self) -> Dict[str, Dict[str, Any]]:
         """
         列出所有进程
-        
+
         Returns:
             dict: 进程信息字典
         """
@@ -342,9 +1418,9 @@ class ProcessManager:
             result = {}
             for process_id, process_info in self.processes.items():
                 info = process_info.copy()
-                info.pop("process", None)
-                info.pop("output_queue", None)
-                info.pop("output_callback", None)
+                for field in self.PRIVATE_FIELDS:
+                    info.pop(field, None)
                 info["status"] = info["status"].value
+                info["output_lines"] = list(info["output_lines"])
                 result[process_id] = info
             return result
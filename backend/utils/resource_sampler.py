@@ -0,0 +1,375 @@
+"""
+编译进程资源采样
+单个后台线程按固定间隔遍历每个编译任务的整棵进程树，记录CPU、内存、磁盘IO和编译器进程数的时间序列
+"""
+
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+import psutil
+
+
+# 实际执行编译和链接的进程名（gcc/g++ 驱动程序只负责调度，真正占用CPU和内存的是 cc1/cc1plus/ld 等）
+COMPILER_NAMES = frozenset({
+    "cc1", "cc1plus", "cc1obj", "lto1", "rustc", "clang", "clang++", "go", "compile", "javac",
+    "ld", "ld.bfd", "ld.gold", "ld.lld", "mold"
+})
+
+
+class ResourceSeries:
+    """
+    单个任务的资源时间序列
+
+    按列保存，点数超过上限时相邻两点合并并将采样间隔加倍，长时间编译的内存占用保持不变。
+    """
+
+    COLUMNS = ("t", "cpu_percent", "rss_bytes", "read_bytes_per_sec", "write_bytes_per_sec",
+               "processes", "compilers", "mem_available_bytes", "swap_out_bytes_per_sec")
+
+    # 合并时取最大值的列（瞬时峰值比平均值更有意义），其余列取平均值
+    PEAK_COLUMNS = frozenset({"rss_bytes", "processes", "compilers"})
+
+    def __init__(self, interval: float, max_points: int = 1440):
+        """
+        初始化时间序列
+
+        Args:
+            interval: 采样间隔（秒）
+            max_points: 最多保留的点数
+        """
+        self.interval = interval
+        self.max_points = max(2, int(max_points))
+        self.columns: Dict[str, List[float]] = {name: [] for name in self.COLUMNS}
+        self._stride = 1
+        self._pending: List[Dict[str, float]] = []
+
+    def __len__(self) -> int:
+        return len(self.columns["t"])
+
+    def add(self, point: Dict[str, float]):
+        """
+        添加一个采样点
+
+        Args:
+            point: 各列的值
+        """
+        self._pending.append(point)
+        if len(self._pending) < self._stride:
+            return
+
+        self._append(self._merge(self._pending))
+        self._pending = []
+
+        if len(self) > self.max_points:
+            self._compact()
+
+    def _merge(self, points: List[Dict[str, float]]) -> Dict[str, float]:
+        """合并多个相邻采样点"""
+        if len(points) == 1:
+            return points[0]
+
+        merged = {"t": points[0]["t"]}
+        for name in self.COLUMNS[1:]:
+            values = [point[name] for point in points]
+            merged[name] = max(values) if name in self.PEAK_COLUMNS else sum(values) / len(values)
+        return merged
+
+    def _append(self, point: Dict[str, float]):
+        for name in self.COLUMNS:
+            self.columns[name].append(point[name])
+
+    def _compact(self):
+        """相邻两点合并，点数减半"""
+        points = [dict(zip(self.COLUMNS, values)) for values in zip(*self.columns.values())]
+        self.columns = {name: [] for name in self.COLUMNS}
+        for i in range(0, len(points), 2):
+            self._append(self._merge(points[i:i + 2]))
+        self._stride *= 2
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        统计摘要
+
+        Returns:
+            dict: 平均/峰值CPU、峰值内存、平均/峰值编译器进程数、单个编译进程的峰值内存、换出总量
+        """
+        if not len(self):
+            return {}
+
+        cpu = self.columns["cpu_percent"]
+        compilers = self.columns["compilers"]
+        per_compiler = [rss / count for rss, count in zip(self.columns["rss_bytes"], compilers) if count]
+        duration = self.columns["t"][-1] - self.columns["t"][0] + self.interval * self._stride
+        return {
+            "avg_cpu_percent": round(sum(cpu) / len(cpu), 1),
+            "max_cpu_percent": round(max(cpu), 1),
+            "peak_rss_bytes": int(max(self.columns["rss_bytes"])),
+            "avg_compilers": round(sum(compilers) / len(compilers), 2),
+            "max_compilers": int(max(compilers)),
+            "peak_rss_per_compiler": int(max(per_compiler)) if per_compiler else None,
+            "min_mem_available_bytes": int(min(self.columns["mem_available_bytes"])),
+            "swap_out_bytes": int(sum(self.columns["swap_out_bytes_per_sec"]) * self.interval * self._stride),
+            "duration_seconds": round(duration, 1)
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        导出为可序列化的字典
+
+        Returns:
+            dict: interval（当前点间隔）、cpu_count、summary 以及各列数据
+        """
+        return {
+            "interval": self.interval * self._stride,
+            "cpu_count": psutil.cpu_count() or 1,
+            "summary": self.summary(),
+            "columns": {name: [round(value, 2) for value in values]
+                        for name, values in self.columns.items()}
+        }
+
+
+class _TrackedTree:
+    """采样中的进程树及上一次采样的累计值"""
+
+    def __init__(self, pid: int, series: ResourceSeries, extra: Dict[str, Any]):
+        self.pid = pid
+        self.series = series
+        self.extra = extra
+        self.processes: Dict[int, psutil.Process] = {}
+        self.last_cpu: Optional[float] = None
+        self.last_io: Dict[int, Tuple[int, int]] = {}
+        self.last_time: Optional[float] = None
+
+
+class ResourceSampler:
+    """编译进程树资源采样器"""
+
+    def __init__(self, logger=None, interval: float = 5.0, max_points: int = 1440):
+        """
+        初始化资源采样器
+
+        Args:
+            logger: 日志记录器
+            interval: 采样间隔（秒）
+            max_points: 每个任务最多保留的点数（超过后降采样）
+        """
+        self.logger = logger
+        self.interval = max(0.1, float(interval))
+        self.max_points = max_points
+
+        self._trees: Dict[str, _TrackedTree] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_swap: Optional[Tuple[float, int]] = None
+
+    def _log(self, level: str, message: str):
+        """记录日志"""
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    def track(self, key: str, pid: int, **extra):
+        """
+        开始采样一棵进程树
+
+        Args:
+            key: 标识（任务ID）
+            pid: 进程树根进程ID
+            **extra: 随结果一起返回的附加信息（例如 make_jobs）
+        """
+        with self._lock:
+            self._trees[key] = _TrackedTree(pid, ResourceSeries(self.interval, self.max_points), extra)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_loop, name="resource-sampler",
+                                                daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def untrack(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        停止采样并返回时间序列
+
+        Args:
+            key: 标识
+
+        Returns:
+            dict: 时间序列，未在采样时返回None
+        """
+        with self._lock:
+            tree = self._trees.pop(key, None)
+            return self._export(tree) if tree else None
+
+    def get_series(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        获取正在采样的时间序列
+
+        Args:
+            key: 标识
+
+        Returns:
+            dict: 时间序列，未在采样时返回None
+        """
+        with self._lock:
+            tree = self._trees.get(key)
+            return self._export(tree) if tree else None
+
+    def _export(self, tree: _TrackedTree) -> Dict[str, Any]:
+        result = tree.series.to_dict()
+        result.update(tree.extra)
+        return result
+
+    def _sample_loop(self):
+        """采样线程：没有采样对象时等待唤醒"""
+        while True:
+            with self._lock:
+                trees = list(self._trees.values())
+
+            if not trees:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            started = time.time()
+            swap_rate = self._sample_swap(started)
+            mem_available = psutil.virtual_memory().available
+            for tree in trees:
+                try:
+                    point = self._sample_tree(tree, started)
+                except Exception as e:
+                    self._log("warning", f"资源采样失败 (PID {tree.pid}): {e}")
+                    continue
+                if point is not None:
+                    point["mem_available_bytes"] = mem_available
+                    point["swap_out_bytes_per_sec"] = swap_rate
+                    with self._lock:
+                        tree.series.add(point)
+
+            time.sleep(max(0.0, self.interval - (time.time() - started)))
+
+    def _sample_swap(self, now: float) -> float:
+        """系统换出速率（字节/秒），编译内存不足时会持续换出"""
+        try:
+            swapped_out = psutil.swap_memory().sout
+        except Exception:
+            return 0.0
+
+        last = self._last_swap
+        self._last_swap = (now, swapped_out)
+        if last is None or now <= last[0]:
+            return 0.0
+        return max(0, swapped_out - last[1]) / (now - last[0])
+
+    def _walk(self, tree: _TrackedTree) -> List[psutil.Process]:
+        """
+        获取进程树中的所有进程
+
+        复用上一轮的 Process 对象（以进程ID和启动时间识别），避免进程ID复用时误判。
+        """
+        root = tree.processes.get(tree.pid)
+        if root is None:
+            root = psutil.Process(tree.pid)
+
+        current = {tree.pid: root}
+        for child in root.children(recursive=True):
+            known = tree.processes.get(child.pid)
+            current[child.pid] = known if known is not None and known == child else child
+        tree.processes = current
+        return list(current.values())
+
+    def _sample_tree(self, tree: _TrackedTree, now: float) -> Optional[Dict[str, float]]:
+        """
+        采样一棵进程树
+
+        CPU时间取所有存活进程自身及其已回收子进程的累计时间之和：子进程退出被父进程回收后，
+        其耗时计入父进程的 children_user/children_system，总和在两次采样间单调递增，
+        短命的编译进程也不会漏算。IO按进程分别计算增量。
+        """
+        try:
+            processes = self._walk(tree)
+        except psutil.NoSuchProcess:
+            return None
+
+        cpu_total = 0.0
+        rss = 0
+        compilers = 0
+        read_delta = 0
+        write_delta = 0
+        current_io: Dict[int, Tuple[int, int]] = {}
+
+        for process in processes:
+            try:
+                with process.oneshot():
+                    times = process.cpu_times()
+                    cpu_total += times.user + times.system + times.children_user + times.children_system
+                    rss += process.memory_info().rss
+                    name = process.name()
+                    if name in COMPILER_NAMES or name.endswith("-ld"):
+                        compilers += 1
+                    try:
+                        io = process.io_counters()
+                    except (psutil.AccessDenied, AttributeError):
+                        io = None
+            except (psutil.NoSuchProcess, psutil.ZombieProcess, psutil.AccessDenied):
+                continue
+
+            if io is not None:
+                current_io[process.pid] = (io.read_bytes, io.write_bytes)
+                last_read, last_write = tree.last_io.get(process.pid, (0, 0))
+                read_delta += max(0, io.read_bytes - last_read)
+                write_delta += max(0, io.write_bytes - last_write)
+
+        last_time, last_cpu = tree.last_time, tree.last_cpu
+        tree.last_time, tree.last_cpu, tree.last_io = now, cpu_total, current_io
+
+        # 第一次采样只建立基准
+        if last_time is None or now <= last_time:
+            return None
+
+        elapsed = now - last_time
+        return {
+            "t": now,
+            "cpu_percent": max(0.0, cpu_total - last_cpu) / elapsed * 100,
+            "rss_bytes": rss,
+            "read_bytes_per_sec": read_delta / elapsed,
+            "write_bytes_per_sec": write_delta / elapsed,
+            "processes": len(processes),
+            "compilers": compilers
+        }
+
+
+def save_series(series_dir: Path, key: str, series: Dict[str, Any]):
+    """
+    保存时间序列（<key>.json）
+
+    Args:
+        series_dir: 保存目录
+        key: 标识
+        series: 时间序列
+    """
+    series_dir = Path(series_dir)
+    series_dir.mkdir(parents=True, exist_ok=True)
+    target = series_dir / f"{key}.json"
+    tmp = target.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(series, separators=(",", ":")), encoding='utf-8')
+    os.replace(tmp, target)
+
+
+def load_series(series_dir: Path, key: str) -> Optional[Dict[str, Any]]:
+    """
+    读取已保存的时间序列
+
+    Args:
+        series_dir: 保存目录
+        key: 标识
+
+    Returns:
+        dict: 时间序列，不存在时返回None
+    """
+    target = Path(series_dir) / f"{key}.json"
+    if not target.exists():
+        return None
+    return json.loads(target.read_text(encoding='utf-8'))
@@ -0,0 +1,381 @@
+"""
+编译任务日志存储
+内存中只保留最近的若干行，完整日志追加写入文件，并用稀疏行偏移索引支持按行号随机读取；
+任务结束后日志压缩为按固定行数分帧的归档，仍可按行号读取
+"""
+
+import os
+import gzip
+import struct
+import threading
+from collections import deque
+from pathlib import Path
+from typing import List
+
+
+class TaskLog:
+    """任务日志（环形缓冲 + 追加写入的日志文件 + 稀疏行索引）"""
+
+    # 索引文件中每个偏移量的编码（小端 uint64）
+    OFFSET_FORMAT = "<Q"
+    OFFSET_SIZE = struct.calcsize(OFFSET_FORMAT)
+
+    def __init__(self, log_file: Path, buffer_lines: int = 2000, index_interval: int = 1000,
+                 readonly: bool = False):
+        """
+        打开（或创建）任务日志
+
+        已存在的日志文件会加载索引并继续追加，后端重启后重连的任务可以接着写入。
+
+        Args:
+            log_file: 日志文件路径，索引保存在同名的 .idx 文件中
+            buffer_lines: 内存中保留的最近行数
+            index_interval: 每隔多少行记录一次字节偏移
+            readonly: 只读打开（不创建文件、不改写索引）
+
+        Raises:
+            FileNotFoundError: 只读打开时日志文件不存在
+        """
+        self.log_file = Path(log_file)
+        self.index_file = self.log_file.with_suffix(self.log_file.suffix + ".idx")
+        self.index_interval = max(1, int(index_interval))
+
+        self._buffer = deque(maxlen=max(1, int(buffer_lines)))
+        self._lock = threading.Lock()
+
+        self.readonly = readonly
+        self._index: List[int] = []
+        self.line_count = 0
+        self._size = 0
+
+        if readonly:
+            if not self.log_file.exists():
+                raise FileNotFoundError(str(self.log_file))
+            self._load_index()
+            self._writer = self._index_writer = None
+            return
+
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+        self._writer = open(self.log_file, 'ab')
+        self._index_writer = open(self.index_file, 'ab')
+
+    def _load_index(self):
+        """加载索引，并从最后一个索引点向后扫描补齐行数和缺失的索引项"""
+        if self.index_file.exists():
+            data = self.index_file.read_bytes()
+            usable = len(data) - len(data) % self.OFFSET_SIZE
+            self._index = [offset for (offset,) in struct.iter_unpack(self.OFFSET_FORMAT, data[:usable])]
+
+        if not self.log_file.exists():
+            self._index = []
+            if not self.readonly:
+                self.index_file.write_bytes(b"")
+            return
+
+        self._size = self.log_file.stat().st_size
+
+        # 丢弃超出日志文件的索引项（日志文件被截断时）
+        while self._index and self._index[-1] > self._size:
+            self._index.pop()
+
+        start = self._index[-1] if self._index else 0
+        line_count = max(0, len(self._index) - 1) * self.index_interval
+        missing = []
+
+        with open(self.log_file, 'rb') as f:
+            f.seek(start)
+            offset = start
+            if not self._index:
+                missing.append(0)
+            for line in f:
+                offset += len(line)
+                line_count += 1
+                if line_count % self.index_interval == 0 and offset < self._size:
+                    missing.append(offset)
+
+        # 最后一个索引项之后的行已在上面重新计数，重复的偏移不再写入
+        missing = [offset for offset in missing if not self._index or offset > self._index[-1]]
+        self._index.extend(missing)
+        self.line_count = line_count
+
+        if self.readonly:
+            return
+
+        with open(self.index_file, 'wb') as f:
+            f.write(b"".join(struct.pack(self.OFFSET_FORMAT, offset) for offset in self._index))
+
+    def append(self, lines: List[str]):
+        """
+        追加日志行
+
+        Args:
+            lines: 日志行（不含换行符）
+        """
+        if not lines:
+            return
+
+        with self._lock:
+            self._buffer.extend(lines)
+
+            chunks = []
+            new_offsets = []
+            for line in lines:
+                if (self.line_count % self.index_interval == 0 and
+                        self.line_count // self.index_interval == len(self._index) + len(new_offsets)):
+                    new_offsets.append(self._size)
+                data = line.encode('utf-8', errors='replace') + b"\n"
+                chunks.append(data)
+                self._size += len(data)
+                self.line_count += 1
+
+            self._writer.write(b"".join(chunks))
+            self._writer.flush()
+
+            if new_offsets:
+                self._index.extend(new_offsets)
+                self._index_writer.write(
+                    b"".join(struct.pack(self.OFFSET_FORMAT, offset) for offset in new_offsets)
+                )
+                self._index_writer.flush()
+
+    def read_lines(self, start: int, count: int) -> List[str]:
+        """
+        按行号读取日志
+
+        Args:
+            start: 起始行号（从0开始）
+            count: 行数
+
+        Returns:
+            list: 日志行
+        """
+        with self._lock:
+            total = self.line_count
+            if start < 0:
+                start = max(0, total + start)
+            count = max(0, min(count, total - start))
+            if count == 0:
+                return []
+
+            block = start // self.index_interval
+            offset = self._index[block]
+
+        lines = []
+        with open(self.log_file, 'rb') as f:
+            f.seek(offset)
+            for _ in range(start - block * self.index_interval):
+                f.readline()
+            for _ in range(count):
+                line = f.readline()
+                if not line:
+                    break
+                lines.append(line.rstrip(b"\n").decode('utf-8', errors='replace'))
+        return lines
+
+    def tail(self, count: int) -> List[str]:
+        """
+        读取最后N行，优先从内存缓冲返回
+
+        Args:
+            count: 行数
+
+        Returns:
+            list: 日志行
+        """
+        with self._lock:
+            if count <= len(self._buffer):
+                return list(self._buffer)[-count:] if count > 0 else []
+            total = self.line_count
+
+        return self.read_lines(max(0, total - count), count)
+
+    def size(self) -> int:
+        """日志文件大小（字节）"""
+        with self._lock:
+            return self._size
+
+    def close(self):
+        """关闭文件"""
+        with self._lock:
+            for writer in (self._writer, self._index_writer):
+                if writer and not writer.closed:
+                    writer.close()
+
+    def delete(self):
+        """关闭并删除日志文件和索引"""
+        self.close()
+        for path in (self.log_file, self.index_file):
+            if path.exists():
+                os.remove(path)
+
+
+class LogArchive:
+    """
+    压缩的任务日志归档
+
+    日志按固定行数分帧，每帧压缩为独立的gzip成员后顺序拼接（整个文件仍可直接用 zcat 查看）。
+    索引文件记录每帧的起始偏移，读取任意行范围或最后N行时只解压涉及的帧。
+    """
+
+    # 索引文件头：魔数、每帧行数、总行数；之后是每帧起始偏移（最后一项为文件末尾）
+    MAGIC = b"TLA1"
+    HEADER_FORMAT = "<4sIQ"
+    HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+    OFFSET_FORMAT = "<Q"
+
+    def __init__(self, archive_file: Path):
+        """
+        打开日志归档
+
+        Args:
+            archive_file: 归档文件路径，索引保存在同名的 .idx 文件中
+
+        Raises:
+            ValueError: 索引文件格式错误
+        """
+        self.archive_file = Path(archive_file)
+        self.index_file = self.archive_file.with_suffix(self.archive_file.suffix + ".idx")
+
+        data = self.index_file.read_bytes()
+        if len(data) < self.HEADER_SIZE:
+            raise ValueError(f"日志归档索引损坏: {self.index_file}")
+
+        magic, self.frame_lines, self.line_count = struct.unpack_from(self.HEADER_FORMAT, data)
+        if magic != self.MAGIC:
+            raise ValueError(f"日志归档索引格式错误: {self.index_file}")
+
+        self._offsets = [offset for (offset,) in struct.iter_unpack(
+            self.OFFSET_FORMAT, data[self.HEADER_SIZE:])]
+
+        # 缓存最近解压的一帧（翻页读取时通常落在同一帧）
+        self._cached_frame = (-1, [])
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, log_file: Path, archive_file: Path, frame_lines: int = 10000,
+               compresslevel: int = 6) -> "LogArchive":
+        """
+        将日志文件压缩为归档
+
+        先写临时文件再替换，归档文件出现时索引一定已经就绪。
+
+        Args:
+            log_file: 原始日志文件
+            archive_file: 归档文件路径
+            frame_lines: 每帧行数
+            compresslevel: gzip压缩级别
+
+        Returns:
+            LogArchive: 新建的归档
+        """
+        archive_file = Path(archive_file)
+        index_file = archive_file.with_suffix(archive_file.suffix + ".idx")
+        tmp_archive = archive_file.with_suffix(archive_file.suffix + ".tmp")
+        tmp_index = index_file.with_suffix(index_file.suffix + ".tmp")
+        frame_lines = max(1, int(frame_lines))
+
+        offsets = [0]
+        line_count = 0
+
+        with open(log_file, 'rb') as src, open(tmp_archive, 'wb') as dst:
+            frame = []
+
+            def write_frame():
+                data = gzip.compress(b"".join(frame), compresslevel=compresslevel, mtime=0)
+                dst.write(data)
+                offsets.append(offsets[-1] + len(data))
+                frame.clear()
+
+            for line in src:
+                if not line.endswith(b"\n"):
+                    line += b"\n"
+                frame.append(line)
+                line_count += 1
+                if len(frame) == frame_lines:
+                    write_frame()
+
+            if frame:
+                write_frame()
+
+        with open(tmp_index, 'wb') as f:
+            f.write(struct.pack(cls.HEADER_FORMAT, cls.MAGIC, frame_lines, line_count))
+            f.write(b"".join(struct.pack(cls.OFFSET_FORMAT, offset) for offset in offsets))
+
+        os.replace(tmp_index, index_file)
+        os.replace(tmp_archive, archive_file)
+        return cls(archive_file)
+
+    def _read_frame(self, f, frame_no: int) -> List[str]:
+        """解压一帧"""
+        with self._lock:
+            cached_no, cached_lines = self._cached_frame
+        if cached_no == frame_no:
+            return cached_lines
+
+        start, end = self._offsets[frame_no], self._offsets[frame_no + 1]
+        f.seek(start)
+        text = gzip.decompress(f.read(end - start)).decode('utf-8', errors='replace')
+        lines = text.split("\n")[:-1]
+
+        with self._lock:
+            self._cached_frame = (frame_no, lines)
+        return lines
+
+    def read_lines(self, start: int, count: int) -> List[str]:
+        """
+        按行号读取日志
+
+        Args:
+            start: 起始行号（从0开始）
+            count: 行数
+
+        Returns:
+            list: 日志行
+        """
+        total = self.line_count
+        if start < 0:
+            start = max(0, total + start)
+        count = max(0, min(count, total - start))
+        if count == 0:
+            return []
+
+        first_frame = start // self.frame_lines
+        last_frame = (start + count - 1) // self.frame_lines
+
+        lines = []
+        with open(self.archive_file, 'rb') as f:
+            for frame_no in range(first_frame, last_frame + 1):
+                lines.extend(self._read_frame(f, frame_no))
+
+        skip = start - first_frame * self.frame_lines
+        return lines[skip:skip + count]
+
+    def tail(self, count: int) -> List[str]:
+        """
+        读取最后N行
+
+        Args:
+            count: 行数
+
+        Returns:
+            list: 日志行
+        """
+        if count <= 0:
+            return []
+        return self.read_lines(max(0, self.line_count - count), count)
+
+    def size(self) -> int:
+        """归档文件大小（字节）"""
+        return self._offsets[-1] if self._offsets else 0
+
+    def close(self):
+        """归档按需打开文件，无需关闭"""
+        pass
+
+    def delete(self):
+        """删除归档文件和索引"""
+        for path in (self.archive_file, self.index_file):
+            if path.exists():
+                os.remove(path)
@@ -0,0 +1,224 @@
+"""
+预热工作区池
+后台保持若干个已克隆、已安装 feeds 并下载好 dl/ 源码包的工作区，新用户第一次克隆时直接移交，
+空闲时（没有运行或排队的编译）再补充
+"""
+
+import os
+import json
+import time
+import shutil
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, Callable, List
+
+from utils.git_helper import GitHelper
+
+
+SLOT_META = "slot.json"
+
+
+class WorkspacePool:
+    """
+    预热工作区池
+
+    目录结构:
+
+        <池目录>/
+            <编号>/lede         预热好的源码
+            <编号>/slot.json    提交、是否启用iStore、准备完成时间（存在即表示可用）
+            <编号>.filling/     准备中的工作区
+    """
+
+    def __init__(self, pool_dir: Path, size: int,
+                 provisioner: Callable[[Path, bool], Dict[str, Any]],
+                 prefetcher: Optional[Callable[[Path], Dict[str, Any]]] = None,
+                 is_idle: Optional[Callable[[], bool]] = None,
+                 current_revision: Optional[Callable[[], Optional[str]]] = None,
+                 enable_istore: bool = True, interval: float = 300, logger=None):
+        """
+        初始化预热工作区池
+
+        Args:
+            pool_dir: 池目录（需与用户工作区位于同一文件系统，移交时直接改名）
+            size: 保持的工作区数
+            provisioner: 在指定目录准备工作区（克隆、更新并安装 feeds）的函数，参数为 (目录, 是否启用iStore)
+            prefetcher: 在工作区中下载源码包的函数
+            is_idle: 返回当前是否空闲的函数，只在空闲时补充
+            current_revision: 返回 LEDE 分支最新提交的函数，池中旧提交的工作区会被丢弃
+            enable_istore: 预热的工作区是否启用iStore
+            interval: 检查间隔（秒）
+            logger: 日志记录器
+        """
+        self.pool_dir = Path(pool_dir)
+        self.size = max(0, size)
+        self.provisioner = provisioner
+        self.prefetcher = prefetcher
+        self.is_idle = is_idle or (lambda: True)
+        self.current_revision = current_revision
+        self.enable_istore = enable_istore
+        self.interval = interval
+        self.logger = logger
+        self.git_helper = GitHelper(logger)
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._filling: Optional[str] = None
+        self._handed_out = 0
+
+    def _log(self, level: str, message: str):
+        """记录日志"""
+        if self.logger:
+            getattr(self.logger, level)(message)
+
+    def setup(self):
+        """创建池目录，清理上次未准备完成的工作区"""
+        self.pool_dir.mkdir(parents=True, exist_ok=True)
+        for path in self.pool_dir.iterdir():
+            if path.is_dir() and not (path / SLOT_META).exists():
+                shutil.rmtree(path, ignore_errors=True)
+
+    def start(self):
+        """启动补充线程"""
+        if self._thread is None and self.size > 0:
+            self._thread = threading.Thread(target=self._loop, name="workspace-pool", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止补充线程"""
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.refill()
+            except Exception as e:
+                self._log("error", f"补充预热工作区失败: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _ready_slots(self) -> List[Dict[str, Any]]:
+        """可用的工作区，按准备完成时间排序"""
+        slots = []
+        for path in self.pool_dir.iterdir():
+            meta_file = path / SLOT_META
+            if not path.is_dir() or not meta_file.exists():
+                continue
+            try:
+                meta = json.loads(meta_file.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                continue
+            meta["path"] = path
+            slots.append(meta)
+        return sorted(slots, key=lambda slot: slot.get("ready_at", 0))
+
+    def refill(self) -> int:
+        """
+        丢弃旧提交的工作区，空闲时补充到目标数量
+
+        Returns:
+            int: 本次补充的工作区数
+        """
+        revision = self.current_revision() if self.current_revision else None
+        if revision:
+            with self._lock:
+                for slot in self._ready_slots():
+                    if slot.get("revision") != revision:
+                        self._log("info", f"丢弃旧提交的预热工作区: {slot['path'].name}")
+                        shutil.rmtree(slot["path"], ignore_errors=True)
+
+        filled = 0
+        while not self._stop.is_set() and len(self._ready_slots()) < self.size and self.is_idle():
+            if not self._fill_one():
+                break
+            filled += 1
+        return filled
+
+    def _fill_one(self) -> bool:
+        """准备一个工作区"""
+        name = str(time.time_ns())
+        filling = self.pool_dir / f"{name}.filling"
+        work_dir = filling / "lede"
+        filling.mkdir(parents=True)
+        self._filling = name
+        start = time.time()
+        self._log("info", f"开始准备预热工作区: {name}")
+
+        try:
+            result = self.provisioner(work_dir, self.enable_istore)
+            if result.get("success") and self.prefetcher:
+                result = self.prefetcher(work_dir)
+            if not result.get("success"):
+                self._log("error", f"准备预热工作区失败: {result.get('message')}")
+                shutil.rmtree(filling, ignore_errors=True)
+                return False
+
+            meta = {
+                "revision": self.git_helper.get_head_commit(work_dir),
+                "istore": self.enable_istore,
+                "ready_at": time.time(),
+                "prepare_seconds": round(time.time() - start, 1)
+            }
+            (filling / SLOT_META).write_text(json.dumps(meta), encoding='utf-8')
+            os.replace(filling, self.pool_dir / name)
+        except Exception as e:
+            self._log("error", f"准备预热工作区失败: {e}")
+            shutil.rmtree(filling, ignore_errors=True)
+            return False
+        finally:
+            self._filling = None
+
+        self._log("info", f"预热工作区已就绪: {name} ({meta['prepare_seconds']}s)")
+        return True
+
+    def take(self, work_dir: Path, enable_istore: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        把一个预热好的工作区移交给用户
+
+        Args:
+            work_dir: 用户源码目录（不能已存在）
+            enable_istore: 是否启用iStore，只移交相同配置的工作区
+
+        Returns:
+            dict: 移交的工作区的 revision、ready_at 等，池中没有可用的工作区时返回None
+        """
+        work_dir = Path(work_dir)
+        with self._lock:
+            for slot in self._ready_slots():
+                if slot.get("istore") != enable_istore:
+                    continue
+                work_dir.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    os.rename(slot["path"] / "lede", work_dir)
+                except OSError as e:
+                    self._log("warning", f"移交预热工作区失败 {slot['path'].name}: {e}")
+                    continue
+                shutil.rmtree(slot["path"], ignore_errors=True)
+                self._handed_out += 1
+                break
+            else:
+                return None
+
+        self._wake.set()
+        self._log("info", f"已移交预热工作区 {slot['path'].name} -> {work_dir}")
+        return {key: value for key, value in slot.items() if key != "path"}
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        获取池状态
+
+        Returns:
+            dict: size（目标数量）、ready（可用的工作区）、filling（是否正在准备）、handed_out（已移交数）
+        """
+        with self._lock:
+            ready = [{key: value for key, value in slot.items() if key != "path"} for slot in self._ready_slots()]
+        return {
+            "pool_dir": str(self.pool_dir),
+            "size": self.size,
+            "ready": ready,
+            "filling": self._filling is not None,
+            "handed_out": self._handed_out
+        }
@@ -206,8 +206,12 @@ class WebSocketManager {
      * 处理编译日志
      */
     handleCompileLog(data) {
-        const level = this.detectLogLevel(data.line);
-        this.app.addLogEntry(level, data.line, data.timestamp);
+        // 后端按批推送日志行
+        const lines = data.lines || [data.line || data.message];
+        lines.forEach((line) => {
+            const level = this.detectLogLevel(line);
+            this.app.addLogEntry(level, line, data.timestamp);
+        });
         
         // 如果有进度信息，更新进度
         if (data.progress !== undefined) {
@@ -292,7 +296,9 @@ class WebSocketManager {
      */
     handleFeedsLog(data) {
         const level = this.detectLogLevel(data.line);
-        this.app.addLogEntry(level, data.line, data.timestamp);
+        // 各 feed 并发更新，输出前标注所属的 feed
+        const message = data.feed ? `[${data.feed}] ${data.line}` : data.line;
+        this.app.addLogEntry(level, message, data.timestamp);
     }
     
     /**
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+进程输出读取性能测试
+
+concurrent: 同时启动多个持续输出的子进程，对比 ProcessManager 两种输出读取方式
+            （reactor 单线程复用 / threads 每进程一个线程）的耗时、CPU占用和线程数；
+            --persistent 时使用可重连进程（输出写入日志文件，与编译阶段的 make 相同）。
+throughput: 模拟 make V=s 的大量输出（默认100万行，含无效UTF-8字节），
+            对比逐行文本读取（旧实现）与按块读取、批量回调的吞吐量。
+
+用法:
+    python scripts/benchmark_process_io.py concurrent --processes 50 --lines 20000
+    python scripts/benchmark_process_io.py concurrent --processes 50 --lines 20000 --persistent
+    python scripts/benchmark_process_io.py throughput --lines 1000000
+"""
+
+import sys
+import time
+import shlex
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from utils.process_manager import ProcessManager, ProcessStatus  # noqa: E402
+
+
+# 模拟make输出：进入/离开目录、编译命令，以及偶尔出现的非UTF-8字节
+FAKE_MAKE_SCRIPT = r'''
+import sys
+lines, invalid_every = int(sys.argv[1]), int(sys.argv[2])
+out = sys.stdout.buffer
+batch = []
+for i in range(lines):
+    n = i % 400
+    if n == 0:
+        line = b"make[2]: Entering directory '/build/lede/package/network/pkg%d'" % (i // 400)
+    elif n == 399:
+        line = b"make[2]: Leaving directory '/build/lede/package/network/pkg%d'" % (i // 400)
+    else:
+        line = b"mipsel-openwrt-linux-musl-gcc -Os -pipe -fno-caller-saves -c src/file%d.c -o file%d.o" % (n, n)
+    if invalid_every and i % invalid_every == 0:
+        line += b" \xff\xfe"
+    batch.append(line)
+    if len(batch) == 1000:
+        out.write(b"\n".join(batch) + b"\n")
+        batch = []
+if batch:
+    out.write(b"\n".join(batch) + b"\n")
+out.flush()
+'''
+
+
+class QuietLogger:
+    """只输出错误的日志记录器"""
+
+    def info(self, message):
+        pass
+
+    def warning(self, message):
+        pass
+
+    def error(self, message):
+        print(f"[ERROR] {message}")
+
+
+def noisy_command(lines: int, width: int) -> str:
+    """生成持续输出的命令"""
+    line = "x" * width
+    return f"yes '{line}' | head -n {lines}"
+
+
+def fake_make_command(lines: int, invalid_every: int) -> str:
+    """生成模拟make输出的命令"""
+    return (f"{shlex.quote(sys.executable)} -c {shlex.quote(FAKE_MAKE_SCRIPT)} "
+            f"{lines} {invalid_every}")
+
+
+def run_backend(backend: str, processes: int, lines: int, width: int, persistent: bool = False) -> dict:
+    """运行一轮并发测试"""
+    state_dir = tempfile.mkdtemp(prefix="benchmark_process_io_") if persistent else None
+    manager = ProcessManager(QuietLogger(), state_dir=state_dir, io_backend=backend)
+    received = [0]
+    counter_lock = threading.Lock()
+
+    def on_output(process_id, line):
+        with counter_lock:
+            received[0] += 1
+
+    peak_threads = threading.active_count()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    process_ids = [f"bench_{backend}_{i}" for i in range(processes)]
+    for process_id in process_ids:
+        manager.start_process(process_id, noisy_command(lines, width), output_callback=on_output,
+                              persistent=persistent)
+        peak_threads = max(peak_threads, threading.active_count())
+
+    failed = 0
+    for process_id in process_ids:
+        while True:
+            status = manager.wait_process(process_id, timeout=0.05)
+            peak_threads = max(peak_threads, threading.active_count())
+            if status is not None:
+                break
+        if status != ProcessStatus.COMPLETED:
+            failed += 1
+        manager.cleanup_process(process_id)
+
+    if state_dir:
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    return {
+        "backend": backend,
+        "wall": time.perf_counter() - wall_start,
+        "cpu": time.process_time() - cpu_start,
+        "lines": received[0],
+        "expected": processes * lines,
+        "peak_threads": peak_threads,
+        "failed": failed
+    }
+
+
+def run_legacy_reader(command: str) -> dict:
+    """旧实现：文本模式逐行读取，每行加锁并调用回调（需 errors='replace' 才不会因非UTF-8字节中断）"""
+    lock = threading.Lock()
+    output_lines = []
+    received = [0]
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, universal_newlines=True,
+                               errors='replace', bufsize=1)
+    for line in iter(process.stdout.readline, ''):
+        line = line.rstrip('\n\r')
+        with lock:
+            output_lines.append(line)
+        received[0] += 1
+    process.wait()
+
+    return {
+        "wall": time.perf_counter() - wall_start,
+        "cpu": time.process_time() - cpu_start,
+        "lines": received[0],
+        "ok": process.returncode == 0
+    }
+
+
+def run_manager_reader(command: str, backend: str, batch: bool) -> dict:
+    """ProcessManager：按块读取，逐行回调或批量回调"""
+    manager = ProcessManager(QuietLogger(), io_backend=backend)
+    received = [0]
+
+    def on_line(process_id, line):
+        received[0] += 1
+
+    def on_batch(process_id, lines):
+        received[0] += len(lines)
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    if batch:
+        manager.start_process("throughput", command, batch_output_callback=on_batch)
+    else:
+        manager.start_process("throughput", command, output_callback=on_line)
+    status = manager.wait_process("throughput")
+    manager.cleanup_process("throughput")
+
+    return {
+        "wall": time.perf_counter() - wall_start,
+        "cpu": time.process_time() - cpu_start,
+        "lines": received[0],
+        "ok": status == ProcessStatus.COMPLETED
+    }
+
+
+def cmd_concurrent(args):
+    """并发测试"""
+    print(f"并发进程: {args.processes}, 每进程行数: {args.lines}, 行宽: {args.width}"
+          f"{', 可重连进程' if args.persistent else ''}")
+    print(f"{'方式':<10}{'耗时(s)':>10}{'CPU(s)':>10}{'行/秒':>14}{'峰值线程':>10}{'行数':>12}{'失败':>6}")
+
+    for backend in args.backends:
+        result = run_backend(backend, args.processes, args.lines, args.width, args.persistent)
+        rate = result["lines"] / result["wall"] if result["wall"] else 0
+        print(f"{result['backend']:<10}{result['wall']:>10.2f}{result['cpu']:>10.2f}{rate:>14,.0f}"
+              f"{result['peak_threads']:>10}{result['lines']:>12}{result['failed']:>6}")
+        if result["lines"] != result["expected"]:
+            print(f"  警告: 收到 {result['lines']} 行，预期 {result['expected']} 行")
+
+
+def cmd_throughput(args):
+    """吞吐量测试"""
+    command = fake_make_command(args.lines, args.invalid_every)
+    print(f"模拟make输出: {args.lines} 行, 每 {args.invalid_every} 行一处非UTF-8字节")
+    print(f"{'读取方式':<24}{'耗时(s)':>10}{'CPU(s)':>10}{'行/秒':>14}{'行数':>12}")
+
+    runs = [("legacy readline", lambda: run_legacy_reader(command))]
+    for backend in args.backends:
+        runs.append((f"{backend} per-line", lambda b=backend: run_manager_reader(command, b, False)))
+        runs.append((f"{backend} batch", lambda b=backend: run_manager_reader(command, b, True)))
+
+    for name, run in runs:
+        result = run()
+        rate = result["lines"] / result["wall"] if result["wall"] else 0
+        print(f"{name:<24}{result['wall']:>10.2f}{result['cpu']:>10.2f}{rate:>14,.0f}{result['lines']:>12}")
+        if result["lines"] != args.lines or not result["ok"]:
+            print(f"  警告: 收到 {result['lines']} 行，预期 {args.lines} 行")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ProcessManager 输出读取性能测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    concurrent = subparsers.add_parser("concurrent", help="多进程并发输出")
+    concurrent.add_argument("--processes", type=int, default=50, help="并发进程数")
+    concurrent.add_argument("--lines", type=int, default=20000, help="每个进程输出行数")
+    concurrent.add_argument("--width", type=int, default=80, help="每行字符数")
+    concurrent.add_argument("--persistent", action="store_true", help="使用可重连进程（读取日志文件）")
+    concurrent.set_defaults(func=cmd_concurrent)
+
+    throughput = subparsers.add_parser("throughput", help="单进程大量输出（模拟make V=s）")
+    throughput.add_argument("--lines", type=int, default=1000000, help="输出行数")
+    throughput.add_argument("--invalid-every", type=int, default=10000,
+                            help="每隔多少行插入非UTF-8字节（0表示不插入）")
+    throughput.set_defaults(func=cmd_throughput)
+
+    for sub in (concurrent, throughput):
+        sub.add_argument("--backends", nargs="+", default=list(ProcessManager.IO_BACKENDS),
+                         choices=ProcessManager.IO_BACKENDS, help="参与测试的读取方式")
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()